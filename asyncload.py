@@ -0,0 +1,107 @@
+"""
+asyncload.py
+
+Loading models without freezing the render loop: ModelLoader parses and
+prepares models (everything up to the GL calls) on a background thread and
+keeps a few finished ones around for prefetching, ModelUpload moves the
+prepared arrays into GL buffers in chunks of at most a byte budget per
+frame with glBufferSubData.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from OpenGL.GL import *
+
+from scenegraph import create_vertex_array
+
+DEFAULT_UPLOAD_BUDGET = 4 << 20
+
+
+def placeholder_mesh():
+    # Oktaeder mit Flaechennormalen, sofort verfuegbar waehrend geladen wird
+    corners = np.array([[1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0, 0, 1], [0, 0, -1]],
+                       dtype=np.float32) * 0.5
+    faces = np.array([[0, 2, 4], [2, 1, 4], [1, 3, 4], [3, 0, 4],
+                      [2, 0, 5], [1, 2, 5], [3, 1, 5], [0, 3, 5]])
+    vertices = corners[faces].reshape(-1, 3)
+    normals = np.repeat(np.sign(vertices.reshape(-1, 3, 3).sum(axis=1)) / np.sqrt(3), 3, axis=0)
+    return {'vertices': vertices, 'normals': normals.astype(np.float32),
+            'indices': np.arange(len(vertices), dtype=np.uint32)}
+
+
+class ModelLoader:
+    """
+    Single background thread running prepare(filename). request() returns
+    the Future for a file, submitting it if needed; at most keep futures
+    are remembered, so prefetched models can be picked up later.
+    """
+
+    def __init__(self, prepare, keep=3):
+        self.prepare = prepare
+        self.keep = keep
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+        self.futures = OrderedDict()
+
+    def request(self, filename):
+        future = self.futures.get(filename)
+        if future is None or (future.done() and future.exception() is not None):
+            future = self.futures[filename] = self.executor.submit(self.prepare, filename)
+        self.futures.move_to_end(filename)
+        while len(self.futures) > self.keep:
+            _, oldest = self.futures.popitem(last=False)
+            oldest.cancel()
+        return future
+
+    prefetch = request
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ModelUpload:
+    """
+    Allocates VAO, vertex and index buffers for a MeshBuffers layout plus
+    the full index array at once and fills them over several step() calls.
+    Uploads go through GL_COPY_WRITE_BUFFER so no VAO binding is touched.
+    """
+
+    def __init__(self, buffers, indices):
+        self.vertex_array, self.buffers = create_vertex_array(buffers, upload=False)
+        self.index_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, None, GL_STATIC_DRAW)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        # (Buffer, Bytes, schon hochgeladen)
+        self.pending = [[vbo, np.frombuffer(np.ascontiguousarray(data), dtype=np.uint8), 0]
+                        for vbo, (data, _, _) in zip(self.buffers, buffers.vertex_buffers)]
+        self.pending.append([self.index_buffer, np.frombuffer(np.ascontiguousarray(indices), dtype=np.uint8), 0])
+        self.total = sum(len(data) for _, data, _ in self.pending)
+        self.done = 0
+
+    def step(self, budget=None):
+        # bis zu budget Bytes hochladen (None = alles), True wenn fertig
+        remaining = self.total if budget is None else budget
+        while self.pending and remaining > 0:
+            entry = self.pending[0]
+            buffer, data, offset = entry
+            size = min(remaining, len(data) - offset)
+            glBindBuffer(GL_COPY_WRITE_BUFFER, buffer)
+            glBufferSubData(GL_COPY_WRITE_BUFFER, offset, size, data[offset:offset + size])
+            entry[2] += size
+            remaining -= size
+            self.done += size
+            if entry[2] == len(data):
+                self.pending.pop(0)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+        return not self.pending
+
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    def gl_objects(self):
+        return self.vertex_array, self.buffers + [self.index_buffer]
@@ -0,0 +1,525 @@
+"""
+Reproducible benchmark suite (timeit/pyperf style, no extra dependencies).
+
+Run all groups and save the results:
+    python benchmarks/run.py [--groups=load,normals,mat4,arcball,synthetic,draw,lod,shaders,raster,pick,startup]
+                             [--sizes=1e5,1e6] [--repeat=5] [--out=results.json]
+
+Compare two result files, exit code 1 if something got slower than the
+threshold (relative, on the median):
+    python benchmarks/run.py compare base.json new.json [--threshold=0.1]
+
+Every model in obj_files/ is benchmarked; synthetic height-field meshes
+with the given triangle counts (e.g. --sizes=1e5,1e6,1e7) show how the
+loader and the normal computation scale. 'normals' also times the old
+per-triangle loop and records its largest deviation. The 'draw' group
+needs a software GL context (EGL/OSMesa, see headless.py) and is skipped
+without one; 'lod' times the simplifier and, with such a context, every
+LOD level; 'shaders' compares building the programs from source with the
+program binary cache;
+'raster' times the NumPy software rasterizer (softraster.py) with one
+worker (and on all cores for Phong), no GL needed;
+'pick' builds the picking BVH (picking.py) and casts cursor rays through
+the start view, against a brute-force test of every triangle;
+'startup' runs fresh interpreters: import oglViewer under -X importtime and
+time-to-first-frame of a headless render with and without PyOpenGL's error
+checking (OGLVIEWER_GL_CHECKS=0).
+"""
+
+import datetime
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+GROUPS = ('load', 'normals', 'mat4', 'arcball', 'synthetic', 'draw', 'lod', 'shaders', 'raster', 'pick', 'startup')
+MODELS = sorted(glob.glob(os.path.join('obj_files', '*.obj')))
+
+
+def measure(fn, repeat=5, min_time=0.05):
+    """
+    Seconds per call of fn: the number of calls per sample is calibrated so
+    that one sample takes at least min_time (like timeit.autorange).
+    """
+    number = 1
+    while True:
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - t
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - t) / number)
+    return {'median': statistics.median(samples), 'min': min(samples),
+            'mean': statistics.fmean(samples),
+            'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+            'loops': number, 'samples': samples}
+
+
+def bench_load(results, repeat):
+    from utils import lade_obj
+    for filename in MODELS:
+        name = os.path.basename(filename)
+        results[f'load/{name}'] = measure(lambda: lade_obj(filename), repeat)
+
+
+def _compute_normals_loop(vertices, faces):
+    # die urspruengliche Implementierung (eine Iteration pro Dreieck) als Vergleich
+    normals = np.zeros_like(vertices, dtype=np.float32)
+    for face in faces:
+        i0, i1, i2 = face
+        v0 = vertices[i0]
+        v1 = vertices[i1]
+        v2 = vertices[i2]
+        face_normal = np.cross(v1 - v0, v2 - v0)
+        normals[i0] += face_normal
+        normals[i1] += face_normal
+        normals[i2] += face_normal
+    norms = np.linalg.norm(normals, axis=1)
+    norms[norms == 0] = 1.0
+    normals /= norms[:, np.newaxis]
+    return normals
+
+
+def bench_normals(results, repeat):
+    from utils import lade_obj, compute_normals
+    for filename in MODELS:
+        name = os.path.basename(filename)
+        vertices, indices, faces, _ = lade_obj(filename)
+        for weighting in ('area', 'angle'):
+            results[f'normals/{weighting}/{name}'] = measure(
+                lambda: compute_normals(vertices, faces, weighting), repeat)
+        # Schleife pro Dreieck (Stand vor der Vektorisierung), max_diff gegen 'area'
+        diff = np.abs(_compute_normals_loop(vertices, faces) - compute_normals(vertices, faces)).max()
+        results[f'normals/loop/{name}'] = dict(measure(
+            lambda: _compute_normals_loop(vertices, faces), max(1, repeat // 2), 0), max_diff=float(diff))
+
+
+def bench_mat4(results, repeat):
+    import mat4
+    out = np.empty((4, 4), dtype=np.float32)
+    m = mat4.rotate(30, (1, 1, 0))
+    angles = np.linspace(0, 360, 1000)
+    axes = np.random.default_rng(0).normal(size=(1000, 3))
+    cases = {
+        'perspective': lambda: mat4.perspective(45.0, 4 / 3, 1.0, 10.0),
+        'perspective_out': lambda: mat4.perspective(45.0, 4 / 3, 1.0, 10.0, out=out),
+        'ortho': lambda: mat4.ortho(-2, 2, -1.5, 1.5, 1.0, 10.0),
+        'look_at': lambda: mat4.look_at(0, 0, 3, 0, 0, 0, 0, 1, 0),
+        'rotate': lambda: mat4.rotate(30, (1, 1, 0)),
+        'rotate_y': lambda: mat4.rotate_y(30),
+        'translate': lambda: mat4.translate(0.1, 0.2, 0.0),
+        'scale': lambda: mat4.scale(1.5, 1.5, 1.5),
+        'normal_matrix': lambda: mat4.normal_matrix(m, 1.0),
+        'inv_normal_matrix': lambda: np.linalg.inv(m[:3, :3]).T,
+        'rotate_many_1000': lambda: mat4.rotate_many(angles, axes),
+    }
+    for name, fn in cases.items():
+        results[f'mat4/{name}'] = measure(fn, repeat)
+
+
+def _drag_path(width, height, events=200):
+    t = np.linspace(0, 2 * np.pi, events)
+    return np.stack([width / 2 + 150 * np.cos(t), height / 2 + 100 * np.sin(2 * t)], axis=1)
+
+
+def bench_arcball(results, repeat):
+    from utils import projectOnSphere
+    width, height = 640, 480
+    path = _drag_path(width, height)
+    results['arcball/projectOnSphere'] = measure(
+        lambda: projectOnSphere(400.0, 300.0, 240.0, width, height), repeat)
+
+    # RenderWindow-Eingaben ohne Fenster: nur der Arcball-Zweig
+    from oglViewer import Scene, RenderWindow
+    scene = Scene(width, height)
+    window = RenderWindow.__new__(RenderWindow)
+    window.scene = scene
+    window.init_input_state()
+
+    def drag(events_per_frame):
+        def run():
+            scene.mouse_pressed = True
+            scene.p1 = np.array(projectOnSphere(*path[0], scene.arcball_radius, width, height))
+            for i, (x, y) in enumerate(path[1:], 1):
+                window.on_mouse_move(None, x, y)
+                if i % events_per_frame == 0:
+                    window.apply_input()
+        return run
+
+    def drag_matrix():
+        # frueherer Pfad: Achse/Winkel mit NumPy, Matrix je Ereignis multipliziert
+        from mat4 import rotate
+        rotation = np.identity(4, dtype=np.float32)
+        p1 = np.array(projectOnSphere(*path[0], scene.arcball_radius, width, height))
+        for x, y in path[1:]:
+            p2 = np.array(projectOnSphere(x, y, scene.arcball_radius, width, height))
+            axis = np.cross(p1, p2)
+            if np.linalg.norm(axis) >= 1e-6:
+                axis /= np.linalg.norm(axis)
+                angle = np.degrees(np.arccos(np.clip(np.dot(p1, p2), -1.0, 1.0)))
+                rotation = rotate(angle, axis) @ rotation
+                p1 = p2
+
+    # 1 = Arcball fuer jedes Ereignis, 8 = mehrere Ereignisse pro Frame;
+    # matrix_per_event ist der Stand vor den Quaternionen
+    cases = (('matrix_per_event', drag_matrix), ('on_mouse_move_per_event', drag(1)),
+             ('coalesced_8_per_frame', drag(8)))
+    for name, run in cases:
+        stats = measure(run, repeat)
+        for key in ('median', 'min', 'mean', 'stdev'):
+            stats[key] /= len(path) - 1
+        stats['samples'] = [s / (len(path) - 1) for s in stats['samples']]
+        results[f'arcball/{name}'] = stats
+    # einmal pro Frame in Scene.draw
+    results['arcball/to_matrix_per_frame'] = measure(
+        lambda: scene.rotation.to_matrix(out=scene.rotation_matrix), repeat)
+
+    # aufgezeichnete Drags am Stueck: Kugelpunkte und kumulierte Rotationen in einem Aufruf
+    from utils import project_on_sphere_many
+    from quaternion import arcball_many, to_matrix_many
+    from camerapath import CameraPath
+    for events in (1000, 100000):
+        t = np.linspace(0, 2 * np.pi, events)
+        xs, ys = width / 2 + 150 * np.cos(t), height / 2 + 100 * np.sin(3 * t)
+
+        def replay():
+            points = project_on_sphere_many(xs, ys, scene.arcball_radius, width, height)
+            return to_matrix_many(arcball_many(points))
+        stats = measure(replay, max(1, repeat // 2), 0)
+        for key in ('median', 'min', 'mean', 'stdev'):
+            stats[key] /= events
+        stats['samples'] = [s / events for s in stats['samples']]
+        results[f'arcball/batch_replay_{events}_per_event'] = stats
+
+    path = CameraPath.from_keyframes([
+        {'time': 0, 'zoom': 1.0}, {'time': 2, 'zoom': 2.0, 'pan': [0.2, 0.1], 'axis': [0, 1, 0], 'angle': 120},
+        {'time': 5, 'zoom': 0.8, 'axis': [1, 0, 0], 'angle': 60}, {'time': 8, 'rotation': [1, 0, 0, 0]}])
+    times = np.linspace(path.start, path.end, 100000)
+    results['arcball/camera_path_evaluate_100000'] = measure(lambda: path.evaluate(times), max(1, repeat // 2), 0)
+
+
+def write_synthetic_obj(filename, triangles):
+    # Hoehenfeld auf einem n x n Gitter, 2 Dreiecke pro Zelle
+    n = max(1, int(round(np.sqrt(triangles / 2))))
+    u, v = np.meshgrid(np.linspace(-1, 1, n + 1), np.linspace(-1, 1, n + 1))
+    w = 0.1 * np.sin(6 * u) * np.cos(6 * v)
+    vertices = np.stack([u.ravel(), w.ravel(), v.ravel()], axis=1)
+    i = np.arange(n * n) // n * (n + 1) + np.arange(n * n) % n
+    a, b, c, d = i, i + 1, i + n + 1, i + n + 2
+    faces = np.concatenate([np.stack([a, c, b], 1), np.stack([b, c, d], 1)]) + 1
+    with open(filename, 'w') as file:
+        np.savetxt(file, vertices, fmt='v %.6f %.6f %.6f')
+        np.savetxt(file, faces, fmt='f %d %d %d')
+    return len(faces)
+
+
+def bench_synthetic(results, repeat, sizes):
+    from utils import lade_obj, compute_normals
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            filename = os.path.join(tmp, f'grid_{size}.obj')
+            count = write_synthetic_obj(filename, size)
+            vertices, indices, faces, _ = lade_obj(filename)
+            # grosse Netze nur wenige Male messen
+            r = repeat if count <= 1e6 else max(1, repeat // 2)
+            results[f'synthetic/load/{size:.0e}'] = dict(measure(lambda: lade_obj(filename), r), triangles=count)
+            results[f'synthetic/normals/{size:.0e}'] = dict(
+                measure(lambda: compute_normals(vertices, faces), r), triangles=count)
+
+
+def bench_draw(results, repeat):
+    # eigener Prozess, da das GL-Backend vor dem ersten OpenGL-Import feststehen muss
+    code = ("import json, sys, time; sys.argv = ['headless.py', '--no-cache'];"
+            "import glplatform; glplatform.select_platform(glplatform.current_backend()); import headless;"
+            " from oglViewer import Scene;"
+            "from OpenGL.GL import glFinish;"
+            "out = {}\n"
+            "for f in %r:\n"
+            " for mode in (0, 1, 2):\n"
+            "  s = Scene(640, 480, filename=f); s.shading_mode = mode\n"
+            "  r = headless.HeadlessRenderer(s); poses = headless.turntable_poses(%d)\n"
+            "  for _ in r.render(poses[:5]): pass\n"
+            "  t = time.perf_counter()\n"
+            "  for _ in r.render(poses): pass\n"
+            "  out[f + '/' + str(mode)] = (time.perf_counter() - t) / len(poses)\n"
+            "print(json.dumps(out))" % (MODELS, 10 * repeat))
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        print("draw: no software GL context available, skipped", file=sys.stderr)
+        return
+    modes = ('wireframe', 'gouraud', 'phong')
+    for key, seconds in json.loads(proc.stdout.strip().splitlines()[-1]).items():
+        filename, mode = key.rsplit('/', 1)
+        results[f'draw/{modes[int(mode)]}/{os.path.basename(filename)}'] = {
+            'median': seconds, 'min': seconds, 'mean': seconds, 'stdev': 0.0,
+            'fps': 1.0 / seconds}
+
+
+def bench_lod(results, repeat):
+    from meshcache import prepare_mesh
+    from simplify import build_lods
+    for filename in MODELS:
+        name = os.path.basename(filename)
+        mesh = prepare_mesh(filename)
+        lods = build_lods(mesh['vertices'], mesh['indices'])
+        results[f'lod/simplify/{name}'] = dict(
+            measure(lambda: build_lods(mesh['vertices'], mesh['indices']), max(1, repeat // 2), 0),
+            triangles=[len(mesh['indices']) // 3] + [len(level) // 3 for level in lods])
+
+    # Frame-Zeit je Stufe (Phong, feste Stufe statt automatischer Auswahl)
+    code = ("import json, sys, time; sys.argv = ['headless.py', '--no-cache', '--lod'];"
+            "import glplatform; glplatform.select_platform(glplatform.current_backend()); import headless;"
+            " from oglViewer import Scene;"
+            "out = {}\n"
+            "for f in %r:\n"
+            " s = Scene(640, 480, filename=f); s.shading_mode = 2\n"
+            " r = headless.HeadlessRenderer(s); poses = headless.turntable_poses(%d)\n"
+            " for level, (_, count) in enumerate(s.lods):\n"
+            "  s.lod_level = level\n"
+            "  for _ in r.render(poses[:5]): pass\n"
+            "  t = time.perf_counter()\n"
+            "  for _ in r.render(poses): pass\n"
+            "  out[f + '/' + str(level)] = ((time.perf_counter() - t) / len(poses), count // 3)\n"
+            "print(json.dumps(out))" % (MODELS, 10 * repeat))
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        print("lod: no software GL context available, draw skipped", file=sys.stderr)
+        return
+    for key, (seconds, triangles) in json.loads(proc.stdout.strip().splitlines()[-1]).items():
+        filename, level = key.rsplit('/', 1)
+        results[f'lod/draw/{os.path.basename(filename)}/{level}'] = {
+            'median': seconds, 'min': seconds, 'mean': seconds, 'stdev': 0.0,
+            'fps': 1.0 / seconds, 'triangles': triangles}
+
+
+def bench_shaders(results, repeat):
+    # Programme beim Start: alle drei aus dem Quelltext (frueher) gegen den
+    # Binaer-Cache, einmal alle und einmal nur das aktive (lazy, Taste S baut den Rest)
+    code = ("import json, statistics, sys, tempfile, time; sys.argv = ['headless.py'];"
+            "import glplatform; glplatform.select_platform(glplatform.current_backend()); import headless;"
+            " from oglViewer import SHADER_FILES;"
+            "from shaderprogram import ProgramCache, ShaderProgram;"
+            "headless.create_context(64, 64); out = {}\n"
+            "def build(files, cache):\n"
+            " t = time.perf_counter()\n"
+            " for shader in [ShaderProgram(v, f, cache) for v, f in files]: shader.delete()\n"
+            " return time.perf_counter() - t\n"
+            "with tempfile.TemporaryDirectory() as tmp:\n"
+            " cache = ProgramCache(tmp); build(SHADER_FILES, cache)\n"
+            " for name, files, c in (('compile_all', SHADER_FILES, None), ('warm_cache_all', SHADER_FILES, cache),\n"
+            "                        ('warm_cache_active', SHADER_FILES[2:], cache)):\n"
+            "  out[name] = [build(files, c) for _ in range(%d)]\n"
+            "print(json.dumps(out))" % max(3, repeat))
+    proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT)
+    if proc.returncode != 0:
+        print("shaders: no software GL context available, skipped", file=sys.stderr)
+        return
+    for name, samples in json.loads(proc.stdout.strip().splitlines()[-1]).items():
+        results[f'shaders/{name}'] = {
+            'median': statistics.median(samples), 'min': min(samples), 'mean': statistics.fmean(samples),
+            'stdev': statistics.stdev(samples), 'loops': 1, 'samples': samples}
+
+
+def bench_raster(results, repeat):
+    # Frame-Zeit des Software-Rasterizers mit den Matrizen der Startansicht
+    from meshcache import prepare_mesh
+    from oglViewer import Scene
+    from softraster import Rasterizer
+    # ein Worker, damit die Zahlen zwischen Rechnern vergleichbar bleiben;
+    # phong_all_cores zeigt zusaetzlich die Kachel-Parallelisierung
+    scene = Scene(640, 480)
+    matrices = scene.update_matrices()
+    rasterizer = Rasterizer(640, 480, workers=1)
+    parallel = Rasterizer(640, 480) if (os.cpu_count() or 1) > 1 else None
+    modes = ('wireframe', 'gouraud', 'phong')
+    try:
+        for filename in MODELS:
+            name = os.path.basename(filename)
+            mesh = prepare_mesh(filename)
+            cases = [(modes[mode], rasterizer, mode) for mode in range(3)]
+            if parallel is not None:
+                cases.append(('phong_all_cores', parallel, 2))
+            for label, raster, mode in cases:
+                results[f'raster/{label}/{name}'] = dict(measure(
+                    lambda: raster.render(mesh['vertices'], mesh['normals'], mesh['indices'], *matrices, mode),
+                    max(1, repeat // 2), 0), triangles=len(mesh['indices']) // 3, workers=raster.workers)
+    finally:
+        rasterizer.shutdown()
+        if parallel is not None:
+            parallel.shutdown()
+
+
+def bench_pick(results, repeat):
+    # Aufbau beim Laden und Latenz je Cursorabfrage (Scene.pick) entlang eines Hover-Pfads
+    from meshcache import prepare_mesh
+    from oglViewer import Scene
+    from picking import PickIndex, unproject
+    scene = Scene(640, 480)
+    scene.update_matrices()
+    path = _drag_path(scene.width, scene.height)
+    rays = [unproject(x, y, scene.width, scene.height, scene.mvp_matrix) for x, y in path]
+    for filename in MODELS:
+        name = os.path.basename(filename)
+        mesh = prepare_mesh(filename)
+        triangles = len(mesh['indices']) // 3
+        results[f'pick/build/{name}'] = dict(measure(
+            lambda: PickIndex(mesh['vertices'], mesh['indices']), repeat, 0), triangles=triangles)
+        scene.pick_index = index = PickIndex(mesh['vertices'], mesh['indices'])
+
+        def hover():
+            for x, y in path:
+                scene.pick(x, y)
+
+        def brute_force():
+            for origin, direction in rays:
+                index.intersect_brute_force(origin, direction)
+
+        hits = sum(scene.pick(x, y) is not None for x, y in path)
+        for label, fn in (('query', hover), ('brute_force', brute_force)):
+            stats = measure(fn, repeat, 0)
+            for key in ('median', 'min', 'mean', 'stdev'):
+                stats[key] /= len(path)
+            stats['samples'] = [s / len(path) for s in stats['samples']]
+            results[f'pick/{label}/{name}'] = dict(stats, triangles=triangles, hits=hits)
+
+
+def _import_times(module):
+    # -X importtime eines frischen Interpreters: (gesamt, {direkt importiertes Modul: kumuliert}) in s
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, cwd=ROOT)
+    # Kinder stehen vor ihrem Elternmodul, eine Ebene = zwei Leerzeichen
+    total, children, pending = 0.0, {}, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            pending[name.strip()] = int(cumulative) * 1e-6
+        elif depth == 0:
+            if name.strip() == module:
+                total, children = int(cumulative) * 1e-6, pending
+            pending = {}
+    return total, children
+
+
+def bench_startup(results, repeat):
+    runs = max(3, repeat)
+    samples, children = [], {}
+    for _ in range(runs):
+        total, children = _import_times('oglViewer')
+        samples.append(total)
+    results['startup/import_oglViewer'] = {
+        'median': statistics.median(samples), 'min': min(samples), 'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples), 'loops': 1, 'samples': samples,
+        'modules_ms': {name: round(t * 1e3, 3) for name, t in sorted(children.items(), key=lambda c: -c[1])}}
+
+    # Zeit vom Prozessstart bis zum ersten fertigen Bild (Import, Kontext, Laden, Shader, Frame)
+    code = ("import sys, time; sys.argv = ['headless.py', %r];"
+            "import glplatform; glplatform.select_platform(glplatform.current_backend()); import headless;"
+            " from oglViewer import Scene;"
+            "s = Scene(640, 480); s.shading_mode = 2; r = headless.HeadlessRenderer(s)\n"
+            "for _ in r.render(headless.turntable_poses(1)): print(time.time()); break")
+    for name, checks in (('first_frame', '1'), ('first_frame_no_gl_checks', '0')):
+        samples = []
+        for _ in range(runs):
+            env = dict(os.environ, OGLVIEWER_GL_CHECKS=checks)
+            t = time.time()
+            proc = subprocess.run([sys.executable, '-c', code % MODELS[0]], capture_output=True, text=True,
+                                  cwd=ROOT, env=env)
+            if proc.returncode != 0:
+                print("startup: no software GL context available, first frame skipped", file=sys.stderr)
+                return
+            samples.append(float(proc.stdout.strip().splitlines()[-1]) - t)
+        results[f'startup/{name}'] = {
+            'median': statistics.median(samples), 'min': min(samples), 'mean': statistics.fmean(samples),
+            'stdev': statistics.stdev(samples), 'loops': 1, 'samples': samples}
+
+
+def run(groups, repeat, sizes):
+    results = {}
+    for group in groups:
+        t = time.perf_counter()
+        if group == 'synthetic':
+            bench_synthetic(results, repeat, sizes)
+        else:
+            globals()['bench_' + group](results, repeat)
+        print(f"{group}: {time.perf_counter() - t:.1f}s", file=sys.stderr)
+    return {
+        'meta': {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                 'python': platform.python_version(), 'numpy': np.__version__,
+                 'platform': platform.platform(), 'machine': platform.machine(),
+                 'cpus': os.cpu_count()},
+        'benchmarks': results,
+    }
+
+
+def compare(base_file, new_file, threshold):
+    base = json.load(open(base_file))['benchmarks']
+    new = json.load(open(new_file))['benchmarks']
+    regressions = []
+    print(f"{'benchmark':<48}{'base':>12}{'new':>12}{'ratio':>8}")
+    for name in sorted(set(base) & set(new)):
+        b, n = base[name]['median'], new[name]['median']
+        ratio = n / b if b > 0 else float('inf')
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            flag = '  faster'
+        print(f"{name:<48}{b * 1e3:>10.3f}ms{n * 1e3:>10.3f}ms{ratio:>8.2f}{flag}")
+    for name in sorted(set(base) ^ set(new)):
+        print(f"{name:<48}{'only in ' + (base_file if name in base else new_file):>32}")
+    print(f"{len(regressions)} regression(s) above {threshold:.0%}")
+    return 1 if regressions else 0
+
+
+def option(argv, name, default):
+    for arg in argv:
+        if arg.startswith(name + '='):
+            return arg.split('=', 1)[1]
+    return default
+
+
+def format_table(report):
+    lines = []
+    for name, stats in report['benchmarks'].items():
+        lines.append(f"{name:<48}{stats['median'] * 1e3:>12.4f} ms")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    argv = sys.argv[1:]
+    if argv and argv[0] == 'compare':
+        files = [a for a in argv[1:] if not a.startswith('--')]
+        sys.exit(compare(files[0], files[1], float(option(argv, '--threshold', 0.1))))
+
+    groups = option(argv, '--groups', ','.join(GROUPS)).split(',')
+    sizes = [int(float(s)) for s in option(argv, '--sizes', '1e5,1e6').split(',')]
+    repeat = int(option(argv, '--repeat', 5))
+    out = option(argv, '--out', 'benchmarks/results.json')
+
+    report = run(groups, repeat, sizes)
+    with open(out, 'w') as file:
+        json.dump(report, file, indent=1)
+    print(format_table(report))
+    print(f"results written to {out}", file=sys.stderr)
@@ -0,0 +1,162 @@
+"""
+camerapath.py
+
+Keyframed camera fly-throughs, evaluated for whole arrays of times at
+once: zoom and pan follow Catmull-Rom splines (zoom in log space, so equal
+factors take equal time), the rotation a SQUAD spline (Shoemake) through
+the key orientations. poses() turns the result into pose dicts of Scene
+attributes for headless.HeadlessRenderer, or to set on a Scene before
+draw().
+
+    path = CameraPath.load('flight.json')
+    renderer.export(path.poses(np.linspace(path.start, path.end, 240)), 'frames/fly_%04d.png')
+
+    python headless.py obj_files/bunny.obj --path=flight.json --frames=240
+
+JSON file: a list of keyframes
+    {"time": 2.0, "zoom": 1.5, "pan": [0.1, 0.0], "rotation": [w, x, y, z]}
+with "axis": [x, y, z] and "angle" (degrees) as alternative to "rotation";
+missing values repeat those of the previous keyframe.
+"""
+
+import json
+
+import numpy as np
+
+from quaternion import Quaternion, multiply_many, normalize_many, slerp_many
+
+
+def _quat_log(q):
+    # Logarithmus von Einheitsquaternionen: (N, 3) Achse * halber Winkel
+    v = q[:, 1:]
+    length = np.linalg.norm(v, axis=1)
+    angle = np.arctan2(length, q[:, 0])
+    scale = np.where(length > 1e-12, angle / np.where(length > 1e-12, length, 1.0), 1.0)
+    return v * scale[:, np.newaxis]
+
+
+def _quat_exp(v):
+    angle = np.linalg.norm(v, axis=1)
+    scale = np.where(angle > 1e-12, np.sin(angle) / np.where(angle > 1e-12, angle, 1.0), 1.0)
+    return np.concatenate([np.cos(angle)[:, np.newaxis], v * scale[:, np.newaxis]], axis=1)
+
+
+def _conjugate(q):
+    return q * np.array([1.0, -1.0, -1.0, -1.0])
+
+
+class CameraPath:
+    """
+    Keyframes at ascending times with zoom factors (K,), pan offsets
+    (K, 2 or 3) and rotations (K, 4) as (w, x, y, z) quaternions. Times
+    outside the keyframes are clamped to the first or last one.
+    """
+
+    def __init__(self, times, zooms=None, pans=None, rotations=None):
+        self.times = np.asarray(times, dtype=np.float64)
+        count = len(self.times)
+        if count == 0 or np.any(np.diff(self.times) <= 0):
+            raise ValueError("keyframe times must be ascending")
+        self.zooms = np.ones(count) if zooms is None else np.asarray(zooms, dtype=np.float64)
+        self.pans = np.zeros((count, 3))
+        if pans is not None:
+            pans = np.asarray(pans, dtype=np.float64)
+            self.pans[:, :pans.shape[1]] = pans
+        rotations = np.tile([1.0, 0.0, 0.0, 0.0], (count, 1)) if rotations is None else \
+            normalize_many(np.asarray(rotations, dtype=np.float64))
+        # aufeinanderfolgende Orientierungen auf dieselbe Halbkugel (kuerzester Weg)
+        for i in range(1, count):
+            if np.dot(rotations[i - 1], rotations[i]) < 0:
+                rotations[i] = -rotations[i]
+        self.rotations = rotations
+        self.controls = self._squad_controls(rotations)
+
+    @property
+    def start(self):
+        return float(self.times[0])
+
+    @property
+    def end(self):
+        return float(self.times[-1])
+
+    @classmethod
+    def from_keyframes(cls, keyframes):
+        times, zooms, pans, rotations = [], [], [], []
+        zoom, pan, rotation = 1.0, [0.0, 0.0, 0.0], [1.0, 0.0, 0.0, 0.0]
+        for key in keyframes:
+            zoom = key.get('zoom', zoom)
+            if 'pan' in key:
+                pan = (list(key['pan']) + [0.0, 0.0, 0.0])[:3]
+            if 'rotation' in key:
+                rotation = key['rotation']
+            elif 'axis' in key:
+                rotation = Quaternion.from_axis_angle(key['axis'], key.get('angle', 0.0)).to_array()
+            times.append(key['time'])
+            zooms.append(zoom)
+            pans.append(pan)
+            rotations.append(rotation)
+        return cls(times, zooms, pans, rotations)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as file:
+            return cls.from_keyframes(json.load(file))
+
+    @staticmethod
+    def _squad_controls(q):
+        # s_i = q_i exp(-(log(q_i^-1 q_i+1) + log(q_i^-1 q_i-1)) / 4), Enden ohne Tangente
+        if len(q) < 3:
+            return q.copy()
+        inverse = _conjugate(q[1:-1])
+        tangent = _quat_log(multiply_many(inverse, q[2:])) + _quat_log(multiply_many(inverse, q[:-2]))
+        inner = normalize_many(multiply_many(q[1:-1], _quat_exp(-0.25 * tangent)))
+        return np.concatenate([q[:1], inner, q[-1:]])
+
+    def _segments(self, t):
+        # Segment i und lokaler Parameter u in [0, 1] je Zeitpunkt
+        t = np.clip(np.asarray(t, dtype=np.float64), self.times[0], self.times[-1])
+        if len(self.times) == 1:
+            return np.zeros(len(t), dtype=np.int64), np.zeros(len(t))
+        i = np.clip(np.searchsorted(self.times, t, side='right') - 1, 0, len(self.times) - 2)
+        u = (t - self.times[i]) / (self.times[i + 1] - self.times[i])
+        return i, u
+
+    def _hermite(self, values, i, u):
+        # Catmull-Rom fuer ungleichmaessige Zeiten, Tangenten aus den Nachbarn
+        if len(self.times) == 1:
+            return np.broadcast_to(values[0], (len(u),) + values.shape[1:]).copy()
+        times = self.times
+        tangents = np.empty_like(values)
+        tangents[1:-1] = ((values[2:] - values[:-2]).T / (times[2:] - times[:-2])).T
+        tangents[0] = (values[1] - values[0]) / (times[1] - times[0])
+        tangents[-1] = (values[-1] - values[-2]) / (times[-1] - times[-2])
+        h = times[i + 1] - times[i]
+        u2, u3 = u * u, u * u * u
+        h00, h10 = 2 * u3 - 3 * u2 + 1, u3 - 2 * u2 + u
+        h01, h11 = -2 * u3 + 3 * u2, u3 - u2
+        if values.ndim > 1:
+            h00, h10, h01, h11, h = (c[:, np.newaxis] for c in (h00, h10, h01, h11, h))
+        return h00 * values[i] + h10 * h * tangents[i] + h01 * values[i + 1] + h11 * h * tangents[i + 1]
+
+    def evaluate(self, t):
+        """
+        (zoom (N,), pan (N, 3), rotation (N, 4)) at the times t (N,).
+        """
+        i, u = self._segments(np.atleast_1d(t))
+        zoom = np.exp(self._hermite(np.log(self.zooms), i, u))
+        pan = self._hermite(self.pans, i, u)
+        if len(self.times) == 1:
+            rotation = np.broadcast_to(self.rotations[0], (len(u), 4)).copy()
+        else:
+            q, s = self.rotations, self.controls
+            outer = slerp_many(q[i], q[i + 1], u, shortest=False)
+            inner = slerp_many(s[i], s[i + 1], u, shortest=False)
+            rotation = slerp_many(outer, inner, 2 * u * (1 - u), shortest=False)
+        return zoom, pan, rotation
+
+    def poses(self, t):
+        # Pose-Dicts (Scene-Attribute) fuer HeadlessRenderer.render / export
+        zoom, pan, rotation = self.evaluate(t)
+        return [{'animate': False, 'zoom_factor': float(z), 'pan_offset': p.astype(np.float32),
+                 'rotation': Quaternion.from_array(q)}
+                for z, p, q in zip(zoom, pan, rotation)]
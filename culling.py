@@ -0,0 +1,168 @@
+"""
+culling.py
+
+CPU-side view-frustum culling, all tests vectorized over many volumes:
+
+- compute_bounds: AABB and bounding sphere of a mesh (at load time),
+- frustum_planes: the six planes of a (row-major) projection @ view
+  [@ model] matrix after Gribb & Hartmann, in the space the matrix maps
+  from, so object-space bounds can be tested without transforming them,
+- spheres_visible / classify_aabbs: sphere and box tests against them,
+- ClusterBVH: splits the index buffer of one large mesh into clusters of
+  consecutive triangles, builds a BVH over their boxes and returns the
+  visible clusters as merged (count, offset) ranges for glMultiDrawElements,
+- spatial_order / triangle_order: triangle order that keeps those
+  clusters compact (also used by picking.PickIndex).
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+DEFAULT_CLUSTER_SIZE = 256
+
+OUTSIDE, INTERSECTING, INSIDE = 0, 1, 2
+
+Bounds = namedtuple('Bounds', 'min max center radius')
+
+
+def compute_bounds(vertices):
+    vertices = np.asarray(vertices, dtype=np.float32)
+    lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+    center = (lo + hi) * 0.5
+    radius = float(np.sqrt(np.max(np.sum((vertices - center) ** 2, axis=1))))
+    return Bounds(lo, hi, center, radius)
+
+
+def frustum_planes(matrix):
+    # Zeilen der Clip-Matrix kombinieren: links, rechts, unten, oben, nah, fern
+    m = np.asarray(matrix, dtype=np.float64)
+    planes = np.stack([m[3] + m[0], m[3] - m[0], m[3] + m[1],
+                       m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+    # (a, b, c, d) mit |(a, b, c)| = 1, innen: a x + b y + c z + d >= 0
+    return planes / np.linalg.norm(planes[:, :3], axis=1)[:, np.newaxis]
+
+
+def spheres_visible(planes, centers, radii):
+    # (N,) bool: Kugel liegt nicht vollstaendig ausserhalb einer Ebene
+    distances = np.asarray(centers) @ planes[:, :3].T + planes[:, 3]
+    return np.all(distances >= -np.asarray(radii)[:, np.newaxis], axis=1)
+
+
+def classify_aabbs(planes, mins, maxs):
+    """
+    (N,) array of OUTSIDE, INTERSECTING or INSIDE. Uses the box corner
+    farthest along (p-vertex) and against (n-vertex) each plane normal.
+    """
+    positive = planes[:, :3] > 0
+    p_vertex = np.where(positive, maxs[:, np.newaxis, :], mins[:, np.newaxis, :])
+    n_vertex = np.where(positive, mins[:, np.newaxis, :], maxs[:, np.newaxis, :])
+    p_distance = np.einsum('nij,ij->ni', p_vertex, planes[:, :3]) + planes[:, 3]
+    n_distance = np.einsum('nij,ij->ni', n_vertex, planes[:, :3]) + planes[:, 3]
+    result = np.full(len(mins), INTERSECTING, dtype=np.int8)
+    result[np.all(n_distance >= 0, axis=1)] = INSIDE
+    result[np.any(p_distance < 0, axis=1)] = OUTSIDE
+    return result
+
+
+def _morton_codes(points, lo, hi):
+    # 10 Bit je Achse verschraenkt: raeumlich benachbarte Cluster liegen im Baum nah beieinander
+    extent = np.where(hi > lo, hi - lo, 1.0)
+    q = np.clip(((points - lo) / extent * 1023).astype(np.uint64), 0, 1023)
+    codes = np.zeros(len(points), dtype=np.uint64)
+    for bit in range(10):
+        for axis in range(3):
+            codes |= ((q[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(3 * bit + axis)
+    return codes
+
+
+class ClusterBVH:
+    """
+    Binary BVH over clusters of cluster_size consecutive triangles of a flat
+    index buffer. Leaves are the clusters in Morton order of their centers,
+    level k node i covers leaves [i * 2**k, (i + 1) * 2**k).
+    """
+
+    def __init__(self, vertices, indices, cluster_size=DEFAULT_CLUSTER_SIZE):
+        tris = np.asarray(indices).reshape(-1, 3)
+        self.cluster_size = cluster_size
+        self.triangle_count = len(tris)
+        starts = np.arange(0, len(tris), cluster_size)
+        self.cluster_count = len(starts)
+        # erster Index und Anzahl Indices je Cluster
+        self.cluster_first = starts * 3
+        self.cluster_counts = np.minimum(cluster_size, len(tris) - starts) * 3
+
+        corners = np.asarray(vertices, dtype=np.float32)[tris]
+        tri_min, tri_max = corners.min(axis=1), corners.max(axis=1)
+        mins = np.minimum.reduceat(tri_min, starts, axis=0)
+        maxs = np.maximum.reduceat(tri_max, starts, axis=0)
+        self.cluster_min, self.cluster_max = mins, maxs
+
+        self.leaf_order = np.argsort(_morton_codes((mins + maxs) * 0.5, mins.min(axis=0), maxs.max(axis=0)),
+                                     kind='stable')
+        self.levels = [(mins[self.leaf_order], maxs[self.leaf_order])]
+        while len(self.levels[-1][0]) > 1:
+            lo, hi = self.levels[-1]
+            if len(lo) % 2:
+                lo, hi = np.concatenate([lo, lo[-1:]]), np.concatenate([hi, hi[-1:]])
+            self.levels.append((np.minimum(lo[0::2], lo[1::2]), np.maximum(hi[0::2], hi[1::2])))
+
+    def cull(self, planes):
+        """
+        (N,) bool mask of visible clusters. Subtrees completely inside the
+        frustum are accepted without testing their children.
+        """
+        visible = np.zeros(self.cluster_count, dtype=bool)
+        active = np.arange(len(self.levels[-1][0]))
+        for level in range(len(self.levels) - 1, -1, -1):
+            lo, hi = self.levels[level]
+            state = classify_aabbs(planes, lo[active], hi[active])
+            inside = active[state == INSIDE]
+            if len(inside):
+                leaves = ((inside[:, np.newaxis] << level) + np.arange(1 << level)).ravel()
+                visible[self.leaf_order[leaves[leaves < self.cluster_count]]] = True
+            active = active[state == INTERSECTING]
+            if level == 0:
+                visible[self.leaf_order[active]] = True
+            else:
+                active = np.concatenate([2 * active, 2 * active + 1])
+                active = active[active < len(self.levels[level - 1][0])]
+            if len(active) == 0:
+                break
+        return visible
+
+    def draw_ranges(self, visible, index_size, base_offset=0):
+        """
+        Merges runs of visible clusters into (counts int32, byte offsets)
+        ready for glMultiDrawElements.
+        """
+        ids = np.flatnonzero(visible)
+        if len(ids) == 0:
+            return np.empty(0, np.int32), np.empty(0, np.uintp)
+        # neuer Bereich, wo der Vorgaenger nicht sichtbar ist
+        starts = np.concatenate([[True], np.diff(ids) > 1])
+        first = ids[starts]
+        last = ids[np.concatenate([starts[1:], [True]])]
+        counts = self.cluster_first[last] + self.cluster_counts[last] - self.cluster_first[first]
+        offsets = base_offset + self.cluster_first[first] * index_size
+        return counts.astype(np.int32), offsets.astype(np.uintp)
+
+
+def triangle_order(vertices, indices):
+    # Permutation der Dreiecke nach dem Morton-Code ihrer Schwerpunkte
+    vertices = np.asarray(vertices, dtype=np.float32)
+    tris = np.asarray(indices).reshape(-1, 3)
+    centroids = vertices[tris].mean(axis=1)
+    codes = _morton_codes(centroids, vertices.min(axis=0), vertices.max(axis=0))
+    return np.argsort(codes, kind='stable')
+
+
+def spatial_order(vertices, indices):
+    """
+    Triangles sorted by the Morton code of their centroids, so that runs of
+    consecutive triangles (the clusters of ClusterBVH) are compact. The
+    vertex cache order of meshopt.py is already coherent enough.
+    """
+    tris = np.asarray(indices).reshape(-1, 3)
+    return tris[triangle_order(vertices, tris)].ravel()
@@ -0,0 +1,44 @@
+"""
+glplatform.py
+
+Chooses the PyOpenGL platform for offscreen rendering. PyOpenGL reads
+PYOPENGL_PLATFORM once, on the first import of OpenGL, so
+select_platform() has to run before that (and before importing headless
+or oglViewer); this module itself imports no OpenGL.
+
+    import glplatform
+    glplatform.select_platform('egl')
+    import headless
+"""
+
+import os
+import sys
+
+BACKENDS = ('egl', 'osmesa', 'numpy')
+
+
+def backend_option(argv, default='egl'):
+    # Wert von --backend=... aus einer Argumentliste
+    return next((a.split('=', 1)[1] for a in argv if a.startswith('--backend=')), default)
+
+
+def select_platform(backend):
+    """
+    Sets PYOPENGL_PLATFORM (and EGL_PLATFORM=surfaceless) for backend.
+    'numpy' renders without GL and leaves the environment alone.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend '{backend}'")
+    if backend == 'numpy':
+        return backend
+    if 'OpenGL.platform' in sys.modules and os.environ.get('PYOPENGL_PLATFORM') != backend:
+        raise RuntimeError(f"OpenGL was imported before select_platform('{backend}')")
+    os.environ['PYOPENGL_PLATFORM'] = backend
+    os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+    return backend
+
+
+def current_backend():
+    # das gewaehlte GL-Backend fuer create_context, ohne Auswahl EGL
+    platform = os.environ.get('PYOPENGL_PLATFORM')
+    return platform if platform in BACKENDS else 'egl'
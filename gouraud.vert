@@ -6,15 +6,18 @@ layout (location=1) in vec3 v_normal;
 uniform mat4 modelview_projection_matrix;
 uniform mat4 modelview_matrix;
 uniform mat3 normal_matrix;
+uniform vec3 position_scale;   // Dequantisierung (1 bzw. 0 bei float-Positionen)
+uniform vec3 position_offset;
 uniform float shininess;
 
 out vec3 v_color;
 
 void main()
 {
+    vec3 position = v_position * position_scale + position_offset;
     vec3 normal = normalize(normal_matrix * v_normal);
     vec3 lightDir = normalize(vec3(0.5, 0.5, 1.0)); 
-    vec3 eyePos = vec3(modelview_matrix * vec4(v_position,1));
+    vec3 eyePos = vec3(modelview_matrix * vec4(position,1));
 
     float diff = max(dot(normal, lightDir), 0.0);
 
@@ -32,5 +35,5 @@ void main()
 
     v_color = ambient + diffuse + specular;
 
-    gl_Position = modelview_projection_matrix * vec4(v_position,1);
+    gl_Position = modelview_projection_matrix * vec4(position,1);
 }
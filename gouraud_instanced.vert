@@ -0,0 +1,41 @@
+#version 330
+
+layout (location=0) in vec3 v_position;
+layout (location=1) in vec3 v_normal;
+layout (location=2) in mat4 instance_matrix;   // Modellmatrix je Instanz (Locations 2-5)
+
+uniform mat4 modelview_projection_matrix;
+uniform mat4 modelview_matrix;
+uniform mat3 normal_matrix;
+uniform vec3 position_scale;   // Dequantisierung (1 bzw. 0 bei float-Positionen)
+uniform vec3 position_offset;
+uniform float shininess;
+
+out vec3 v_color;
+
+void main()
+{
+    vec4 position = instance_matrix * vec4(v_position * position_scale + position_offset, 1);
+    // Instanzen: Rotation + uniforme Skalierung, normalize gleicht die Skalierung aus
+    vec3 normal = normalize(normal_matrix * (mat3(instance_matrix) * v_normal));
+    vec3 lightDir = normalize(vec3(0.5, 0.5, 1.0)); 
+    vec3 eyePos = vec3(modelview_matrix * position);
+
+    float diff = max(dot(normal, lightDir), 0.0);
+
+    vec3 materialDiffuse = vec3(0.4, 0.4, 0.8);
+    vec3 materialSpecular = vec3(1.0);
+    vec3 ambient = 0.1 * materialDiffuse;
+
+    vec3 diffuse = diff * materialDiffuse;
+
+    vec3 viewDir = normalize(-eyePos);
+    vec3 reflectDir = reflect(-lightDir, normal);
+
+    float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
+    vec3 specular = spec * materialSpecular;
+
+    v_color = ambient + diffuse + specular;
+
+    gl_Position = modelview_projection_matrix * position;
+}
@@ -0,0 +1,352 @@
+"""
+headless.py
+
+Offscreen rendering without a window: creates an EGL (surfaceless) or
+OSMesa context, renders Scene into a framebuffer object for a list of
+camera poses and writes the frames as PNG files or as a raw RGBA stream.
+Pixels are read back asynchronously through two pixel buffer objects, so
+frame i is copied out while frame i+1 is being rendered. Runs on Mesa's
+software rasterizer (llvmpipe) on machines without a GPU; --backend=numpy
+needs no GL driver at all and draws with softraster.py instead. Code that
+imports headless chooses the platform first: glplatform.select_platform().
+
+    python headless.py obj_files/bunny.obj --frames=36 --out=frames/turn_%03d.png
+    python headless.py obj_files/cow.obj obj_files/bunny.obj --grid=100 --out=frames/herd_%03d.png
+    python headless.py obj_files/bunny.obj --backend=numpy --frames=1 --out=bunny.png
+    python headless.py obj_files/bunny.obj --path=flight.json --frames=240 --out=frames/fly_%04d.png
+    python headless.py obj_files/cow.obj --out=- | ffmpeg -f rawvideo -pix_fmt rgba -s 640x480 -i - turn.mp4
+
+Options: --frames=N, --size=WxH, --shading=0|1|2, --projection=0|1,
+         --backend=egl|osmesa|numpy, --out=PATTERN.png | FILE | - (stdout),
+         --profile-out=FILE.json|FILE.csv,
+         --path=FILE.json (keyframed camera path, camerapath.py, instead of the turntable)
+"""
+
+import os
+import sys
+
+from glplatform import backend_option, current_backend, select_platform
+
+if __name__ == '__main__':
+    # als Skript: GL-Plattform vor dem ersten OpenGL-Import unten waehlen; beim
+    # Import als Modul bleibt die Umgebung unveraendert (siehe glplatform.py)
+    select_platform(backend_option(sys.argv[1:], current_backend()))
+
+import ctypes
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from OpenGL.GL import *
+
+from camerapath import CameraPath
+from meshcache import load_mesh
+from oglViewer import Scene, command_line, configure_logging, option_value
+from softraster import Rasterizer
+
+
+def create_context(width, height, backend=None):
+    """
+    Make an OpenGL 3.3 core context current without any window system.
+    Returns an opaque handle that has to stay alive while rendering.
+    backend defaults to the platform chosen with glplatform.select_platform.
+    """
+    backend = backend or current_backend()
+    if backend == 'egl':
+        from OpenGL import EGL
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError("eglInitialize failed")
+        config_attribs = [EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                          EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                          EGL.EGL_NONE]
+        config, count = EGL.EGLConfig(), EGL.EGLint()
+        EGL.eglChooseConfig(display, (EGL.EGLint * len(config_attribs))(*config_attribs),
+                            ctypes.pointer(config), 1, ctypes.pointer(count))
+        if count.value == 0:
+            raise RuntimeError("no EGL config with desktop OpenGL support")
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context_attribs = [EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+                           EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+                           EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+                           EGL.EGL_NONE]
+        context = EGL.eglCreateContext(display, config, EGL.EGL_NO_CONTEXT,
+                                       (EGL.EGLint * len(context_attribs))(*context_attribs))
+        # gerendert wird ohnehin in ein FBO, daher keine Surface
+        if not EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, context):
+            raise RuntimeError("eglMakeCurrent failed")
+        return display, context
+    if backend == 'osmesa':
+        from OpenGL import osmesa
+        from OpenGL import arrays
+        context = osmesa.OSMesaCreateContextAttribs([
+            osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+            osmesa.OSMESA_DEPTH_BITS, 24,
+            osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+            osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3,
+            osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3,
+            0], None)
+        if not context:
+            raise RuntimeError("OSMesaCreateContextAttribs failed")
+        buffer = arrays.GLubyteArray.zeros((height, width, 4))
+        if not osmesa.OSMesaMakeCurrent(context, buffer, GL_UNSIGNED_BYTE, width, height):
+            raise RuntimeError("OSMesaMakeCurrent failed")
+        return context, buffer
+    raise ValueError(f"unknown backend '{backend}'")
+
+
+def destroy_context(handle, backend=None):
+    # Gegenstueck zu create_context; FBO und PBOs verschwinden mit dem Kontext
+    backend = backend or current_backend()
+    if backend == 'egl':
+        from OpenGL import EGL
+        display, context = handle
+        EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(display, context)
+        EGL.eglTerminate(display)
+    elif backend == 'osmesa':
+        from OpenGL import osmesa
+        osmesa.OSMesaDestroyContext(handle[0])
+
+
+class OffscreenTarget:
+    """
+    Framebuffer object with RGBA8 color and 24 bit depth renderbuffers.
+    """
+
+    def __init__(self, width, height):
+        self.width, self.height = width, height
+        self.framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        self.color, self.depth = glGenRenderbuffers(2)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("framebuffer incomplete")
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glViewport(0, 0, self.width, self.height)
+
+
+class PixelReader:
+    """
+    Asynchronous readback through a ring of pixel pack buffers: start()
+    queues glReadPixels into the next PBO and returns at once, finish()
+    maps the oldest PBO once the GPU is done with it.
+    """
+
+    def __init__(self, width, height, count=2):
+        self.width, self.height = width, height
+        self.size = width * height * 4
+        self.buffers = list(np.atleast_1d(glGenBuffers(count)))
+        for pbo in self.buffers:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.size, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.pending = []
+
+    def start(self):
+        pbo = self.buffers[len(self.pending) % len(self.buffers)]
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.pending.append(pbo)
+        # Ring voll: aeltesten Frame abholen
+        if len(self.pending) == len(self.buffers):
+            return self.finish()
+        return None
+
+    def finish(self):
+        pbo = self.pending.pop(0)
+        self.buffers.remove(pbo)
+        self.buffers.append(pbo)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        pointer = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, self.size, GL_MAP_READ_BIT)
+        pixels = np.empty((self.height, self.width, 4), dtype=np.uint8)
+        ctypes.memmove(pixels.ctypes.data, pointer, self.size)
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        # OpenGL liefert die unterste Zeile zuerst
+        return pixels[::-1]
+
+    def drain(self):
+        while self.pending:
+            yield self.finish()
+
+
+def write_png(filename, pixels):
+    # minimaler PNG-Encoder (RGBA, 8 Bit) ohne weitere Abhaengigkeiten
+    height, width, _ = pixels.shape
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = pixels.reshape(height, -1)
+
+    def chunk(tag, data):
+        return (struct.pack('>I', len(data)) + tag + data
+                + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    with open(filename, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n')
+        file.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)))
+        file.write(chunk(b'IDAT', zlib.compress(raw.tobytes(), 6)))
+        file.write(chunk(b'IEND', b''))
+
+
+def turntable_poses(frames, rotation=None):
+    # eine volle Drehung um y ueber die vorhandene angle/rotate_y-Logik,
+    # rotation (Quaternion) ist die feste Ausgangslage
+    poses = []
+    for i in range(frames):
+        pose = {'animate': True, 'angle_increment': 0, 'angle': 360.0 * i / frames}
+        if rotation is not None:
+            pose['rotation'] = rotation
+        poses.append(pose)
+    return poses
+
+
+class HeadlessRenderer:
+    """
+    Renders a Scene offscreen; a pose is a dict of Scene attributes that
+    are set before the frame is drawn.
+    """
+
+    def __init__(self, scene, backend=None):
+        self.scene = scene
+        self.backend = backend or current_backend()
+        self.context = create_context(scene.width, scene.height, backend)
+        self.target = OffscreenTarget(scene.width, scene.height)
+        self.reader = PixelReader(scene.width, scene.height)
+
+        # wie RenderWindow.init_GL
+        glClearColor(0, 0, 0, 0)
+        glEnable(GL_DEPTH_TEST)
+        self.scene.init_GL()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.context is not None:
+            destroy_context(self.context, self.backend)
+            self.context = None
+
+    def render(self, poses):
+        """
+        Generator over (index, pixels) in pose order; pixels is an
+        (height, width, 4) uint8 array with the top row first.
+        """
+        self.target.bind()
+        profiler = self.scene.profiler
+        done = 0
+        for pose in poses:
+            profiler.begin_frame()
+            for name, value in pose.items():
+                setattr(self.scene, name, value)
+            self.scene.draw()
+            pixels = self.reader.start()
+            profiler.end_frame()
+            if pixels is not None:
+                yield done, pixels
+                done += 1
+        for pixels in self.reader.drain():
+            yield done, pixels
+            done += 1
+
+    def export(self, poses, out):
+        """
+        Writes all frames: out with a %d pattern and .png suffix gives one
+        PNG per frame, '-' a raw RGBA stream on stdout, anything else a raw
+        RGBA stream into that file. Encoding runs on a writer thread.
+        """
+        if out.endswith('.png'):
+            directory = os.path.dirname(out)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with ThreadPoolExecutor(max_workers=1) as writer:
+                pending = []
+                for i, pixels in self.render(poses):
+                    pending.append(writer.submit(write_png, out % i if '%' in out else out, pixels))
+                    # fertige Dateien pruefen: ein Schreibfehler bricht den Export ab
+                    while pending and pending[0].done():
+                        pending.pop(0).result()
+                for future in pending:
+                    future.result()
+            return
+        stream = sys.stdout.buffer if out == '-' else open(out, 'wb')
+        try:
+            for _, pixels in self.render(poses):
+                stream.write(pixels.tobytes())
+        finally:
+            if stream is not sys.stdout.buffer:
+                stream.close()
+
+
+class SoftwareRenderer(HeadlessRenderer):
+    """
+    HeadlessRenderer without GL: the frames come from softraster.Rasterizer
+    with the matrices Scene.draw would use (full detail mesh, first file).
+    """
+
+    def __init__(self, scene, workers=None):
+        self.scene = scene
+        filename = scene.filename or scene.filenames[0]
+        self.mesh = load_mesh(filename, scene.mesh_cache, optimize=scene.optimize_mesh)
+        self.rasterizer = Rasterizer(scene.width, scene.height, workers=workers)
+
+    def close(self):
+        # Thread-Pool der Kacheln beenden
+        self.rasterizer.shutdown()
+
+    def render(self, poses):
+        profiler = self.scene.profiler
+        mesh = self.mesh
+        for i, pose in enumerate(poses):
+            profiler.begin_frame()
+            for name, value in pose.items():
+                setattr(self.scene, name, value)
+            mvp_matrix, mv_matrix, normal_matrix = self.scene.update_matrices()
+            profiler.lap('matrices')
+            pixels = self.rasterizer.render(mesh['vertices'], mesh['normals'], mesh['indices'],
+                                            mvp_matrix, mv_matrix, normal_matrix, self.scene.shading_mode)
+            profiler.lap('draw')
+            profiler.end_frame()
+            yield i, pixels
+
+
+if __name__ == '__main__':
+    configure_logging()
+    if not command_line()[0]:
+        print(__doc__)
+        sys.exit(1)
+
+    width, height = map(int, option_value('--size', '640x480').split('x'))
+    frames = int(option_value('--frames', 36))
+    out = option_value('--out', 'frames/frame_%04d.png')
+
+    scene = Scene(width, height)
+    scene.shading_mode = int(option_value('--shading', 2))
+    scene.projection_mode = int(option_value('--projection', 0))
+
+    path = option_value('--path')
+    if path:
+        camera_path = CameraPath.load(path)
+        poses = camera_path.poses(np.linspace(camera_path.start, camera_path.end, frames))
+    else:
+        poses = turntable_poses(frames)
+    backend = backend_option(sys.argv[1:], current_backend())
+    with SoftwareRenderer(scene) if backend == 'numpy' else HeadlessRenderer(scene, backend) as renderer:
+        renderer.export(poses, out)
+
+    profile_out = option_value('--profile-out')
+    if profile_out:
+        scene.profiler.dump(profile_out)
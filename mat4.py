@@ -23,61 +23,109 @@
  ****
 """
 
-import numpy as np
-
-
-def rotate_x(angle):
-    angle = np.radians(angle)
-    return np.array([[1,       0      ,           0    , 0],
-                     [0, np.cos(angle),  -np.sin(angle), 0],
-                     [0, np.sin(angle),   np.cos(angle), 0],
-                     [0,    0         ,      0         , 1]])
-
-
-def rotate_y(angle):
-    angle = np.radians(angle)
-    return np.array([[np.cos(angle)   ,  0 , np.sin(angle), 0],
-                     [      0         ,  1 ,          0    , 0],
-                     [-np.sin(angle)  ,  0 , np.cos(angle) , 0],
-                     [   0            ,  0 ,    0          , 1]])
-
-
-def rotate_z(angle):
-    angle = np.radians(angle)
-    return np.array([[np.cos(angle), -np.sin(angle), 0, 0],
-                     [np.sin(angle),  np.cos(angle), 0, 0],
-                     [   0         ,      0        , 1, 0],
-                     [   0         ,      0        , 0, 1]])
-
-
-def rotate(angle, axis):
-    angle = np.radians(angle)
-    c, mc, s = np.cos(angle), 1-np.cos(angle), np.sin(angle)
-    x, y, z = list(np.array(axis) / np.linalg.norm(np.array(axis)))
-    return  np.array([[x*x*mc + c    , x*y*mc - z*s , x*z*mc + y*s  , 0],
-                      [x*y*mc + z*s  , y*y*mc + c   , y*z*mc - x*s  , 0], 
-                      [x*z*mc - y*s  , y*z*mc + x*s , z*z*mc + c    , 0], 
-                      [     0        ,      0       ,      0        , 1]])
-
-
-def scale(sx, sy, sz):
-    return np.array([[sx, 0 , 0 , 0],
-                     [0 , sy, 0 , 0],
-                     [0 , 0 , sz, 0],
-                     [0 , 0 , 0 , 1]])
-
-
-def translate(x, y, z):
-    return np.array([[1, 0, 0, x],
-                     [0, 1, 0, y],
-                     [0, 0, 1, z],
-                     [0, 0, 0, 1]])
+import math
 
+import numpy as np
 
-def look_at(ex, ey, ez, cx, cy, cz, ux, uy, uz):
-    e = np.array([ex, ey, ez]) # eye position
-    c = np.array([cx, cy, cz]) # center
-    up = np.array([ux, uy, uz]) # up vector
+# alle Matrizen sind float32, so wie sie an OpenGL gehen; jede Funktion
+# schreibt optional in einen vorab angelegten Puffer out (4x4, float32)
+DTYPE = np.float32
+
+
+def _mat(rows, out):
+    if out is None:
+        return np.array(rows, dtype=DTYPE)
+    out[...] = rows
+    return out
+
+
+def rotate_x(angle, out=None):
+    angle = math.radians(angle)
+    c, s = math.cos(angle), math.sin(angle)
+    return _mat([[1,  0,  0, 0],
+                 [0,  c, -s, 0],
+                 [0,  s,  c, 0],
+                 [0,  0,  0, 1]], out)
+
+
+def rotate_y(angle, out=None):
+    angle = math.radians(angle)
+    c, s = math.cos(angle), math.sin(angle)
+    return _mat([[ c, 0, s, 0],
+                 [ 0, 1, 0, 0],
+                 [-s, 0, c, 0],
+                 [ 0, 0, 0, 1]], out)
+
+
+def rotate_z(angle, out=None):
+    angle = math.radians(angle)
+    c, s = math.cos(angle), math.sin(angle)
+    return _mat([[c, -s, 0, 0],
+                 [s,  c, 0, 0],
+                 [0,  0, 1, 0],
+                 [0,  0, 0, 1]], out)
+
+
+def rotate(angle, axis, out=None):
+    angle = math.radians(angle)
+    c, s = math.cos(angle), math.sin(angle)
+    mc = 1 - c
+    x, y, z = (float(a) for a in axis)
+    l = math.sqrt(x*x + y*y + z*z)
+    x, y, z = x/l, y/l, z/l
+    return _mat([[x*x*mc + c    , x*y*mc - z*s , x*z*mc + y*s  , 0],
+                 [x*y*mc + z*s  , y*y*mc + c   , y*z*mc - x*s  , 0],
+                 [x*z*mc - y*s  , y*z*mc + x*s , z*z*mc + c    , 0],
+                 [     0        ,      0       ,      0        , 1]], out)
+
+
+def rotate_many(angles, axes, out=None):
+    """
+    Batch version of rotate: angles (N,) in degrees, axes (N, 3) or a
+    single axis (3,). Returns an (N, 4, 4) array.
+    """
+    angles = np.radians(np.asarray(angles, dtype=np.float64)).reshape(-1)
+    axes = np.asarray(axes, dtype=np.float64)
+    axes = np.broadcast_to(axes / np.linalg.norm(axes, axis=-1, keepdims=True),
+                           (len(angles), 3))
+    c, s = np.cos(angles), np.sin(angles)
+    mc = 1 - c
+    x, y, z = axes[:, 0], axes[:, 1], axes[:, 2]
+    if out is None:
+        out = np.empty((len(angles), 4, 4), dtype=DTYPE)
+    out[:, 0, 0] = x*x*mc + c
+    out[:, 0, 1] = x*y*mc - z*s
+    out[:, 0, 2] = x*z*mc + y*s
+    out[:, 1, 0] = x*y*mc + z*s
+    out[:, 1, 1] = y*y*mc + c
+    out[:, 1, 2] = y*z*mc - x*s
+    out[:, 2, 0] = x*z*mc - y*s
+    out[:, 2, 1] = y*z*mc + x*s
+    out[:, 2, 2] = z*z*mc + c
+    out[:, :3, 3] = 0
+    out[:, 3, :3] = 0
+    out[:, 3, 3] = 1
+    return out
+
+
+def scale(sx, sy, sz, out=None):
+    return _mat([[sx, 0 , 0 , 0],
+                 [0 , sy, 0 , 0],
+                 [0 , 0 , sz, 0],
+                 [0 , 0 , 0 , 1]], out)
+
+
+def translate(x, y, z, out=None):
+    return _mat([[1, 0, 0, x],
+                 [0, 1, 0, y],
+                 [0, 0, 1, z],
+                 [0, 0, 0, 1]], out)
+
+
+def look_at(ex, ey, ez, cx, cy, cz, ux, uy, uz, out=None):
+    e = np.array([ex, ey, ez], dtype=np.float64) # eye position
+    c = np.array([cx, cy, cz], dtype=np.float64) # center
+    up = np.array([ux, uy, uz], dtype=np.float64) # up vector
     # normalize up vector
     up = up / np.linalg.norm(up)
     # get view direction
@@ -86,32 +134,41 @@ def look_at(ex, ey, ez, cx, cy, cz, ux, uy, uz):
     s = np.cross(f, up) / np.linalg.norm(np.cross(f, up))
     u = np.cross(s,f)
     # create lookAt matrix
-    return np.array([[ s[0] ,  s[1] ,  s[2] ,  s@e],
-                     [ u[0] ,  u[1] ,  u[2] , -u@e], 
-                     [-f[0] , -f[1] , -f[2] ,  f@e],
-                     [  0   ,   0   ,   0   ,   1]])
-
-
-def ortho(l, r, b, t, n, f):
-    return np.array([[2/(r-l), 0        , 0         , -(r+l)/(r-l)],
-                     [0      , 2/(t-b)  , 0         , -(t+b)/(t-b)],
-                     [0      ,    0     , -2/(f-n)  , -(f+n)/(f-n)],
-                     [0      ,      0   ,          0, 1]])
-
-
-def frustum(l, r, b, t, n, f):
-    return np.array([[2*n/(r-l) ,       0   , (r+l)/(r-l)   ,       0       ],
-                     [    0     , 2*n/(t-b) , (t+b)/(t-b)   ,       0       ],
-                     [    0     ,      0    , -(f+n)/(f-n)  , -2*f*n/(f-n)  ],
-                     [    0     ,      0    ,    -1         ,       0       ]])
-
-
-def perspective(fovy, aspect, zNear, zFar):
-    f = 1.0 / np.tan(np.radians(fovy/2.0)) # cotan(fovy/2)
-    return np.array([[f/aspect ,   0,          0               ,       0],
-                     [ 0       ,   f,          0               ,       0],
-                     [ 0       ,   0, (zFar+zNear)/(zNear-zFar), (2*zFar*zNear)/(zNear-zFar)],
-                     [ 0       ,   0,          -1              , 0]])
-
-
-
+    return _mat([[ s[0] ,  s[1] ,  s[2] ,  s@e],
+                 [ u[0] ,  u[1] ,  u[2] , -u@e],
+                 [-f[0] , -f[1] , -f[2] ,  f@e],
+                 [  0   ,   0   ,   0   ,   1]], out)
+
+
+def ortho(l, r, b, t, n, f, out=None):
+    return _mat([[2/(r-l), 0        , 0         , -(r+l)/(r-l)],
+                 [0      , 2/(t-b)  , 0         , -(t+b)/(t-b)],
+                 [0      ,    0     , -2/(f-n)  , -(f+n)/(f-n)],
+                 [0      ,      0   ,          0, 1]], out)
+
+
+def frustum(l, r, b, t, n, f, out=None):
+    return _mat([[2*n/(r-l) ,       0   , (r+l)/(r-l)   ,       0       ],
+                 [    0     , 2*n/(t-b) , (t+b)/(t-b)   ,       0       ],
+                 [    0     ,      0    , -(f+n)/(f-n)  , -2*f*n/(f-n)  ],
+                 [    0     ,      0    ,    -1         ,       0       ]], out)
+
+
+def perspective(fovy, aspect, zNear, zFar, out=None):
+    f = 1.0 / math.tan(math.radians(fovy/2.0)) # cotan(fovy/2)
+    return _mat([[f/aspect ,   0,          0               ,       0],
+                 [ 0       ,   f,          0               ,       0],
+                 [ 0       ,   0, (zFar+zNear)/(zNear-zFar), (2*zFar*zNear)/(zNear-zFar)],
+                 [ 0       ,   0,          -1              , 0]], out)
+
+
+def normal_matrix(m, uniform_scale=1.0, out=None):
+    """
+    Normal matrix (inverse transpose of the upper 3x3) of a matrix that only
+    rotates, translates and scales uniformly: for M = s*R it is R/s, which
+    equals M/s^2, so no matrix inversion is needed.
+    """
+    if out is None:
+        out = np.empty((3, 3), dtype=DTYPE)
+    np.multiply(m[:3, :3], 1.0 / (uniform_scale * uniform_scale), out=out)
+    return out
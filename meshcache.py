@@ -0,0 +1,153 @@
+"""
+meshcache.py
+
+Binary on-disk cache for meshes that are ready to upload: centered and
+normalized vertices, normals and indices are stored as raw .npy files and
+mapped back with np.load(mmap_mode='r'), so a warm start skips OBJ parsing,
+normal generation and normalization altogether.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from utils import lade_obj, normalize_vertices
+
+log = logging.getLogger(__name__)
+
+# bei Aenderungen am Format oder an der Vorverarbeitung hochzaehlen
+CACHE_VERSION = 3
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'OGLVIEWER_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'oglViewer'))
+DEFAULT_MAX_BYTES = 512 << 20
+
+ARRAYS = ('vertices', 'normals', 'indices')
+# nur vorhanden, wenn LOD-Stufen erzeugt wurden
+OPTIONAL_ARRAYS = ('lod_indices', 'lod_counts')
+
+
+def prepare_mesh(filename, workers=1, optimize=False, lod=None, **options):
+    # lade_obj + zentrieren & normalisieren, so wie es Scene hochlaedt
+    vertices, indices, faces, normals = lade_obj(filename, workers=workers, **options)
+    normalize_vertices(vertices)
+    mesh = {'vertices': vertices, 'normals': normals, 'indices': indices}
+    # meshopt/simplify nur laden, wenn sie gebraucht werden
+    if optimize:
+        from meshopt import optimize_mesh
+        # Dreiecks- und Vertex-Reihenfolge fuer den Vertex-Cache (meshopt.py)
+        mesh, report = optimize_mesh(mesh)
+        log.info(f"{filename}: ACMR {report['acmr_before']:.3f} -> {report['acmr_after']:.3f}")
+    if lod:
+        from meshopt import optimize_vertex_cache
+        from simplify import build_lods
+        # vereinfachte Stufen (simplify.py) hintereinander in einem Index-Array
+        lods = build_lods(mesh['vertices'], mesh['indices'], lod)
+        if optimize:
+            lods = [optimize_vertex_cache(level, len(mesh['vertices'])) for level in lods]
+        mesh['lod_indices'] = np.concatenate(lods)
+        mesh['lod_counts'] = np.array([len(level) for level in lods], dtype=np.int64)
+    return mesh
+
+
+class MeshCache:
+    """
+    Size-bounded LRU cache of prepared meshes, one directory per entry.
+    The modification time of an entry directory is its last use.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def key(self, filename, **options):
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        opts = ','.join(f'{k}={options[k]!r}' for k in sorted(options))
+        text = f'{CACHE_VERSION}|{path}|{st.st_mtime_ns}|{st.st_size}|{opts}'
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, filename, **options):
+        entry = self.entry_dir(self.key(filename, **options))
+        try:
+            mesh = {name: np.load(os.path.join(entry, name + '.npy'), mmap_mode='r')
+                    for name in ARRAYS}
+        except (OSError, ValueError):
+            return None
+        for name in OPTIONAL_ARRAYS:
+            path = os.path.join(entry, name + '.npy')
+            if os.path.exists(path):
+                mesh[name] = np.load(path, mmap_mode='r')
+        # als zuletzt benutzt markieren
+        os.utime(entry)
+        return mesh
+
+    def put(self, filename, mesh, **options):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry = self.entry_dir(self.key(filename, **options))
+        # erst in ein temporaeres Verzeichnis schreiben, dann umbenennen,
+        # damit ein parallel laufender Viewer nie halbe Eintraege sieht
+        tmp = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            for name in ARRAYS + tuple(n for n in OPTIONAL_ARRAYS if n in mesh):
+                np.save(os.path.join(tmp, name + '.npy'), np.ascontiguousarray(mesh[name]))
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self):
+        # [(letzte Benutzung, Groesse in Bytes, Pfad)], aelteste zuerst
+        if not os.path.isdir(self.cache_dir):
+            return []
+        result = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith('.') or not os.path.isdir(path):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(path) if f.is_file())
+            result.append((os.stat(path).st_mtime, size, path))
+        return sorted(result)
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def load_mesh(filename, cache=None, workers=1, **options):
+    """
+    Prepared mesh for filename as dict with 'vertices', 'normals' and
+    'indices'. With a MeshCache the arrays are read-only memory maps.
+    workers only changes how the file is parsed, not the result, and is
+    therefore not part of the cache key. optimize=True stores the mesh
+    reordered for the vertex cache (see meshopt.py), lod=(ratios) adds
+    'lod_indices' and 'lod_counts' (see simplify.py).
+    """
+    if cache is None:
+        return prepare_mesh(filename, workers, **options)
+    mesh = cache.get(filename, **options)
+    if mesh is None:
+        mesh = prepare_mesh(filename, workers, **options)
+        cache.put(filename, mesh, **options)
+    return mesh
@@ -24,30 +24,116 @@
  ****
 """
 
+import ctypes
+import importlib.util
+import logging
+import os
 import sys
-import glfw
+import time
+
 import numpy as np
 
+import OpenGL
+# PyOpenGL ruft nach jedem GL-Aufruf glGetError auf und protokolliert Fehler;
+# OGLVIEWER_GL_CHECKS=0 schaltet das fuer den Produktivbetrieb ab
+# (muss vor dem ersten Import von OpenGL.GL feststehen)
+if os.environ.get('OGLVIEWER_GL_CHECKS', '1') == '0':
+    OpenGL.ERROR_CHECKING = False
+    OpenGL.ERROR_LOGGING = False
+
 from OpenGL.GL import *
-from OpenGL.arrays.vbo import VBO
-from OpenGL.GL.shaders import *
 
 from mat4 import *
-
-from utils import lade_obj, projectOnSphere
+from mat4 import normal_matrix as mat4_normal_matrix
+
+from utils import projectOnSphere
+from quaternion import Quaternion, slerp
+from meshcache import MeshCache, load_mesh
+from shaderprogram import GLState, ProgramCache, ShaderProgram
+from profiler import FrameProfiler, GpuTimer, LatencyStats
+from vertexformat import VertexFormat, MeshBuffers, compact_indices
+from scenegraph import GeometryCache, SceneGraph, SceneNode, grid_transforms
+from asyncload import DEFAULT_UPLOAD_BUDGET, ModelLoader, ModelUpload, placeholder_mesh
+from culling import ClusterBVH, DEFAULT_CLUSTER_SIZE, compute_bounds, frustum_planes, spatial_order, spheres_visible
+from picking import PickIndex, unproject
+
+
+
+def lazy_import(name):
+    # Modul erst beim ersten Attributzugriff laden (importlib.util.LazyLoader)
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = sys.modules[name] = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+# nur das Fenster braucht GLFW (headless.py und die Benchmarks nicht), glob erst Taste N,
+# simplify nur mit --lod
+glfw = lazy_import('glfw')
+glob = lazy_import('glob')
+simplify = lazy_import('simplify')
 
 EXIT_FAILURE = -1
-
-progname = sys.argv[0]
-args = sys.argv[1:]
+# ohne Animation und Eingaben hoechstens so lange (s) auf Ereignisse warten
+IDLE_TIMEOUT = 0.5
+# Rotations-Quaternion nach so vielen Verknuepfungen wieder auf Laenge 1 bringen
+RENORMALIZE_EVERY = 16
+# LOD-Auswahl: so viele Pixel der projizierten Modellflaeche pro Dreieck
+LOD_PIXELS_PER_TRIANGLE = 4.0
+# Shader je shading_mode (Wireframe, Gouraud, Phong); im Szenengraph *_instanced.vert
+SHADER_FILES = (("shader.vert", "shader.frag"), ("gouraud.vert", "gouraud.frag"), ("phong.vert", "phong.frag"))
+# Abstand (s) der mtime-Abfrage fuer das Neuladen geaenderter Shader
+SHADER_POLL_INTERVAL = 0.5
+
+# Optionen: --no-cache (Mesh- und Shader-Cache umgehen), --clear-cache (Cache leeren),
+#           --workers=N (OBJ mit N Prozessen parsen, 0 = alle Kerne),
+#           --profile-out=FILE.json|FILE.csv (Frame-Zeiten beim Beenden sichern),
+#           --interleaved, --pack-normals, --quantize (Vertex-Layout, vertexformat.py),
+#           --optimize (Dreiecke/Vertices fuer den Vertex-Cache umsortieren, meshopt.py),
+#           --lod[=0.5,0.25,0.125] (vereinfachte Stufen je nach Bildschirmgroesse, simplify.py),
+#           --grid=N (N Kopien je Modell, instanziert gezeichnet, scenegraph.py),
+#           --cull[=256] (Frustum-Culling: Instanzen bzw. Cluster aus N Dreiecken, culling.py),
+#           --pick (Dreieck unter dem Cursor im Fenstertitel, picking.py; nicht im Szenengraph),
+#           --upload-budget=MB (im Fenster: so viele MiB pro Frame hochladen, asyncload.py),
+#           --continuous (jeden Frame zeichnen statt nur bei Aenderungen),
+#           --log-level=debug|info|warning (debug zeigt jedes Maus-/Tastaturereignis)
+#           Umgebung: OGLVIEWER_CACHE (Cache-Verzeichnis), OGLVIEWER_GL_CHECKS=0
+
+
+def command_line():
+    # (Dateien, Optionen) aus sys.argv, erst beim Aufruf gelesen: der Import hat keine Nebenwirkungen
+    argv = sys.argv[1:]
+    return [a for a in argv if not a.startswith('--')], [a for a in argv if a.startswith('--')]
+
+
+def option_value(name, default=None):
+    # Wert einer Option der Form --name=wert
+    for option in command_line()[1]:
+        if option.startswith(name + '='):
+            return option.split('=', 1)[1]
+    return default
+
+
+log = logging.getLogger('oglViewer')
+
+
+def configure_logging():
+    logging.basicConfig(level=option_value('--log-level', 'info').upper(), format='%(message)s')
 
 class Scene:
     """
     OpenGL scene class: .obj mit Wireframe / Gouraud / Phong.
     """
 
-    def __init__(self, width, height, scenetitle="Cooles Modell"):
+    def __init__(self, width, height, scenetitle="Cooles Modell", filename=None):
+        args, options = command_line()
         self.scenetitle = scenetitle
+        self.filename = filename  # None = erstes Kommandozeilenargument
         self.width = width
         self.height = height
         self.angle = 0
@@ -55,7 +141,11 @@ class Scene:
         self.animate = False
         self.shading_mode = 0  # 0=Wireframe, 1=Gouraud, 2=Phong
         self.projection_mode = 0  # 0 = Perspective, 1 = Orthographic
-        self.rotation_matrix = np.identity(4)
+        # Rotation als Quaternion, die Matrix entsteht einmal pro Frame in draw()
+        self.rotation = Quaternion()
+        self.rotation_matrix = np.identity(4, dtype=np.float32)
+        self.rotation_updates = 0
+        self.transition = None  # (Start, Ziel, Startzeit, Dauer) fuer slerp
         self.mouse_pressed = False
         self.p1 = None
         self.arcball_radius = min(self.width, self.height) / 2.0
@@ -67,10 +157,69 @@ class Scene:
         self.last_pan_x = None
         self.last_pan_y = None
         self.keyboard_rotation_angle = 5.0  # Grad pro Tastendruck
-
-    def init_GL(self):
+        self.mesh_cache = None if '--no-cache' in options else MeshCache()
+        self.program_cache = None if '--no-cache' in options else ProgramCache()
+        # Programme je shading_mode, erst bei der ersten Verwendung gebaut
+        self.shaders = {}
+        self.shader_poll_time = 0.0
+        self.vertex_format = VertexFormat(interleaved='--interleaved' in options,
+                                          pack_normals='--pack-normals' in options,
+                                          quantize_positions='--quantize' in options)
+        self.optimize_mesh = '--optimize' in options
+        self.lod_ratios = simplify.parse_ratios(option_value('--lod')) if any(
+            o == '--lod' or o.startswith('--lod=') for o in options) else None
+        self.lod_level = None  # None = automatisch nach Bildschirmgroesse
+        self.current_lod = 0
+        # mehrere Modelle oder --grid: Szenengraph mit instanziertem Zeichnen
+        self.filenames = [filename] if filename else args
+        self.instance_grid = int(option_value('--grid', 0))
+        self.scene_graph = None
+        self.draw_calls = 0
+        # Frustum-Culling; Clustergroesse fuer die BVH eines einzelnen Modells
+        self.cull = any(o == '--cull' or o.startswith('--cull=') for o in options)
+        self.cluster_size = int(option_value('--cull', DEFAULT_CLUSTER_SIZE))
+        self.bvh = None
+        self.culled_clusters = 0
+        # Picking: Strahl-BVH je Modell (beim Laden gebaut), Latenz je Abfrage
+        self.picking = '--pick' in options
+        self.pick_index = None
+        self.pick_latency = LatencyStats()
+        # Laden im Hintergrund (nur im Fenster), Taste N wechselt das Modell
+        self.model_files = None  # obj_files/*.obj, beim ersten load_next() gelesen
+        self.loader = None
+        self.pending = None  # (Dateiname, Future)
+        self.upload = None
+        self.upload_budget = int(float(option_value('--upload-budget', DEFAULT_UPLOAD_BUDGET / (1 << 20))) * (1 << 20))
+        self.gl_objects = None
+
+        # Projektion & Kamera nur bei Aenderung neu berechnen
+        self.view = look_at(0, 0, 3, 0, 0, 0, 0, 1, 0)
+        self.projection = np.empty((4, 4), dtype=np.float32)
+        self.projection_view = np.empty((4, 4), dtype=np.float32)
+        self.projection_key = None
+
+        # vorab angelegte Puffer fuer die Matrizen pro Frame
+        self.tmp_matrix = np.empty((4, 4), dtype=np.float32)
+        self.model_matrix = np.empty((4, 4), dtype=np.float32)
+        self.mv_matrix = np.empty((4, 4), dtype=np.float32)
+        self.mvp_matrix = np.empty((4, 4), dtype=np.float32)
+        self.normal_matrix = np.empty((3, 3), dtype=np.float32)
+
+        # Frame-Zeiten je Phase (siehe profiler.py)
+        self.profiler = FrameProfiler()
+        self.gpu_timer = None
+
+    def init_GL(self, background=False):
         # setup buffer (vertices, normals)
-        self.gen_buffers()
+        if self.instance_grid or len(self.filenames) > 1:
+            self.gen_scene_graph()
+        elif background:
+            # Platzhalter sofort, das eigentliche Modell kommt ueber update_loading()
+            self.apply_model(self.build_model(placeholder_mesh()))
+            self.loader = ModelLoader(self.prepare_model)
+            self.request_model(self.filename or self.filenames[0])
+        else:
+            self.gen_buffers()
 
         # <<< VAO binden >>>
         glBindVertexArray(self.vertex_array)
@@ -80,132 +229,361 @@ class Scene:
         # <<< wieder entbinden >>>
         glBindVertexArray(0)
 
-    def load_shaders(self):
-        # Wireframe
-        vs = compileShader(open("shader.vert").read(), GL_VERTEX_SHADER)
-        fs = compileShader(open("shader.frag").read(), GL_FRAGMENT_SHADER)
-        self.shader_wireframe = compileProgram(vs, fs)
+        # ab hier setzt nur noch draw() Programm, VAO und Polygonmodus
+        self.gl_state = GLState()
 
-        # Gouraud
-        vs = compileShader(open("gouraud.vert").read(), GL_VERTEX_SHADER)
-        fs = compileShader(open("gouraud.frag").read(), GL_FRAGMENT_SHADER)
-        self.shader_gouraud = compileProgram(vs, fs)
+        self.gpu_timer = GpuTimer()
 
-        # Phong
-        vs = compileShader(open("phong.vert").read(), GL_VERTEX_SHADER)
-        fs = compileShader(open("phong.frag").read(), GL_FRAGMENT_SHADER)
-        self.shader_phong = compileProgram(vs, fs)
+    def load_shaders(self):
+        # nur das aktive Programm, die anderen baut shader() beim ersten Umschalten (Taste S)
+        for shader in self.shaders.values():
+            shader.delete()
+        self.shaders = {}
+        self.shader(self.shading_mode)
+
+    def shader(self, mode):
+        shader = self.shaders.get(mode)
+        if shader is None:
+            vertex_file, fragment_file = SHADER_FILES[mode]
+            # dieselben Shader mit Modellmatrix je Instanz (Szenengraph)
+            if self.scene_graph is not None:
+                vertex_file = vertex_file.replace(".vert", "_instanced.vert")
+            shader = self.shaders[mode] = ShaderProgram(vertex_file, fragment_file, self.program_cache)
+            log.debug(f"{shader.name}: {'program cache' if shader.from_cache else 'compiled'}")
+        return shader
+
+    def poll_shaders(self):
+        # geaenderte Shader-Dateien neu bauen, True sobald eines getauscht wurde
+        now = time.perf_counter()
+        pending = any(shader.pending for shader in self.shaders.values())
+        if not pending and now - self.shader_poll_time < SHADER_POLL_INTERVAL:
+            return False
+        self.shader_poll_time = now
+        swapped = False
+        for shader in self.shaders.values():
+            swapped |= shader.poll()
+        return swapped
+
+    def gen_scene_graph(self):
+        # jedes Modell bekommt jeden len(filenames)-ten Platz eines gemeinsamen Gitters
+        workers = int(option_value('--workers', 1)) or None
+        cache = GeometryCache(self.mesh_cache, self.vertex_format, workers, optimize=self.optimize_mesh)
+        self.scene_graph = SceneGraph(cache)
+        count = max(1, self.instance_grid)
+        grid = grid_transforms(count * len(self.filenames))
+        for i, filename in enumerate(self.filenames):
+            self.scene_graph.root.add(SceneNode(filename, grid[i::len(self.filenames)]))
+        self.scene_graph.update()
+        log.info(f"{self.scene_graph.instance_count()} instances of {len(cache)} meshes")
+        self.vertex_array = next(iter(cache.entries.values())).vertex_array
+        self.lods = [(None, 0)]
+
+    def prepare_model(self, filename):
+        # geladen, zentriert & normalisiert (bei Cache-Treffer als memmap);
+        # ohne GL-Aufrufe, laeuft auch im Lade-Thread
+        workers = int(option_value('--workers', 1)) or None
+        mesh = load_mesh(filename, self.mesh_cache, workers,
+                         optimize=self.optimize_mesh, lod=self.lod_ratios)
+        model = self.build_model(mesh)
+        model['filename'] = filename
+        return model
+
+    def build_model(self, mesh):
+        # alles fuer den Upload: Vertex-Layout, Index-Array mit LOD-Stufen, Schranken
+        vertices, normals, indices = mesh['vertices'], mesh['normals'], mesh['indices']
+        model = {'filename': None}
+        # AABB & Umkugel; Radius um den Ursprung fuer die LOD-Auswahl
+        model['bounds'] = bounds = compute_bounds(vertices)
+        model['bounding_radius'] = float(np.linalg.norm(bounds.center)) + bounds.radius
+        model['bvh'] = None
+        # Dreiecksnummern beziehen sich auf mesh['indices'], nicht auf die Zeichenreihenfolge
+        model['pick_index'] = PickIndex(vertices, indices) if self.picking else None
+        if self.cull:
+            # Cluster aufeinanderfolgender Dreiecke muessen raeumlich kompakt sein
+            if not self.optimize_mesh:
+                indices = spatial_order(vertices, indices)
+            model['bvh'] = ClusterBVH(vertices, indices, self.cluster_size)
+
+        # Vertex-Layout (getrennt/interleaved, gepackt, quantisiert)
+        model['buffers'] = buffers = MeshBuffers(vertices, normals, indices, self.vertex_format)
+        log.info(buffers.describe())
+
+        # Indices (16 Bit, wenn moeglich), LOD-Stufen direkt dahinter;
+        # lods: [(Byte-Offset, Anzahl Indices)], feinste Stufe zuerst
+        all_indices = buffers.indices
+        lods = [(ctypes.c_void_p(0), len(buffers.indices))]
+        if 'lod_indices' in mesh:
+            lod_indices, _ = compact_indices(mesh['lod_indices'], buffers.vertex_count)
+            offset = buffers.indices.nbytes
+            for count in mesh['lod_counts'].tolist():
+                lods.append((ctypes.c_void_p(offset), count))
+                offset += count * lod_indices.itemsize
+            all_indices = np.concatenate([buffers.indices, lod_indices])
+            log.info("LOD triangles: " + " / ".join(str(count // 3) for _, count in lods))
+        model['all_indices'] = all_indices
+        model['lods'] = lods
+        return model
+
+    def apply_model(self, model, upload=None):
+        # hochgeladenes Modell einsetzen, das vorherige freigeben
+        if upload is None:
+            upload = ModelUpload(model['buffers'], model['all_indices'])
+            upload.step()
+        if self.gl_objects is not None:
+            vertex_array, names = self.gl_objects
+            glDeleteVertexArrays(1, [vertex_array])
+            glDeleteBuffers(len(names), names)
+        self.gl_objects = upload.gl_objects()
+        self.vertex_array = upload.vertex_array
+        self.vertex_uniforms = model['buffers'].uniforms
+        self.indices = model['buffers'].indices
+        self.index_type = model['buffers'].index_type
+        self.lods = model['lods']
+        self.bounds = model['bounds']
+        self.bounding_radius = model['bounding_radius']
+        self.bvh = model['bvh']
+        self.pick_index = model['pick_index']
+        self.current_lod = 0
+        self.filename = model['filename'] or self.filename
+        # ModelUpload hat VAO und Buffer-Bindungen veraendert
+        if hasattr(self, 'gl_state'):
+            self.gl_state.invalidate()
 
     def gen_buffers(self):
-        vertices, indices, faces, normals = lade_obj(args[0])
-
-        # zentrieren & normalisieren
-        center = vertices.mean(axis=0)
-        vertices -= center
-        min_coords = vertices.min(axis=0)
-        max_coords = vertices.max(axis=0)
-        extent = max_coords - min_coords
-        max_extent = np.max(extent)
-        vertices /= max_extent
-        vertices *= 1.5  # optional größer
-
-        # VAO
-        self.vertex_array = glGenVertexArrays(1)
-        glBindVertexArray(self.vertex_array)
-
-        # Vertices -> Attrib 0
-        pos_buffer = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, pos_buffer)
-        glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 0, None)
-        glEnableVertexAttribArray(0)
-
-        # Normals -> Attrib 1 
-        norm_buffer = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, norm_buffer)
-        glBufferData(GL_ARRAY_BUFFER, normals.nbytes, normals, GL_STATIC_DRAW)
-        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 0, None)
-        glEnableVertexAttribArray(1)
-
-        # Indices
-        self.indices = indices
-        ind_buffer = glGenBuffers(1)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ind_buffer)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
-
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
-        glBindVertexArray(0)
+        # synchron laden und hochladen (Headless, Benchmarks)
+        self.apply_model(self.prepare_model(self.filename or self.filenames[0]))
+
+    def request_model(self, filename):
+        # im Hintergrund laden, das aktuelle Modell bleibt bis dahin sichtbar
+        if self.upload is not None and self.upload[0]['filename'] != filename:
+            # halb hochgeladenes Modell verwerfen
+            vertex_array, names = self.upload[1].gl_objects()
+            glDeleteVertexArrays(1, [vertex_array])
+            glDeleteBuffers(len(names), names)
+            self.upload = None
+        self.pending = (filename, self.loader.request(filename))
+
+    def load_next(self, step=1):
+        # naechstes Modell aus obj_files/ laden und das darauf folgende vorab
+        if self.model_files is None:
+            self.model_files = sorted(glob.glob('obj_files/*.obj'))
+        if self.loader is None or not self.model_files:
+            return
+        current = os.path.abspath(self.pending[0] if self.pending else self.filename)
+        files = self.model_files
+        paths = [os.path.abspath(f) for f in files]
+        i = paths.index(current) if current in paths else -1
+        self.request_model(files[(i + step) % len(files)])
+        self.loader.prefetch(files[(i + 2 * step) % len(files)])
+
+    def loading(self):
+        # Dateiname, solange ein Modell geladen oder hochgeladen wird
+        return self.pending[0] if self.pending else None
+
+    def update_loading(self):
+        # einmal pro Frame: fertiges Modell in Teilen hochladen, dann einsetzen
+        if self.pending is None:
+            return
+        filename, future = self.pending
+        if self.upload is None:
+            if not future.done():
+                return
+            try:
+                model = future.result()
+            except Exception as error:
+                log.warning(f"loading {filename} failed: {error}")
+                self.pending = None
+                return
+            self.upload = (model, ModelUpload(model['buffers'], model['all_indices']))
+            self.gl_state.invalidate()
+        model, upload = self.upload
+        if upload.step(self.upload_budget):
+            self.apply_model(model, upload)
+            self.upload = None
+            self.pending = None
+
+    def pick(self, x, y):
+        """
+        Hit under the window position (x, y) through the matrices of the
+        last draw(), distance measured from the camera; None if nothing.
+        """
+        if self.pick_index is None:
+            return None
+        start = time.perf_counter()
+        origin, direction = unproject(x, y, self.width, self.height, self.mvp_matrix)
+        hit = self.pick_index.intersect(origin, direction)
+        if hit is not None:
+            # Zoom steckt in der Modellmatrix: Abstand erst im Augenraum messen
+            eye = self.mv_matrix[:3, :3] @ hit.point + self.mv_matrix[:3, 3]
+            hit = hit._replace(distance=float(np.linalg.norm(eye)))
+        self.pick_latency.add(time.perf_counter() - start)
+        return hit
 
     def set_size(self, width, height):
         self.width = width
         self.height = height
 
-    def draw(self):
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-
-        if self.animate:
-            self.angle += self.angle_increment
-
-        # Kamera & Transformationen
+    def update_projection(self):
+        # projection @ view, nur neu wenn sich Seitenverhaeltnis oder Modus aendern
         aspect = self.width / self.height
+        key = (aspect, self.projection_mode)
+        if key == self.projection_key:
+            return self.projection_view
+        self.projection_key = key
 
         if self.projection_mode == 0:
             # Perspektivisch
-            projection = perspective(45.0, aspect, 1.0, 10.0)
+            perspective(45.0, aspect, 1.0, 10.0, out=self.projection)
         else:
             # Orthografisch
-            ortho_scale = 1.5  
+            ortho_scale = 1.5
             if aspect >= 1.0:
-                projection = ortho(-ortho_scale*aspect, ortho_scale*aspect, -ortho_scale, ortho_scale, 1.0, 10.0)
+                ortho(-ortho_scale*aspect, ortho_scale*aspect, -ortho_scale, ortho_scale, 1.0, 10.0, out=self.projection)
             else:
-                projection = ortho(-ortho_scale, ortho_scale, -ortho_scale/aspect, ortho_scale/aspect, 1.0, 10.0)
-
-        view = look_at(0, 0, 3, 0, 0, 0, 0, 1, 0)
+                ortho(-ortho_scale, ortho_scale, -ortho_scale/aspect, ortho_scale/aspect, 1.0, 10.0, out=self.projection)
+
+        np.matmul(self.projection, self.view, out=self.projection_view)
+        return self.projection_view
+
+    def select_lod(self):
+        # groebste Stufe, die fuer die projizierte Flaeche noch genug Dreiecke hat
+        if self.lod_level is not None:
+            return min(self.lod_level, len(self.lods) - 1)
+        if len(self.lods) == 1:
+            return 0
+        projection = self.projection
+        # w des Modellmittelpunkts: Abstand bei Perspektive, 1 bei Orthografie
+        w = projection[3, 2] * self.mv_matrix[2, 3] + projection[3, 3]
+        radius = self.bounding_radius * self.zoom_factor * projection[1, 1] / max(w, 1e-6) * self.height / 2
+        wanted = np.pi * radius * radius / LOD_PIXELS_PER_TRIANGLE
+        level = 0
+        for i, (_, count) in enumerate(self.lods):
+            if count // 3 >= wanted:
+                level = i
+        return level
+
+    def cull_clusters(self, planes):
+        # (counts, offsets) fuer glMultiDrawElements oder None = ganze LOD-Stufe zeichnen
+        if not spheres_visible(planes, self.bounds.center[np.newaxis], [self.bounds.radius])[0]:
+            self.culled_clusters = self.bvh.cluster_count
+            return np.empty(0, np.int32), np.empty(0, np.uintp)
+        if self.current_lod != 0:
+            # die BVH gilt nur fuer die volle Stufe
+            self.culled_clusters = 0
+            return None
+        visible = self.bvh.cull(planes)
+        self.culled_clusters = self.bvh.cluster_count - int(visible.sum())
+        return self.bvh.draw_ranges(visible, self.indices.itemsize)
+
+    def rotate_by(self, q):
+        # q nach der bisherigen Rotation anwenden
+        self.rotation = q * self.rotation
+        self.rotation_updates += 1
+        if self.rotation_updates % RENORMALIZE_EVERY == 0:
+            self.rotation.normalize()
+
+    def rotate_to(self, target, duration=0.5):
+        # weicher Uebergang per slerp, laeuft in draw()
+        self.transition = (self.rotation.copy(), target, time.perf_counter(), duration)
+
+    def is_animating(self):
+        return self.animate or self.transition is not None
+
+    def update_matrices(self):
+        """
+        Advances animation and rotation transition and returns the
+        (mvp, modelview, normal) matrices of this frame; no GL calls, also
+        used by the software rasterizer (softraster.py).
+        """
         if self.animate:
-            model = rotate_y(self.angle) @ self.rotation_matrix
-        else:
-            model = self.rotation_matrix
-
-        model = translate(self.pan_offset[0], self.pan_offset[1], 0.0) @ model
-
-        model = scale(self.zoom_factor, self.zoom_factor, self.zoom_factor) @ model
+            self.angle += self.angle_increment
+        if self.transition is not None:
+            start, target, t0, duration = self.transition
+            t = (time.perf_counter() - t0) / duration
+            if t >= 1.0:
+                self.rotation = target.copy()
+                self.transition = None
+            else:
+                self.rotation = slerp(start, target, t)
+        self.rotation.to_matrix(out=self.rotation_matrix)
 
-        mvp_matrix = projection @ view @ model
-        mv_matrix = view @ model
-        normal_matrix = np.linalg.inv(mv_matrix[:3, :3]).T
+        # Kamera & Transformationen
+        projection_view = self.update_projection()
 
-        # Shader
-        if self.shading_mode == 0:
-            shader = self.shader_wireframe
-            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+        model = self.model_matrix
+        if self.animate:
+            np.matmul(rotate_y(self.angle, out=self.tmp_matrix), self.rotation_matrix, out=model)
         else:
-            shader = self.shader_gouraud if self.shading_mode == 1 else self.shader_phong
-            glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
-
-        glUseProgram(shader)
+            model[...] = self.rotation_matrix
 
-        # Uniforms setzen
-        loc_mvp = glGetUniformLocation(shader, "modelview_projection_matrix")
-        glUniformMatrix4fv(loc_mvp, 1, GL_TRUE, mvp_matrix)
+        # scale(zoom) @ translate(pan) @ model, ohne Matrixprodukte
+        # (model ist eine reine Rotation, letzte Zeile 0 0 0 1)
+        model[0, 3] += self.pan_offset[0]
+        model[1, 3] += self.pan_offset[1]
+        model[:3] *= self.zoom_factor
 
-        loc_mv = glGetUniformLocation(shader, "modelview_matrix")
-        glUniformMatrix4fv(loc_mv, 1, GL_TRUE, mv_matrix)
+        mvp_matrix = np.matmul(projection_view, model, out=self.mvp_matrix)
+        mv_matrix = np.matmul(self.view, model, out=self.mv_matrix)
+        # Rotation + uniforme Skalierung: Normalenmatrix ohne Inversion
+        normal_matrix = mat4_normal_matrix(mv_matrix, self.zoom_factor, out=self.normal_matrix)
+        return mvp_matrix, mv_matrix, normal_matrix
 
-        loc_nm = glGetUniformLocation(shader, "normal_matrix")
-        glUniformMatrix3fv(loc_nm, 1, GL_TRUE, normal_matrix)
-
-        loc_shiny = glGetUniformLocation(shader, "shininess")
-        glUniform1f(loc_shiny, 64.0)  
-
-
-        # Zeichnen
-        glBindVertexArray(self.vertex_array)
-        glDrawElements(GL_TRIANGLES, len(self.indices), GL_UNSIGNED_INT, None)
+    def draw(self):
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
-        # Aufräumen
-        glBindVertexArray(0)
-        glUseProgram(0)
-        glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
+        mvp_matrix, mv_matrix, normal_matrix = self.update_matrices()
+        self.profiler.lap('matrices')
+
+        # Frustum-Ebenen im Modellraum: Schranken muessen nicht transformiert werden
+        planes = frustum_planes(mvp_matrix) if self.cull else None
+        ranges = None
+        if self.scene_graph is None:
+            self.current_lod = self.select_lod()
+            if planes is not None:
+                ranges = self.cull_clusters(planes)
+        self.profiler.lap('cull')
+
+        # Shader (GLState ruft GL nur bei tatsaechlicher Aenderung auf)
+        state = self.gl_state
+        shader = self.shader(self.shading_mode)
+        state.set_polygon_mode(GL_LINE if self.shading_mode == 0 else GL_FILL)
+
+        state.use_program(shader)
+
+        # Uniforms setzen (gecachte Locations, nur geaenderte Werte)
+        shader.set_uniform("modelview_projection_matrix", mvp_matrix)
+        shader.set_uniform("modelview_matrix", mv_matrix)
+        shader.set_uniform("normal_matrix", normal_matrix)
+        shader.set_uniform("shininess", 64.0)
+        if self.scene_graph is not None:
+            # ein instanzierter Draw je Mesh, Instanzmatrizen kommen aus dem VBO
+            self.profiler.lap('uniforms')
+            gpu_timing = self.gpu_timer.begin()
+            self.draw_calls = self.scene_graph.draw(shader, state, planes)
+        else:
+            for name, value in self.vertex_uniforms.items():
+                shader.set_uniform(name, value)
+            self.profiler.lap('uniforms')
+
+            # Zeichnen
+            state.bind_vertex_array(self.vertex_array)
+            gpu_timing = self.gpu_timer.begin()
+            if ranges is None:
+                offset, count = self.lods[self.current_lod]
+                glDrawElements(GL_TRIANGLES, count, self.index_type, offset)
+                self.draw_calls = 1
+            else:
+                # sichtbare Cluster als zusammengefasste Bereiche
+                counts, offsets = ranges
+                if len(counts):
+                    glMultiDrawElements(GL_TRIANGLES, counts, self.index_type, offsets, len(counts))
+                self.draw_calls = len(counts)
+        if gpu_timing:
+            self.gpu_timer.end()
+        self.profiler.lap('draw')
+        # GPU-Zeiten kommen ein paar Frames verspaetet an
+        for seconds in self.gpu_timer.collect():
+            self.profiler.record('gpu', seconds)
 
 class RenderWindow:
     """
@@ -242,6 +620,7 @@ class RenderWindow:
         glfw.set_key_callback(self.window, self.on_keyboard)
         glfw.set_window_size_callback(self.window, self.on_size)
         glfw.set_cursor_pos_callback(self.window, self.on_mouse_move)
+        glfw.set_window_refresh_callback(self.window, self.on_refresh)
 
         # create scene
         self.scene = scene  
@@ -249,44 +628,87 @@ class RenderWindow:
             glfw.terminate()
             sys.exit(EXIT_FAILURE)
 
-        self.scene.init_GL()
+        # Modell im Hintergrund laden, bis dahin Platzhalter
+        self.scene.init_GL(background=True)
+        self.loading_title = None
 
         # exit flag
         self.exitNow = False
 
+        # Frame-Statistik im Fenstertitel und auf der Konsole (Taste T)
+        self.show_stats = False
+        self.last_stats = 0.0
+
+        # nur bei Aenderungen zeichnen, ausser mit --continuous
+        self.continuous = '--continuous' in command_line()[1]
+        self.init_input_state()
+
+    def init_input_state(self):
+        # Callbacks sammeln nur; apply_input() wertet einmal pro Frame aus
+        self.cursor = None  # letzte Cursorposition seit dem letzten Frame
+        self.dirty = True
+        self.hover_cursor = None  # letzte Cursorposition ohne gedrueckte Taste (Picking)
+        self.hover_face = None
+
     def on_mouse_move(self, win, xpos, ypos):
+        self.cursor = (xpos, ypos)
+        scene = self.scene
+        if scene.mouse_pressed or scene.zoom_pressed or scene.pan_pressed:
+            self.dirty = True
+        elif scene.pick_index is not None:
+            self.hover_cursor = (xpos, ypos)
+
+    def update_hover(self):
+        # hoechstens ein Picking pro Schleifendurchlauf, fuer die letzte Cursorposition;
+        # Titel und Neuzeichnen nur, wenn sich das Dreieck unter dem Cursor aendert
+        if self.hover_cursor is None:
+            return
+        xpos, ypos = self.hover_cursor
+        self.hover_cursor = None
+        hit = self.scene.pick(xpos, ypos)
+        face = None if hit is None else hit.face
+        latency = self.scene.pick_latency.summary('pick')
+        log.debug(f"hover ({xpos:.0f}, {ypos:.0f}): {hit and (hit.face, round(hit.distance, 4))} | {latency}")
+        if face == self.hover_face:
+            return
+        self.hover_face = face
+        self.dirty = True
+        text = "no hit" if hit is None else f"face {hit.face} (vertex {hit.vertex}) at {hit.distance:.3f}"
+        glfw.set_window_title(self.window, f"{self.scene.scenetitle} | {text} | {latency}")
+
+    def on_refresh(self, win):
+        self.dirty = True
+
+    def apply_input(self):
+        # alle Cursorbewegungen seit dem letzten Frame als eine einzige Aenderung
+        if self.cursor is None:
+            return
+        xpos, ypos = self.cursor
+        self.cursor = None
+
         if self.scene.mouse_pressed:
             # Arcball
-            p2 = np.array(
-                projectOnSphere(xpos, ypos, self.scene.arcball_radius, self.scene.width, self.scene.height)
-            )
-            axis = np.cross(self.scene.p1, p2)
-            if np.linalg.norm(axis) < 1e-6:
-                return
-            axis /= np.linalg.norm(axis)
-            angle = np.arccos(np.clip(np.dot(self.scene.p1, p2), -1.0, 1.0))
-            angle_deg = np.degrees(angle)
-            rot = rotate(angle_deg, axis)
-            self.scene.rotation_matrix = rot @ self.scene.rotation_matrix
-            self.scene.p1 = p2
+            p2 = projectOnSphere(xpos, ypos, self.scene.arcball_radius, self.scene.width, self.scene.height)
+            rot = Quaternion.from_arcball(self.scene.p1, p2)
+            if rot is not None:
+                self.scene.rotate_by(rot)
+                self.scene.p1 = p2
 
         if self.scene.zoom_pressed:
-            _, y = glfw.get_cursor_pos(win)
-            dy = y - self.scene.last_y
+            dy = ypos - self.scene.last_y
             self.scene.zoom_factor *= 1.0 + dy * 0.002  
             self.scene.zoom_factor = max(0.1, min(self.scene.zoom_factor, 10.0))
-            self.scene.last_y = y
+            self.scene.last_y = ypos
 
         if self.scene.pan_pressed:
-            x, y = glfw.get_cursor_pos(win)
-            dx = x - self.scene.last_pan_x
-            dy = y - self.scene.last_pan_y
+            dx = xpos - self.scene.last_pan_x
+            dy = ypos - self.scene.last_pan_y
 
             self.scene.pan_offset[0] += dx * 0.002
             self.scene.pan_offset[1] -= dy * 0.002
 
-            self.scene.last_pan_x = x
-            self.scene.last_pan_y = y
+            self.scene.last_pan_x = xpos
+            self.scene.last_pan_y = ypos
 
     def init_GL(self):
         # debug: print GL and GLS version
@@ -302,7 +724,8 @@ class RenderWindow:
         glEnable(GL_DEPTH_TEST)
         
     def on_mouse_button(self, win, button, action, mods):
-        print("mouse button: ", win, button, action, mods)
+        log.debug("mouse button: %s %s %s %s", win, button, action, mods)
+        self.dirty = True
         # TODO: realize arcball metaphor for rotations as well as
         #       scaling and translation paralell to the image plane,
         #       with the mouse. 
@@ -330,41 +753,115 @@ class RenderWindow:
                 self.scene.pan_pressed = False
 
     def on_keyboard(self, win, key, scancode, action, mods):
-        print("keyboard: ", win, key, scancode, action, mods)
+        log.debug("keyboard: %s %s %s %s %s", win, key, scancode, action, mods)
+        self.dirty = True
         if action == glfw.PRESS:
             # ESC to quit
             if key == glfw.KEY_ESCAPE:
                 self.exitNow = True
             if key == glfw.KEY_A:
                 self.scene.animate = not self.scene.animate
+            if key == glfw.KEY_T:
+                self.show_stats = not self.show_stats
+                if not self.show_stats:
+                    glfw.set_window_title(self.window, self.scene.scenetitle)
+            if key == glfw.KEY_L:
+                # LOD: automatisch -> 0 -> 1 -> ... -> automatisch
+                scene = self.scene
+                if scene.lod_level is None:
+                    scene.lod_level = 0
+                elif scene.lod_level + 1 < len(scene.lods):
+                    scene.lod_level += 1
+                else:
+                    scene.lod_level = None
+                log.info(f"LOD: {'auto' if scene.lod_level is None else scene.lod_level}")
+            if key == glfw.KEY_R:
+                self.scene.rotate_to(Quaternion())
+                log.info("Reset rotation")
+            if key == glfw.KEY_N:
+                if self.scene.scene_graph is not None:
+                    # Szenengraph (--grid, mehrere Dateien) hat keinen ModelLoader
+                    log.info("switching models is not available in scene graph mode")
+                else:
+                    self.scene.load_next()
+                    log.info(f"loading {self.scene.loading()}")
             if key == glfw.KEY_P:
                 self.scene.projection_mode = (self.scene.projection_mode + 1) % 2
                 mode = "Orthographic" if self.scene.projection_mode else "Perspective"
-                print(f"Projection mode: {mode}")
+                log.info(f"Projection mode: {mode}")
             if key == glfw.KEY_S:
                 self.scene.shading_mode = (self.scene.shading_mode + 1) % 3
                 modes = ["Wireframe", "Gouraud", "Phong"]
-                print(f"Shading mode: {modes[self.scene.shading_mode]}")
+                log.info(f"Shading mode: {modes[self.scene.shading_mode]}")
             if key == glfw.KEY_X:
-                rot = rotate_x(self.scene.keyboard_rotation_angle)
-                self.scene.rotation_matrix = rot @ self.scene.rotation_matrix
-                print("Rotated around X axis")
+                self.scene.rotate_by(Quaternion.from_axis_angle((1, 0, 0), self.scene.keyboard_rotation_angle))
+                log.info("Rotated around X axis")
             if key == glfw.KEY_Y:
-                rot = rotate_y(self.scene.keyboard_rotation_angle)
-                self.scene.rotation_matrix = rot @ self.scene.rotation_matrix
-                print("Rotated around Y axis")
+                self.scene.rotate_by(Quaternion.from_axis_angle((0, 1, 0), self.scene.keyboard_rotation_angle))
+                log.info("Rotated around Y axis")
             if key == glfw.KEY_Z:
-                rot = rotate_z(self.scene.keyboard_rotation_angle)
-                self.scene.rotation_matrix = rot @ self.scene.rotation_matrix
-                print("Rotated around Z axis")
+                self.scene.rotate_by(Quaternion.from_axis_angle((0, 0, 1), self.scene.keyboard_rotation_angle))
+                log.info("Rotated around Z axis")
 
     def on_size(self, win, width, height):
         self.scene.set_size(width, height)
+        self.dirty = True
+
+    def show_frame_stats(self):
+        # hoechstens zweimal pro Sekunde, damit die Ausgabe nicht selbst bremst
+        now = glfw.get_time()
+        if now - self.last_stats < 0.5:
+            return
+        self.last_stats = now
+        profiler = self.scene.profiler
+        if self.scene.scene_graph is not None:
+            detail = f"{self.scene.scene_graph.instance_count()} instances, {self.scene.draw_calls} draws"
+            if self.scene.cull:
+                detail += f", {self.scene.scene_graph.culled_instances} culled"
+        else:
+            _, lod_count = self.scene.lods[self.scene.current_lod]
+            detail = f"LOD {self.scene.current_lod} ({lod_count // 3} tris)"
+            if self.scene.bvh is not None:
+                detail += f", {self.scene.culled_clusters}/{self.scene.bvh.cluster_count} clusters culled"
+            if self.scene.pick_latency.count:
+                detail += f", {self.scene.pick_latency.summary('pick')}"
+        glfw.set_window_title(self.window, f"{self.scene.scenetitle} | {profiler.summary()} | {detail}")
+        log.info(profiler.report())
 
     def run(self):
+        profiler = self.scene.profiler
         while not glfw.window_should_close(self.window) and not self.exitNow:
-            # poll for and process events
+            # ohne Animation, Laden oder Eingaben schlafen statt neu zeichnen
+            busy = self.continuous or self.scene.is_animating() or self.scene.loading() is not None
+            if not (busy or self.dirty):
+                # blockierendes Warten gehoert nicht zur Frame-Zeit; die Callbacks
+                # merken sich nur Zustand, ausgewertet wird erst unten
+                glfw.wait_events_timeout(IDLE_TIMEOUT)
+            profiler.begin_frame()
             glfw.poll_events()
+            profiler.lap('poll')
+
+            # Hover-Picking auch ohne Frame, zusammengefasst ueber alle Ereignisse
+            self.update_hover()
+            # Shader-Dateien beobachten, neu gebaute Programme sofort zeigen
+            if self.scene.poll_shaders():
+                self.dirty = True
+            if not (busy or self.dirty or self.exitNow):
+                continue
+            self.dirty = False
+
+            # gesammelte Eingaben anwenden
+            self.apply_input()
+            profiler.lap('events')
+
+            # Hintergrund-Laden: hoechstens upload_budget Bytes pro Frame
+            self.scene.update_loading()
+            loading = self.scene.loading()
+            if loading != self.loading_title:
+                self.loading_title = loading
+                title = self.scene.scenetitle + (f" | loading {loading}" if loading else "")
+                glfw.set_window_title(self.window, title)
+            profiler.lap('upload')
 
             # setup viewport
             width, height = glfw.get_framebuffer_size(self.window)
@@ -375,14 +872,34 @@ class RenderWindow:
             
             # swap front and back buffer
             glfw.swap_buffers(self.window)
+            profiler.lap('swap')
+            profiler.end_frame()
+
+            if self.show_stats:
+                self.show_frame_stats()
 
         # end
+        profile_out = option_value('--profile-out')
+        if profile_out:
+            profiler.dump(profile_out)
+            log.info(f"frame times written to {profile_out}")
+        if self.scene.loader is not None:
+            self.scene.loader.shutdown()
         glfw.terminate()
 
 # main function
 if __name__ == '__main__':
 
-    print("presse 'a' to toggle animation...")
+    configure_logging()
+
+    args, options = command_line()
+    if '--clear-cache' in options:
+        MeshCache().clear()
+        log.info("mesh cache cleared")
+        if not args:
+            sys.exit(0)
+
+    log.info("presse 'a' to toggle animation...")
 
     # set size of render viewport
     width, height = 640, 480
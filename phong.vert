@@ -6,14 +6,17 @@ layout (location=1) in vec3 v_normal;
 uniform mat4 modelview_projection_matrix;
 uniform mat4 modelview_matrix;
 uniform mat3 normal_matrix;
+uniform vec3 position_scale;   // Dequantisierung (1 bzw. 0 bei float-Positionen)
+uniform vec3 position_offset;
 
 out vec3 frag_pos;
 out vec3 frag_normal;
 
 void main()
 {
-    frag_pos = vec3(modelview_matrix * vec4(v_position,1));
+    vec3 position = v_position * position_scale + position_offset;
+    frag_pos = vec3(modelview_matrix * vec4(position,1));
     frag_normal = normalize(normal_matrix * v_normal);
 
-    gl_Position = modelview_projection_matrix * vec4(v_position,1);
+    gl_Position = modelview_projection_matrix * vec4(position,1);
 }
@@ -0,0 +1,24 @@
+#version 330
+
+layout (location=0) in vec3 v_position;
+layout (location=1) in vec3 v_normal;
+layout (location=2) in mat4 instance_matrix;   // Modellmatrix je Instanz (Locations 2-5)
+
+uniform mat4 modelview_projection_matrix;
+uniform mat4 modelview_matrix;
+uniform mat3 normal_matrix;
+uniform vec3 position_scale;   // Dequantisierung (1 bzw. 0 bei float-Positionen)
+uniform vec3 position_offset;
+
+out vec3 frag_pos;
+out vec3 frag_normal;
+
+void main()
+{
+    vec4 position = instance_matrix * vec4(v_position * position_scale + position_offset, 1);
+    frag_pos = vec3(modelview_matrix * position);
+    // Instanzen: Rotation + uniforme Skalierung, normalize gleicht die Skalierung aus
+    frag_normal = normalize(normal_matrix * (mat3(instance_matrix) * v_normal));
+
+    gl_Position = modelview_projection_matrix * position;
+}
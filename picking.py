@@ -0,0 +1,154 @@
+"""
+picking.py
+
+Which triangle lies under the cursor, vectorized over the whole mesh:
+
+- unproject: cursor position -> ray in model space through the inverse of
+  the projection @ view @ model matrix that Scene.draw() uploads,
+- ray_triangles: Moeller-Trumbore ray/triangle test for many triangles
+  at once (double-sided, like the rendering),
+- PickIndex: BVH over small clusters of Morton-ordered triangles (the
+  ClusterBVH of culling.py), built at load time; a ray walks the tree
+  level by level with slab tests and only the triangles of the hit leaves
+  go through ray_triangles, nearest leaves first.
+
+    index = PickIndex(mesh['vertices'], mesh['indices'])
+    hit = index.intersect(*unproject(x, y, width, height, mvp))
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from culling import ClusterBVH, triangle_order
+
+DEFAULT_LEAF_SIZE = 16
+# Blaetter pro Runde, danach Abbruch, sobald kein naeheres Blatt mehr kommt
+LEAF_BATCH = 8
+
+# face: Dreieck im Index-Array, distance: Strahlparameter (Laenge von direction),
+# point: Treffpunkt, barycentric: (w, u, v), vertex: naechste Ecke (Vertex-Index)
+Hit = namedtuple('Hit', 'face distance point barycentric vertex')
+
+
+def unproject(x, y, width, height, mvp):
+    """
+    Ray (origin, unit direction) in the space mvp maps from for the window
+    position (x, y), top-left origin. Starts on the near plane.
+    """
+    inverse = np.linalg.inv(np.asarray(mvp, dtype=np.float64))
+    ndc_x = 2.0 * x / width - 1.0
+    ndc_y = 1.0 - 2.0 * y / height
+    points = inverse @ np.array([[ndc_x, ndc_x], [ndc_y, ndc_y], [-1.0, 1.0], [1.0, 1.0]])
+    near, far = (points[:3] / points[3]).T
+    direction = far - near
+    return near, direction / np.linalg.norm(direction)
+
+
+def ray_triangles(origin, direction, v0, e1, e2, eps=1e-12):
+    """
+    Moeller-Trumbore for one ray against (N, 3) triangles given as first
+    corner and both edges. Returns (t, u, v), t = inf where missed.
+    """
+    p = np.cross(direction, e2)
+    det = np.einsum('ij,ij->i', e1, p)
+    valid = np.abs(det) > eps
+    inv_det = np.divide(1.0, det, out=np.zeros_like(det), where=valid)
+    s = origin - v0
+    u = np.einsum('ij,ij->i', s, p) * inv_det
+    q = np.cross(s, e1)
+    v = q @ direction * inv_det
+    t = np.einsum('ij,ij->i', e2, q) * inv_det
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > eps)
+    return np.where(hit, t, np.inf), u, v
+
+
+def _ray_boxes(origin, inv_direction, lo, hi):
+    # Slab-Test: (Eintritt, Austritt) je Box
+    t1 = (lo - origin) * inv_direction
+    t2 = (hi - origin) * inv_direction
+    return np.minimum(t1, t2).max(axis=1), np.maximum(t1, t2).min(axis=1)
+
+
+class PickIndex:
+    """
+    Ray casting against one mesh. Triangles are kept in Morton order of
+    their centroids as first corner plus edges (float64), leaves of
+    leaf_size consecutive triangles form the BVH; order maps back to the
+    triangle number in the original index array.
+    """
+
+    def __init__(self, vertices, indices, leaf_size=DEFAULT_LEAF_SIZE):
+        vertices = np.asarray(vertices, dtype=np.float32)
+        tris = np.asarray(indices).reshape(-1, 3)
+        self.order = triangle_order(vertices, tris)
+        self.triangles = tris[self.order]
+        corners = vertices[self.triangles].astype(np.float64)
+        self.v0 = corners[:, 0]
+        self.e1 = corners[:, 1] - corners[:, 0]
+        self.e2 = corners[:, 2] - corners[:, 0]
+        self.bvh = ClusterBVH(vertices, self.triangles.ravel(), leaf_size)
+        self.leaf_size = leaf_size
+        self.triangle_count = len(tris)
+
+    def leaves(self, origin, direction):
+        """
+        Leaf clusters whose boxes the ray hits, with their entry distances,
+        sorted front to back.
+        """
+        safe = np.where(np.abs(direction) > 1e-30, direction, 1e-30)
+        inv_direction = 1.0 / safe
+        bvh = self.bvh
+        active = np.arange(len(bvh.levels[-1][0]))
+        for level in range(len(bvh.levels) - 1, -1, -1):
+            lo, hi = bvh.levels[level]
+            near, far = _ray_boxes(origin, inv_direction, lo[active], hi[active])
+            keep = far >= np.maximum(near, 0.0)
+            active, near = active[keep], near[keep]
+            if len(active) == 0 or level == 0:
+                break
+            active = np.concatenate([2 * active, 2 * active + 1])
+            active = active[active < len(bvh.levels[level - 1][0])]
+        by_distance = np.argsort(near, kind='stable')
+        return bvh.leaf_order[active[by_distance]], near[by_distance]
+
+    def intersect(self, origin, direction):
+        """
+        Nearest Hit along the ray or None. direction should be unit length,
+        distance is then in model units.
+        """
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        clusters, entry = self.leaves(origin, direction)
+        best_t, best = np.inf, None
+        for start in range(0, len(clusters), LEAF_BATCH):
+            # naechstes Blatt liegt hinter dem bisher naechsten Treffer
+            if entry[start] > best_t:
+                break
+            batch = clusters[start:start + LEAF_BATCH]
+            ids = (batch[:, np.newaxis] * self.leaf_size + np.arange(self.leaf_size)).ravel()
+            ids = ids[ids < self.triangle_count]
+            t, u, v = ray_triangles(origin, direction, self.v0[ids], self.e1[ids], self.e2[ids])
+            nearest = int(np.argmin(t))
+            if t[nearest] < best_t:
+                best_t, best = t[nearest], (ids[nearest], u[nearest], v[nearest])
+        if best is None:
+            return None
+        return self._hit(origin, direction, best_t, *best)
+
+    def intersect_brute_force(self, origin, direction):
+        # alle Dreiecke auf einmal, Referenz fuer Tests und Benchmarks
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        t, u, v = ray_triangles(origin, direction, self.v0, self.e1, self.e2)
+        nearest = int(np.argmin(t))
+        if not np.isfinite(t[nearest]):
+            return None
+        return self._hit(origin, direction, t[nearest], nearest, u[nearest], v[nearest])
+
+    def _hit(self, origin, direction, t, position, u, v):
+        barycentric = np.array([1.0 - u - v, u, v])
+        corners = self.triangles[position]
+        return Hit(face=int(self.order[position]), distance=float(t),
+                   point=origin + t * direction, barycentric=barycentric,
+                   vertex=int(corners[np.argmax(barycentric)]))
@@ -0,0 +1,196 @@
+"""
+profiler.py
+
+Frame-time instrumentation: FrameProfiler collects per-phase CPU times of
+every frame in a ring buffer and reports rolling percentiles, GpuTimer
+measures GPU time with GL_TIME_ELAPSED queries without stalling the
+pipeline, LatencyStats does the same for single queries outside the frame
+loop (picking on cursor hover).
+"""
+
+import ctypes
+import time
+
+import numpy as np
+
+from OpenGL.GL import *
+from OpenGL.GL.ARB.timer_query import glInitTimerQueryARB
+# der Wrapper von glGetQueryObjectui64v kennt den 64-Bit-Typ nicht
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v
+
+
+class FrameProfiler:
+    """
+    Lap timer over the phases of a frame. begin_frame() starts a frame,
+    lap(phase) books the time since the previous lap on phase. 'poll' is
+    the event dispatch (glfw callbacks), 'events' hover picking, shader
+    polling and the coalesced input.
+    """
+
+    PHASES = ('poll', 'events', 'upload', 'matrices', 'cull', 'uniforms', 'draw', 'swap', 'gpu', 'frame')
+
+    def __init__(self, capacity=1000):
+        self.samples = np.full((capacity, len(self.PHASES)), np.nan)
+        self.column = {name: i for i, name in enumerate(self.PHASES)}
+        self.count = 0
+        self.row = self.samples[0]
+        self.frame_start = self.last = time.perf_counter()
+
+    def begin_frame(self):
+        self.row = self.samples[self.count % len(self.samples)]
+        self.row[:] = np.nan
+        self.frame_start = self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.row[self.column[phase]] = now - self.last
+        self.last = now
+
+    def record(self, phase, seconds):
+        self.row[self.column[phase]] = seconds
+
+    def end_frame(self):
+        self.row[self.column['frame']] = time.perf_counter() - self.frame_start
+        self.count += 1
+
+    def history(self):
+        # gueltige Zeilen in zeitlicher Reihenfolge
+        n = min(self.count, len(self.samples))
+        start = self.count % len(self.samples) if self.count > len(self.samples) else 0
+        return np.roll(self.samples, -start, axis=0)[:n]
+
+    def stats(self):
+        # {phase: {'p50': ms, 'p95': ms, 'p99': ms, 'mean': ms}}
+        history = self.history()
+        result = {}
+        for name, column in self.column.items():
+            values = history[:, column]
+            values = values[~np.isnan(values)] * 1e3
+            if len(values) == 0:
+                continue
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            result[name] = {'p50': p50, 'p95': p95, 'p99': p99, 'mean': values.mean()}
+        return result
+
+    def summary(self):
+        # eine Zeile, z.B. fuer den Fenstertitel
+        stats = self.stats()
+        if 'frame' not in stats:
+            return ""
+        frame = stats['frame']
+        text = f"{1e3 / frame['mean']:.0f} fps | frame p50 {frame['p50']:.2f} p95 {frame['p95']:.2f} p99 {frame['p99']:.2f} ms"
+        if 'gpu' in stats:
+            text += f" | gpu p50 {stats['gpu']['p50']:.2f} ms"
+        return text
+
+    def report(self):
+        lines = [f"{'phase':<10}{'p50':>9}{'p95':>9}{'p99':>9}{'mean':>9}  [ms]"]
+        for name, s in self.stats().items():
+            lines.append(f"{name:<10}{s['p50']:>9.3f}{s['p95']:>9.3f}{s['p99']:>9.3f}{s['mean']:>9.3f}")
+        return "\n".join(lines)
+
+    def dump(self, filename):
+        # .csv: eine Zeile pro Frame; sonst JSON mit Statistik und Rohdaten
+        import csv
+        import json
+        history = self.history() * 1e3
+        if filename.endswith('.csv'):
+            with open(filename, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow([name + '_ms' for name in self.PHASES])
+                for row in history:
+                    writer.writerow(['' if np.isnan(v) else f'{v:.6f}' for v in row])
+            return
+        frames = [{name: (None if np.isnan(v) else v) for name, v in zip(self.PHASES, row)}
+                  for row in history]
+        with open(filename, 'w') as file:
+            json.dump({'frames_total': self.count, 'stats_ms': self.stats(),
+                       'frames_ms': frames}, file, indent=1)
+
+
+class LatencyStats:
+    """
+    Ring buffer of query latencies (seconds) with the percentiles of
+    FrameProfiler, for work that runs in event callbacks rather than frames.
+    """
+
+    def __init__(self, capacity=1000):
+        self.samples = np.full(capacity, np.nan)
+        self.count = 0
+        self.last = np.nan
+
+    def add(self, seconds):
+        self.samples[self.count % len(self.samples)] = self.last = seconds
+        self.count += 1
+
+    def stats(self):
+        # {'p50': ms, 'p95': ms, 'p99': ms, 'mean': ms, 'last': ms} oder {} ohne Messung
+        values = self.samples[~np.isnan(self.samples)] * 1e3
+        if len(values) == 0:
+            return {}
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {'p50': p50, 'p95': p95, 'p99': p99, 'mean': values.mean(), 'last': self.last * 1e3}
+
+    def summary(self, name):
+        stats = self.stats()
+        if not stats:
+            return ""
+        return f"{name} {stats['last']:.2f} ms (p50 {stats['p50']:.2f} p95 {stats['p95']:.2f}, {self.count} queries)"
+
+
+def timer_queries_supported():
+    # braucht einen aktuellen Kontext
+    version = (int(glGetIntegerv(GL_MAJOR_VERSION)), int(glGetIntegerv(GL_MINOR_VERSION)))
+    return version >= (3, 3) or bool(glInitTimerQueryARB())
+
+
+class GpuTimer:
+    """
+    GL_TIME_ELAPSED queries in a small ring, results are read a few frames
+    later once available. Disabled if the context lacks timer queries.
+    """
+
+    def __init__(self, count=4):
+        self.queries = []
+        self.enabled = False
+        # Timer-Queries sind erst ab GL 3.3 bzw. ARB_timer_query verfuegbar; ausdruecklich
+        # abfragen, mit OGLVIEWER_GL_CHECKS=0 meldet der Probelauf keinen GLError
+        if timer_queries_supported():
+            try:
+                self.queries = list(np.atleast_1d(glGenQueries(count)))
+                glBeginQuery(GL_TIME_ELAPSED, self.queries[0])
+                glEndQuery(GL_TIME_ELAPSED)
+                glGetQueryObjectuiv(self.queries[0], GL_QUERY_RESULT)
+                self.enabled = True
+            except GLError:
+                self.queries = []
+        self.pending = []
+        self.result = ctypes.c_uint64()
+        # die erste Messung verwerfen, llvmpipe liefert dort einen Zeitstempel
+        self.skip = 1
+
+    def begin(self):
+        if not self.enabled or len(self.pending) == len(self.queries):
+            return False
+        query = next(q for q in self.queries if q not in self.pending)
+        glBeginQuery(GL_TIME_ELAPSED, query)
+        self.pending.append(query)
+        return True
+
+    def end(self):
+        glEndQuery(GL_TIME_ELAPSED)
+
+    def collect(self):
+        # Sekunden der fertigen Messungen, aelteste zuerst
+        results = []
+        while self.pending:
+            query = self.pending[0]
+            if not glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE):
+                break
+            glGetQueryObjectui64v(query, GL_QUERY_RESULT, ctypes.byref(self.result))
+            self.pending.pop(0)
+            if self.skip:
+                self.skip -= 1
+                continue
+            results.append(self.result.value * 1e-9)
+        return results
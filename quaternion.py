@@ -0,0 +1,227 @@
+"""
+quaternion.py
+
+Unit quaternions for the arcball: a slotted class on plain Python floats,
+which for single rotations is cheaper than any NumPy call. Rotations are
+composed in quaternion space and only turned into a matrix once per frame
+(to_matrix with an out buffer, same convention as mat4.rotate).
+
+The *_many functions are the batch counterparts on (N, 4) float arrays
+in (w, x, y, z) order, for replaying recorded drags and camera paths
+without a Python call per event: arcball_many turns (N, 3) sphere points
+(utils.project_on_sphere_many) into cumulative rotations in one call.
+"""
+
+import math
+
+import numpy as np
+
+
+class Quaternion:
+    """
+    w + xi + yj + zk. Products of unit quaternions drift slowly away from
+    length 1, callers renormalize every few compositions.
+    """
+
+    __slots__ = ('w', 'x', 'y', 'z')
+
+    def __init__(self, w=1.0, x=0.0, y=0.0, z=0.0):
+        self.w, self.x, self.y, self.z = w, x, y, z
+
+    @classmethod
+    def from_axis_angle(cls, axis, angle):
+        # angle in Grad wie bei mat4.rotate
+        x, y, z = (float(a) for a in axis)
+        l = math.sqrt(x*x + y*y + z*z)
+        half = math.radians(angle) * 0.5
+        s = math.sin(half) / l
+        return cls(math.cos(half), x*s, y*s, z*s)
+
+    @classmethod
+    def from_arcball(cls, p1, p2):
+        """
+        Rotation taking unit vector p1 to p2 (points on the arcball), or
+        None if they (nearly) coincide. Uses (1 + p1.p2, p1 x p2), which
+        normalized is the half-angle quaternion, no trigonometry needed.
+        """
+        ax, ay, az = float(p1[0]), float(p1[1]), float(p1[2])
+        bx, by, bz = float(p2[0]), float(p2[1]), float(p2[2])
+        cx, cy, cz = ay*bz - az*by, az*bx - ax*bz, ax*by - ay*bx
+        if cx*cx + cy*cy + cz*cz < 1e-12:
+            return None
+        q = cls(1.0 + ax*bx + ay*by + az*bz, cx, cy, cz)
+        return q.normalize()
+
+    def __mul__(self, other):
+        # Hamilton-Produkt: erst other, dann self anwenden
+        aw, ax, ay, az = self.w, self.x, self.y, self.z
+        bw, bx, by, bz = other.w, other.x, other.y, other.z
+        return Quaternion(aw*bw - ax*bx - ay*by - az*bz,
+                          aw*bx + ax*bw + ay*bz - az*by,
+                          aw*by - ax*bz + ay*bw + az*bx,
+                          aw*bz + ax*by - ay*bx + az*bw)
+
+    def __repr__(self):
+        return f"Quaternion({self.w:.6g}, {self.x:.6g}, {self.y:.6g}, {self.z:.6g})"
+
+    def copy(self):
+        return Quaternion(self.w, self.x, self.y, self.z)
+
+    def to_array(self):
+        return np.array([self.w, self.x, self.y, self.z])
+
+    @classmethod
+    def from_array(cls, q):
+        w, x, y, z = (float(c) for c in q)
+        return cls(w, x, y, z)
+
+    def conjugate(self):
+        return Quaternion(self.w, -self.x, -self.y, -self.z)
+
+    def dot(self, other):
+        return self.w*other.w + self.x*other.x + self.y*other.y + self.z*other.z
+
+    def norm(self):
+        return math.sqrt(self.dot(self))
+
+    def normalize(self):
+        # in place, gibt self zurueck
+        l = self.norm()
+        self.w, self.x, self.y, self.z = self.w / l, self.x / l, self.y / l, self.z / l
+        return self
+
+    def to_matrix(self, out=None):
+        # 4x4 float32, gleiche Konvention wie mat4.rotate
+        w, x, y, z = self.w, self.x, self.y, self.z
+        if out is None:
+            out = np.empty((4, 4), dtype=np.float32)
+        out[0, 0], out[0, 1], out[0, 2], out[0, 3] = 1 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y), 0.0
+        out[1, 0], out[1, 1], out[1, 2], out[1, 3] = 2*(x*y + w*z), 1 - 2*(x*x + z*z), 2*(y*z - w*x), 0.0
+        out[2, 0], out[2, 1], out[2, 2], out[2, 3] = 2*(x*z - w*y), 2*(y*z + w*x), 1 - 2*(x*x + y*y), 0.0
+        out[3, 0], out[3, 1], out[3, 2], out[3, 3] = 0.0, 0.0, 0.0, 1.0
+        return out
+
+    @classmethod
+    def from_matrix(cls, m):
+        # Rotationsanteil einer (orthonormalen) 3x3- oder 4x4-Matrix (Shepperd)
+        m = np.asarray(m, dtype=np.float64)
+        trace = m[0, 0] + m[1, 1] + m[2, 2]
+        if trace > 0:
+            s = math.sqrt(trace + 1.0) * 2
+            q = cls(0.25 * s, (m[2, 1] - m[1, 2]) / s, (m[0, 2] - m[2, 0]) / s, (m[1, 0] - m[0, 1]) / s)
+        elif m[0, 0] > m[1, 1] and m[0, 0] > m[2, 2]:
+            s = math.sqrt(1.0 + m[0, 0] - m[1, 1] - m[2, 2]) * 2
+            q = cls((m[2, 1] - m[1, 2]) / s, 0.25 * s, (m[0, 1] + m[1, 0]) / s, (m[0, 2] + m[2, 0]) / s)
+        elif m[1, 1] > m[2, 2]:
+            s = math.sqrt(1.0 + m[1, 1] - m[0, 0] - m[2, 2]) * 2
+            q = cls((m[0, 2] - m[2, 0]) / s, (m[0, 1] + m[1, 0]) / s, 0.25 * s, (m[1, 2] + m[2, 1]) / s)
+        else:
+            s = math.sqrt(1.0 + m[2, 2] - m[0, 0] - m[1, 1]) * 2
+            q = cls((m[1, 0] - m[0, 1]) / s, (m[0, 2] + m[2, 0]) / s, (m[1, 2] + m[2, 1]) / s, 0.25 * s)
+        return q.normalize()
+
+
+def slerp(a, b, t):
+    """
+    Spherical linear interpolation between unit quaternions a and b for t
+    in [0, 1], along the shorter arc.
+    """
+    d = a.dot(b)
+    bw, bx, by, bz = b.w, b.x, b.y, b.z
+    if d < 0:
+        d, bw, bx, by, bz = -d, -bw, -bx, -by, -bz
+    if d > 0.9995:
+        # fast gleich: linear interpolieren und normieren
+        return Quaternion(a.w + t*(bw - a.w), a.x + t*(bx - a.x),
+                          a.y + t*(by - a.y), a.z + t*(bz - a.z)).normalize()
+    theta = math.acos(d)
+    s = math.sin(theta)
+    wa, wb = math.sin((1 - t) * theta) / s, math.sin(t * theta) / s
+    return Quaternion(wa*a.w + wb*bw, wa*a.x + wb*bx, wa*a.y + wb*by, wa*a.z + wb*bz)
+
+
+def multiply_many(a, b):
+    # Hamilton-Produkt zeilenweise (broadcastet), erst b, dann a anwenden
+    aw, ax, ay, az = np.moveaxis(np.asarray(a, dtype=np.float64), -1, 0)
+    bw, bx, by, bz = np.moveaxis(np.asarray(b, dtype=np.float64), -1, 0)
+    return np.stack([aw*bw - ax*bx - ay*by - az*bz,
+                     aw*bx + ax*bw + ay*bz - az*by,
+                     aw*by - ax*bz + ay*bw + az*bx,
+                     aw*bz + ax*by - ay*bx + az*bw], axis=-1)
+
+
+def normalize_many(q):
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def cumulative_product(q):
+    """
+    Running products out[i] = q[i] * ... * q[1] * q[0] of (N, 4) rotations
+    as a parallel prefix scan: log2(N) vectorized steps instead of N
+    Python-level multiplications. Renormalized after every step.
+    """
+    out = np.array(q, dtype=np.float64)
+    step = 1
+    while step < len(out):
+        # out[i] deckt (i - step, i] ab, davor kommt out[i - step]
+        out[step:] = normalize_many(multiply_many(out[step:], out[:-step]))
+        step *= 2
+    return out
+
+
+def arcball_many(points, start=None):
+    """
+    Cumulative arcball rotations of a drag through (N, 3) unit sphere
+    points: out[0] is start (identity by default), out[i] the rotation
+    after moving from points[0] to points[i]. Returns (N, 4).
+
+    Moves too small for Quaternion.from_arcball count as no rotation,
+    where the event handler instead keeps the old point for the next
+    event; the difference stays below 1e-6 rad per event.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    p1, p2 = points[:-1], points[1:]
+    steps = np.empty((len(points), 4))
+    steps[0] = (1.0, 0.0, 0.0, 0.0) if start is None else np.asarray(start, dtype=np.float64)
+    steps[1:, 0] = 1.0 + np.einsum('ij,ij->i', p1, p2)
+    steps[1:, 1:] = np.cross(p1, p2)
+    tiny = np.einsum('ij,ij->i', steps[1:, 1:], steps[1:, 1:]) < 1e-12
+    steps[1:][tiny] = (1.0, 0.0, 0.0, 0.0)
+    return cumulative_product(normalize_many(steps))
+
+
+def to_matrix_many(q, out=None):
+    # (N, 4, 4) float32, wie Quaternion.to_matrix
+    w, x, y, z = np.moveaxis(np.asarray(q, dtype=np.float64), -1, 0)
+    if out is None:
+        out = np.empty((len(w), 4, 4), dtype=np.float32)
+    out[:, 0, 0], out[:, 0, 1], out[:, 0, 2] = 1 - 2*(y*y + z*z), 2*(x*y - w*z), 2*(x*z + w*y)
+    out[:, 1, 0], out[:, 1, 1], out[:, 1, 2] = 2*(x*y + w*z), 1 - 2*(x*x + z*z), 2*(y*z - w*x)
+    out[:, 2, 0], out[:, 2, 1], out[:, 2, 2] = 2*(x*z - w*y), 2*(y*z + w*x), 1 - 2*(x*x + y*y)
+    out[:, :3, 3] = 0
+    out[:, 3, :3] = 0
+    out[:, 3, 3] = 1
+    return out
+
+
+def slerp_many(a, b, t, shortest=True):
+    """
+    Batch slerp of (N, 4) quaternions (a and b broadcast) for t (N,).
+    shortest=False keeps the sign of b, as the inner slerps of a SQUAD
+    spline need.
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    t = np.asarray(t, dtype=np.float64)[..., np.newaxis]
+    d = np.sum(a * b, axis=-1, keepdims=True)
+    if shortest:
+        b = np.where(d < 0, -b, b)
+        d = np.abs(d)
+    theta = np.arccos(np.clip(d, -1.0, 1.0))
+    s = np.sin(theta)
+    # fast gleich: linear interpolieren (wie slerp)
+    near = np.abs(d) > 0.9995
+    safe_s = np.where(near, 1.0, s)
+    wa = np.where(near, 1.0 - t, np.sin((1.0 - t) * theta) / safe_s)
+    wb = np.where(near, t, np.sin(t * theta) / safe_s)
+    return normalize_many(wa * a + wb * b)
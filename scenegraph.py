@@ -0,0 +1,299 @@
+"""
+scenegraph.py
+
+Many meshes with independent transforms: a tree of SceneNodes, each node
+may reference a mesh file and carry N instance matrices. Identical files
+share one set of GPU buffers through the reference counted GeometryCache;
+per frame the world matrices of all instances of a file are written into
+that geometry's instance VBO and drawn with a single
+glDrawElementsInstanced, i.e. one draw per unique mesh. With frustum
+planes the instances are culled against their bounding spheres first.
+
+    graph = SceneGraph(GeometryCache())
+    cows = graph.root.add(SceneNode('obj_files/cow.obj', grid_transforms(100)))
+    cows.set_transforms(matrices)        # (N, 4, 4), row-major like mat4.py
+    graph.draw(shader, state)
+"""
+
+import ctypes
+import os
+
+import numpy as np
+
+from OpenGL.GL import *
+
+from culling import compute_bounds, spheres_visible
+from meshcache import load_mesh
+from vertexformat import MeshBuffers, VertexFormat, attribute_offset
+
+# mat4-Attribut belegt vier Locations (eine pro Spalte)
+INSTANCE_LOCATION = 2
+
+
+def create_vertex_array(buffers, upload=True):
+    """
+    VAO with the vertex buffers of a MeshBuffers layout. With upload=False
+    the buffers are only allocated (see asyncload.ModelUpload). Returns
+    (vertex_array, [buffer ids]), the VAO stays bound.
+    """
+    vertex_array = glGenVertexArrays(1)
+    glBindVertexArray(vertex_array)
+    names = []
+    for data, stride, attributes in buffers.vertex_buffers:
+        vbo = glGenBuffers(1)
+        names.append(vbo)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, data.nbytes, data if upload else None, GL_STATIC_DRAW)
+        for attribute in attributes:
+            glVertexAttribPointer(attribute.location, attribute.size, attribute.gl_type,
+                                  attribute.normalized, stride, attribute_offset(attribute))
+            glEnableVertexAttribArray(attribute.location)
+    return vertex_array, names
+
+
+class Geometry:
+    """
+    GPU buffers of one mesh file plus an instance VBO with one column-major
+    mat4 per instance (attribute locations 2-5, divisor 1).
+    """
+
+    def __init__(self, filename, mesh, fmt=None):
+        self.filename = filename
+        self.refcount = 0
+        self.bounds = compute_bounds(mesh['vertices'])
+        buffers = MeshBuffers(mesh['vertices'], mesh['normals'], mesh['indices'], fmt)
+        self.uniforms = buffers.uniforms
+        self.index_count = len(buffers.indices)
+        self.index_type = buffers.index_type
+
+        self.vertex_array, self.buffers = create_vertex_array(buffers)
+        self.index_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, buffers.indices.nbytes, buffers.indices, GL_STATIC_DRAW)
+
+        self.instance_buffer = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        for column in range(4):
+            location = INSTANCE_LOCATION + column
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, 64, ctypes.c_void_p(16 * column))
+            glVertexAttribDivisor(location, 1)
+            glEnableVertexAttribArray(location)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindVertexArray(0)
+        self.instance_capacity = 0
+        self.instance_count = 0
+        # Weltmatrizen aller Instanzen und die zuletzt hochgeladene Auswahl
+        self.world_matrices = np.empty((0, 4, 4), dtype=np.float32)
+        self.uploaded = None
+
+    def visible_instances(self, planes):
+        # Umkugel je Instanz: Mittelpunkt transformiert, Radius * groesste Achsenskalierung
+        world = self.world_matrices
+        centers = world[:, :3, :3] @ self.bounds.center + world[:, :3, 3]
+        scale = np.sqrt(np.max(np.sum(world[:, :3, :3] ** 2, axis=1), axis=1))
+        return spheres_visible(planes, centers, self.bounds.radius * scale)
+
+    def upload_instances(self, matrices):
+        # (N, 4, 4) zeilenweise -> spaltenweise fuer das mat4-Attribut
+        data = np.ascontiguousarray(matrices.transpose(0, 2, 1), dtype=np.float32)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        if len(data) > self.instance_capacity:
+            # wachsen in Zweierpotenzen, sonst nur Teilupdate
+            self.instance_capacity = 1 << max(0, len(data) - 1).bit_length()
+            glBufferData(GL_ARRAY_BUFFER, self.instance_capacity * 64, None, GL_DYNAMIC_DRAW)
+        if len(data):
+            glBufferSubData(GL_ARRAY_BUFFER, 0, data.nbytes, data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.instance_count = len(data)
+
+    def delete(self):
+        glDeleteVertexArrays(1, [self.vertex_array])
+        glDeleteBuffers(len(self.buffers) + 2, self.buffers + [self.index_buffer, self.instance_buffer])
+
+
+class GeometryCache:
+    """
+    One Geometry per mesh file, shared by all nodes that reference it.
+    acquire() increments, release() decrements the reference count; the GL
+    buffers are freed when it drops to zero.
+    """
+
+    def __init__(self, mesh_cache=None, vertex_format=None, workers=1, **options):
+        self.mesh_cache = mesh_cache
+        self.vertex_format = vertex_format or VertexFormat()
+        self.workers = workers
+        self.options = options
+        self.entries = {}
+
+    def acquire(self, filename):
+        key = os.path.abspath(filename)
+        geometry = self.entries.get(key)
+        if geometry is None:
+            mesh = load_mesh(filename, self.mesh_cache, self.workers, **self.options)
+            geometry = self.entries[key] = Geometry(filename, mesh, self.vertex_format)
+        geometry.refcount += 1
+        return geometry
+
+    def release(self, geometry):
+        geometry.refcount -= 1
+        if geometry.refcount <= 0:
+            geometry.delete()
+            del self.entries[os.path.abspath(geometry.filename)]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SceneNode:
+    """
+    Node with a local (4, 4) transform, children and optionally a mesh file
+    drawn once per row of its (N, 4, 4) instance matrices (relative to the
+    node). Without a mesh the node only groups its children.
+    """
+
+    def __init__(self, filename=None, instances=None, matrix=None):
+        self.filename = filename
+        self.matrix = np.identity(4, dtype=np.float32) if matrix is None else np.asarray(matrix, np.float32)
+        if instances is None:
+            instances = np.identity(4, dtype=np.float32)[np.newaxis] if filename else np.empty((0, 4, 4))
+        self.instances = np.asarray(instances, dtype=np.float32)
+        self.children = []
+        self.parent = None
+        self.graph = None
+        self.geometry = None
+
+    def add(self, child):
+        child.parent = self
+        self.children.append(child)
+        if self.graph is not None:
+            self.graph.attach(child)
+        return child
+
+    def remove(self, child):
+        self.children.remove(child)
+        child.parent = None
+        if self.graph is not None:
+            self.graph.detach(child)
+
+    def set_matrix(self, matrix):
+        self.matrix[...] = matrix
+        self.mark_dirty()
+
+    def set_transforms(self, matrices):
+        # Instanzmatrizen auf einmal ersetzen, Anzahl darf sich aendern
+        self.instances = np.asarray(matrices, dtype=np.float32).reshape(-1, 4, 4)
+        self.mark_dirty()
+
+    def mark_dirty(self):
+        if self.graph is not None:
+            self.graph.dirty = True
+
+    def walk(self, parent_world=None):
+        # (Knoten, Weltmatrix) in Tiefensuche
+        world = self.matrix if parent_world is None else parent_world @ self.matrix
+        yield self, world
+        for child in self.children:
+            yield from child.walk(world)
+
+
+class SceneGraph:
+    """
+    Owner of the node tree; collects the world matrices per geometry when
+    something changed and issues one instanced draw per unique mesh.
+    """
+
+    def __init__(self, geometry_cache):
+        self.geometry_cache = geometry_cache
+        self.root = SceneNode()
+        self.root.graph = self
+        self.dirty = True
+        self.culled_instances = 0
+
+    def attach(self, node):
+        for child, _ in node.walk():
+            child.graph = self
+            if child.filename and child.geometry is None:
+                child.geometry = self.geometry_cache.acquire(child.filename)
+        self.dirty = True
+
+    def detach(self, node):
+        for child, _ in node.walk():
+            if child.geometry is not None:
+                self.geometry_cache.release(child.geometry)
+                child.geometry = None
+            child.graph = None
+        self.dirty = True
+
+    def instance_count(self):
+        return sum(len(node.instances) for node, _ in self.root.walk() if node.geometry)
+
+    def update(self):
+        # Weltmatrizen aller Instanzen je Geometrie sammeln
+        if not self.dirty:
+            return
+        batches = {}
+        for node, world in self.root.walk():
+            if node.geometry is not None and len(node.instances):
+                batches.setdefault(node.geometry, []).append(np.matmul(world, node.instances))
+        for geometry in self.geometry_cache.entries.values():
+            matrices = batches.get(geometry)
+            geometry.world_matrices = np.concatenate(matrices) if matrices else np.empty((0, 4, 4), np.float32)
+            geometry.uploaded = None
+        self.dirty = False
+
+    def upload(self, planes=None):
+        # Instanz-VBOs nur neu fuellen, wenn sich Matrizen oder Sichtbarkeit aendern
+        self.culled_instances = 0
+        for geometry in self.geometry_cache.entries.values():
+            if planes is None:
+                mask = np.ones(len(geometry.world_matrices), dtype=bool)
+            else:
+                mask = geometry.visible_instances(planes)
+                self.culled_instances += len(mask) - int(mask.sum())
+            if geometry.uploaded is not None and np.array_equal(mask, geometry.uploaded):
+                continue
+            geometry.upload_instances(geometry.world_matrices[mask])
+            geometry.uploaded = mask
+
+    def draw(self, shader, state, planes=None):
+        """
+        One glDrawElementsInstanced per geometry with the shader's other
+        uniforms already set; planes (see culling.frustum_planes, in world
+        space of the graph) enable per-instance culling. Returns the number
+        of draw calls.
+        """
+        self.update()
+        self.upload(planes)
+        draws = 0
+        for geometry in self.geometry_cache.entries.values():
+            if geometry.instance_count == 0:
+                continue
+            for name, value in geometry.uniforms.items():
+                shader.set_uniform(name, value)
+            state.bind_vertex_array(geometry.vertex_array)
+            glDrawElementsInstanced(GL_TRIANGLES, geometry.index_count, geometry.index_type,
+                                    None, geometry.instance_count)
+            draws += 1
+        return draws
+
+
+def grid_transforms(count, spacing=1.0, seed=0):
+    """
+    (count, 4, 4) matrices on a square grid in the x/z plane centered at the
+    origin, scaled to fit into [-1, 1] and randomly rotated around y.
+    """
+    side = int(np.ceil(np.sqrt(count)))
+    index = np.arange(count)
+    scale = 2.0 / (side * spacing)
+    angles = np.random.default_rng(seed).uniform(0, 2 * np.pi, count)
+    c, s = np.cos(angles), np.sin(angles)
+    matrices = np.zeros((count, 4, 4), dtype=np.float32)
+    matrices[:, 0, 0] = c * scale
+    matrices[:, 0, 2] = s * scale
+    matrices[:, 1, 1] = scale
+    matrices[:, 2, 0] = -s * scale
+    matrices[:, 2, 2] = c * scale
+    matrices[:, 0, 3] = ((index % side) - (side - 1) / 2) * spacing * scale
+    matrices[:, 2, 3] = ((index // side) - (side - 1) / 2) * spacing * scale
+    matrices[:, 3, 3] = 1.0
+    return matrices
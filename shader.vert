@@ -3,10 +3,12 @@
 layout (location=0) in vec4 v_position;
 layout (location=1) in vec3 v_color;
 uniform mat4 modelview_projection_matrix;
+uniform vec3 position_scale;   // Dequantisierung (1 bzw. 0 bei float-Positionen)
+uniform vec3 position_offset;
 out vec3 v2f_color;
 
 void main()
 {
     v2f_color = v_color;
-    gl_Position = modelview_projection_matrix * v_position;
+    gl_Position = modelview_projection_matrix * vec4(v_position.xyz * position_scale + position_offset, 1.0);
 }
\ No newline at end of file
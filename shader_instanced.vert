@@ -0,0 +1,15 @@
+#version 330
+
+layout (location=0) in vec4 v_position;
+layout (location=1) in vec3 v_color;
+layout (location=2) in mat4 instance_matrix;   // Modellmatrix je Instanz (Locations 2-5)
+uniform mat4 modelview_projection_matrix;
+uniform vec3 position_scale;   // Dequantisierung (1 bzw. 0 bei float-Positionen)
+uniform vec3 position_offset;
+out vec3 v2f_color;
+
+void main()
+{
+    v2f_color = v_color;
+    gl_Position = modelview_projection_matrix * instance_matrix * vec4(v_position.xyz * position_scale + position_offset, 1.0);
+}
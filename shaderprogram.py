@@ -0,0 +1,302 @@
+"""
+shaderprogram.py
+
+Thin wrappers that keep per-frame PyOpenGL calls down: ShaderProgram looks
+up all active uniforms once and only uploads values that changed, GLState
+drops redundant program, VAO and polygon mode changes.
+
+Linked programs are kept on disk by ProgramCache (glGetProgramBinary /
+glProgramBinary), so a warm start links nothing from source. ShaderProgram
+also watches its source files: poll() notices a changed modification time,
+links the new sources in the background where the driver supports
+GL_KHR_parallel_shader_compile and swaps the program in once it is ready.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from OpenGL.GL import *
+from OpenGL.error import NullFunctionError
+from OpenGL.raw.GL.VERSION.GL_2_0 import glGetProgramiv as _glGetProgramiv
+from OpenGL.GL.KHR.parallel_shader_compile import (GL_COMPLETION_STATUS_KHR, glInitParallelShaderCompileKHR,
+                                                    glMaxShaderCompilerThreadsKHR)
+
+from meshcache import DEFAULT_CACHE_DIR
+
+log = logging.getLogger(__name__)
+
+# im Verzeichnis des Mesh-Caches; mit Punkt, damit dessen LRU es nicht als Eintrag zaehlt
+DEFAULT_PROGRAM_CACHE = os.path.join(DEFAULT_CACHE_DIR, '.programs')
+
+# None = noch nicht abgefragt (braucht einen aktuellen Kontext)
+_parallel_compile = None
+
+
+# Upload-Funktion je Uniform-Typ (Matrizen zeilenweise, daher GL_TRUE)
+_UPLOAD = {
+    int(GL_FLOAT):      lambda loc, v: glUniform1f(loc, v),
+    int(GL_FLOAT_VEC2): lambda loc, v: glUniform2fv(loc, 1, v),
+    int(GL_FLOAT_VEC3): lambda loc, v: glUniform3fv(loc, 1, v),
+    int(GL_FLOAT_VEC4): lambda loc, v: glUniform4fv(loc, 1, v),
+    int(GL_INT):        lambda loc, v: glUniform1i(loc, v),
+    int(GL_BOOL):       lambda loc, v: glUniform1i(loc, v),
+    int(GL_SAMPLER_2D): lambda loc, v: glUniform1i(loc, v),
+    int(GL_FLOAT_MAT3): lambda loc, v: glUniformMatrix3fv(loc, 1, GL_TRUE, v),
+    int(GL_FLOAT_MAT4): lambda loc, v: glUniformMatrix4fv(loc, 1, GL_TRUE, v),
+}
+
+
+def parallel_compile():
+    # Treiber kompiliert in eigenen Threads, Status per GL_COMPLETION_STATUS_KHR
+    global _parallel_compile
+    if _parallel_compile is None:
+        _parallel_compile = bool(glInitParallelShaderCompileKHR())
+        if _parallel_compile:
+            glMaxShaderCompilerThreadsKHR(0xFFFFFFFF)
+    return _parallel_compile
+
+
+def start_link(sources):
+    """
+    Compiles and links (vertex, fragment) sources without waiting for the
+    result; finish_link checks it. The binary retrievable hint is set so
+    the program can be stored in a ProgramCache.
+    """
+    program = glCreateProgram()
+    for source, kind in zip(sources, (GL_VERTEX_SHADER, GL_FRAGMENT_SHADER)):
+        shader = glCreateShader(kind)
+        glShaderSource(shader, source)
+        glCompileShader(shader)
+        glAttachShader(program, shader)
+        # erst mit dem Programm wirklich geloescht
+        glDeleteShader(shader)
+    try:
+        glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+    except (GLError, NullFunctionError):
+        # ohne ARB_get_program_binary (3.2 Core): nur kein Binary fuer den Cache
+        pass
+    glLinkProgram(program)
+    return program
+
+
+def link_ready(program):
+    # der PyOpenGL-Wrapper kennt die Ergebnisgroesse dieses Enums nicht, daher roh
+    if not parallel_compile():
+        return True
+    status = np.zeros(1, dtype=np.int32)
+    _glGetProgramiv(program, GL_COMPLETION_STATUS_KHR, status)
+    return bool(status[0])
+
+
+def finish_link(program, name=''):
+    # RuntimeError mit den Compiler-Meldungen, wenn das Linken fehlschlug
+    if glGetProgramiv(program, GL_LINK_STATUS):
+        return program
+    messages = [glGetShaderInfoLog(shader) for shader in glGetAttachedShaders(program)]
+    messages.append(glGetProgramInfoLog(program))
+    glDeleteProgram(program)
+    text = '\n'.join(m.decode() if isinstance(m, bytes) else m for m in messages if m)
+    raise RuntimeError(f"{name}: shader compilation failed\n{text}")
+
+
+class ProgramCache:
+    """
+    Linked program binaries on disk, one file per program: 4 bytes binary
+    format followed by the driver's blob. The key hashes both sources with
+    GL vendor, renderer and version, a driver update invalidates it.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_PROGRAM_CACHE):
+        self.cache_dir = cache_dir
+        self.driver = None
+
+    def key(self, sources):
+        if self.driver is None:
+            self.driver = '|'.join(glGetString(name).decode() for name in (GL_VENDOR, GL_RENDERER, GL_VERSION))
+        digest = hashlib.sha1(self.driver.encode('utf-8'))
+        for source in sources:
+            digest.update(b'\0' + source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def load(self, key):
+        # Programm aus dem Binary oder None (fehlt, anderer Treiber, defekt)
+        try:
+            with open(os.path.join(self.cache_dir, key + '.bin'), 'rb') as file:
+                data = file.read()
+        except OSError:
+            return None
+        if len(data) <= 4:
+            return None
+        binary = np.frombuffer(data, dtype=np.uint8, offset=4)
+        program = glCreateProgram()
+        try:
+            glProgramBinary(program, int(np.frombuffer(data[:4], dtype='<u4')[0]), binary, len(binary))
+        except (GLError, NullFunctionError) as error:
+            # Treiber ohne Programm-Binaries oder unbekanntes Format: aus dem Quelltext bauen
+            log.debug(f"program binary rejected: {error}")
+            glDeleteProgram(program)
+            return None
+        if not glGetProgramiv(program, GL_LINK_STATUS):
+            glDeleteProgram(program)
+            return None
+        return program
+
+    def store(self, key, program):
+        try:
+            size = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+            if size <= 0:
+                return
+            binary = np.empty(size, dtype=np.uint8)
+            length = np.zeros(1, dtype=np.int32)
+            binary_format = np.zeros(1, dtype='<u4')
+            glGetProgramBinary(program, size, length, binary_format, binary)
+        except (GLError, NullFunctionError) as error:
+            log.debug(f"program binary not available: {error}")
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # erst vollstaendig schreiben, dann umbenennen
+            fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as file:
+                file.write(binary_format.tobytes() + binary[:length[0]].tobytes())
+            os.replace(tmp, os.path.join(self.cache_dir, key + '.bin'))
+        except OSError as error:
+            log.warning(f"program cache not written: {error}")
+
+
+class ShaderProgram:
+    """
+    Compiled program with cached uniform locations and last uploaded values.
+    With a ProgramCache the linked binary is reused across runs.
+    """
+
+    def __init__(self, vertex_file, fragment_file, cache=None):
+        self.files = (vertex_file, fragment_file)
+        self.name = '+'.join(os.path.basename(f) for f in self.files)
+        self.cache = cache
+        self.mtimes = self.file_mtimes()
+        # laufender Hintergrund-Build nach einer Dateiaenderung
+        self.pending = None
+        sources = self.read_sources()
+        key = cache.key(sources) if cache is not None else None
+        self.program = cache.load(key) if cache is not None else None
+        self.from_cache = self.program is not None
+        if self.program is None:
+            self.program = finish_link(start_link(sources), self.name)
+            if cache is not None:
+                cache.store(key, self.program)
+        self.introspect()
+
+    def read_sources(self):
+        sources = []
+        for filename in self.files:
+            with open(filename) as file:
+                sources.append(file.read())
+        return sources
+
+    def file_mtimes(self):
+        return [os.stat(filename).st_mtime_ns for filename in self.files]
+
+    def poll(self):
+        """
+        Hot reload: starts a rebuild when a source file changed and swaps
+        the new program in when it is linked. Returns True on a swap; a
+        failing build is logged and the old program stays active.
+        """
+        if self.pending is None:
+            try:
+                mtimes = self.file_mtimes()
+                if mtimes == self.mtimes:
+                    return False
+                self.mtimes = mtimes
+                sources = self.read_sources()
+            except OSError:
+                # Editor speichert gerade (Datei kurz weg)
+                return False
+            self.pending = (start_link(sources), sources)
+        program, sources = self.pending
+        if not link_ready(program):
+            return False
+        self.pending = None
+        try:
+            finish_link(program, self.name)
+        except RuntimeError as error:
+            log.error(str(error))
+            return False
+        glDeleteProgram(self.program)
+        self.program = program
+        if self.cache is not None:
+            self.cache.store(self.cache.key(sources), program)
+        self.introspect()
+        log.info(f"reloaded {self.name}")
+        return True
+
+    def delete(self):
+        for program in (self.program, self.pending and self.pending[0]):
+            if program:
+                glDeleteProgram(program)
+
+    def introspect(self):
+        # name -> (Location, Typ) aller aktiven Uniforms, einmalig abgefragt
+        self.uniforms = {}
+        self.values = {}
+        for i in range(glGetProgramiv(self.program, GL_ACTIVE_UNIFORMS)):
+            name, size, type_ = glGetActiveUniform(self.program, i)
+            name = name.decode() if isinstance(name, bytes) else name
+            name = name.split('[')[0]
+            self.uniforms[name] = (glGetUniformLocation(self.program, name), int(type_))
+
+    def set_uniform(self, name, value):
+        # vom Compiler entfernte oder unbekannte Uniforms still ignorieren,
+        # wie glUniform* mit Location -1
+        entry = self.uniforms.get(name)
+        if entry is None:
+            return False
+        previous = self.values.get(name)
+        if isinstance(value, np.ndarray):
+            if previous is not None and np.array_equal(previous, value):
+                return False
+            self.values[name] = value.copy()
+        else:
+            if previous == value:
+                return False
+            self.values[name] = value
+        location, type_ = entry
+        _UPLOAD[type_](location, value)
+        return True
+
+
+class GLState:
+    """
+    Shadow copy of the GL state touched by Scene.draw; setters only call
+    into GL when the value actually changes.
+    """
+
+    def __init__(self):
+        self.program = None
+        self.vertex_array = None
+        self.polygon_mode = None
+
+    def use_program(self, shader):
+        program = shader.program if isinstance(shader, ShaderProgram) else shader
+        if program != self.program:
+            glUseProgram(program)
+            self.program = program
+
+    def bind_vertex_array(self, vertex_array):
+        if vertex_array != self.vertex_array:
+            glBindVertexArray(vertex_array)
+            self.vertex_array = vertex_array
+
+    def set_polygon_mode(self, mode):
+        if mode != self.polygon_mode:
+            glPolygonMode(GL_FRONT_AND_BACK, mode)
+            self.polygon_mode = mode
+
+    def invalidate(self):
+        # nach fremden GL-Aufrufen (z.B. gen_buffers) alles neu setzen
+        self.__init__()
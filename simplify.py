@@ -0,0 +1,194 @@
+"""
+simplify.py
+
+Level-of-detail generation with quadric error metrics (Garland & Heckbert):
+every vertex carries the summed plane quadrics of its faces, an edge
+collapse u -> v costs v^T (Q_u + Q_v) v. Instead of a priority queue the
+collapses run in vectorized passes: each pass takes the edges that are
+cheapest among all edges of both of their vertices (an independent set),
+rejects collapses that would flip a triangle and applies the rest at once.
+
+Collapses move u onto the existing vertex v (half-edge collapse), so all
+levels share the vertex buffer of the full mesh and only the index
+buffers differ.
+
+    python simplify.py obj_files/squirrel_ar.obj [--lod=0.5,0.25,0.125]
+"""
+
+import sys
+
+import numpy as np
+
+DEFAULT_RATIOS = (0.5, 0.25, 0.125)
+# Gewicht der Ebenen senkrecht zu Randkanten (haelt offene Raender und Normalen-Naehte fest)
+BOUNDARY_WEIGHT = 100.0
+
+
+def _plane_quadrics(points, normals, weights, vertex_ids, vertex_count):
+    # Summe von w * p p^T mit p = (n, -n.x) je Vertex, 16 bincounts statt np.add.at
+    planes = np.concatenate([normals, -np.einsum('ij,ij->i', normals, points)[:, np.newaxis]], axis=1)
+    outer = (planes[:, :, np.newaxis] * planes[:, np.newaxis, :] * weights[:, np.newaxis, np.newaxis])
+    outer = outer.reshape(-1, 16)
+    quadrics = np.empty((vertex_count, 16))
+    for k in range(16):
+        quadrics[:, k] = np.bincount(vertex_ids, outer[:, k], vertex_count)
+    return quadrics.reshape(-1, 4, 4)
+
+
+def _edges(tris):
+    # ungerichtete Kanten (a < b) mit Anzahl angrenzender Dreiecke und einem davon
+    a = tris.ravel()
+    b = tris[:, [1, 2, 0]].ravel()
+    pairs = np.stack([np.minimum(a, b), np.maximum(a, b)], axis=1)
+    edges, first, counts = np.unique(pairs, axis=0, return_index=True, return_counts=True)
+    return edges, counts, first // 3
+
+
+def vertex_quadrics(vertices, tris):
+    """
+    (n, 4, 4) error quadrics: area weighted face planes plus planes
+    perpendicular to the faces along boundary edges.
+    """
+    v = vertices[tris]
+    cross = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    area = np.linalg.norm(cross, axis=1)
+    valid = area > 0
+    normals = np.zeros_like(cross)
+    normals[valid] = cross[valid] / area[valid, np.newaxis]
+    quadrics = _plane_quadrics(np.repeat(v[:, 0], 3, axis=0), np.repeat(normals, 3, axis=0),
+                               np.repeat(area * 0.5, 3), tris.ravel(), len(vertices))
+
+    edges, counts, faces = _edges(tris)
+    boundary = counts == 1
+    if boundary.any():
+        a, b = edges[boundary, 0], edges[boundary, 1]
+        direction = vertices[b] - vertices[a]
+        length_sq = np.einsum('ij,ij->i', direction, direction)
+        side = np.cross(direction, normals[faces[boundary]])
+        side_len = np.linalg.norm(side, axis=1)
+        side_len[side_len == 0] = 1.0
+        side /= side_len[:, np.newaxis]
+        quadrics += _plane_quadrics(np.concatenate([vertices[a], vertices[a]]), np.concatenate([side, side]),
+                                    np.tile(BOUNDARY_WEIGHT * length_sq, 2),
+                                    np.concatenate([a, b]), len(vertices))
+    return quadrics
+
+
+def _collapse_costs(vertices, quadrics, edges, frozen):
+    # Kosten beider Richtungen, die billigere gewinnt: (quelle, ziel, kosten)
+    q = quadrics[edges[:, 0]] + quadrics[edges[:, 1]]
+    h = np.concatenate([vertices[edges], np.ones((len(edges), 2, 1))], axis=2)
+    cost_to_a = np.einsum('ei,eij,ej->e', h[:, 0], q, h[:, 0])
+    cost_to_b = np.einsum('ei,eij,ej->e', h[:, 1], q, h[:, 1])
+    # eingefrorene Vertices duerfen nicht wandern
+    cost_to_a[frozen[edges[:, 1]]] = np.inf
+    cost_to_b[frozen[edges[:, 0]]] = np.inf
+    to_b = cost_to_b <= cost_to_a
+    source = np.where(to_b, edges[:, 0], edges[:, 1])
+    target = np.where(to_b, edges[:, 1], edges[:, 0])
+    return source, target, np.maximum(np.where(to_b, cost_to_b, cost_to_a), 0.0)
+
+
+def _face_normals(vertices, tris):
+    v = vertices[tris]
+    return np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+
+
+def simplify(vertices, indices, target_count, quadrics=None):
+    """
+    Collapses edges until at most target_count triangles are left (or no
+    valid collapse remains). Returns (flat indices into vertices, quadrics)
+    so that further levels can continue from the result.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64)
+    tris = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if quadrics is None:
+        quadrics = vertex_quadrics(vertices, tris)
+    else:
+        quadrics = quadrics.copy()
+    n = len(vertices)
+    # Vertices, deren Collapse ein Dreieck umklappen wuerde
+    frozen = np.zeros(n, dtype=bool)
+
+    while len(tris) > target_count:
+        edges, _, _ = _edges(tris)
+        source, target, cost = _collapse_costs(vertices, quadrics, edges, frozen)
+        valid = np.isfinite(cost)
+        if not valid.any():
+            break
+        edges, source, target, cost = edges[valid], source[valid], target[valid], cost[valid]
+
+        # lokale Minima: billigste Kante fuer beide Endpunkte -> unabhaengige Menge
+        rank = np.empty(len(cost), dtype=np.int64)
+        rank[np.argsort(cost, kind='stable')] = np.arange(len(cost))
+        best = np.full(n, len(cost), dtype=np.int64)
+        np.minimum.at(best, edges[:, 0], rank)
+        np.minimum.at(best, edges[:, 1], rank)
+        chosen = (best[edges[:, 0]] == rank) & (best[edges[:, 1]] == rank)
+        chosen_ids = np.flatnonzero(chosen)
+        # billigste zuerst, jede Kante entfernt etwa zwei Dreiecke
+        chosen_ids = chosen_ids[np.argsort(cost[chosen_ids], kind='stable')]
+        needed = (len(tris) - target_count + 1) // 2
+        chosen_ids = chosen_ids[:max(1, min(needed, (len(chosen_ids) + 1) // 2))]
+
+        remap = np.arange(n)
+        remap[source[chosen_ids]] = target[chosen_ids]
+
+        # Dreiecke, deren Normale umklappen wuerde, verbieten den Collapse
+        moved = remap[tris] != tris
+        touched = np.flatnonzero(moved.any(axis=1))
+        new_tris = remap[tris[touched]]
+        alive = ((new_tris[:, 0] != new_tris[:, 1]) & (new_tris[:, 1] != new_tris[:, 2])
+                 & (new_tris[:, 2] != new_tris[:, 0]))
+        before = _face_normals(vertices, tris[touched[alive]])
+        after = _face_normals(vertices, new_tris[alive])
+        flipped = np.einsum('ij,ij->i', before, after) <= 0
+        if flipped.any():
+            bad = tris[touched[alive][flipped]][moved[touched[alive][flipped]]]
+            remap[bad] = bad
+            frozen[bad] = True
+            chosen_ids = chosen_ids[remap[source[chosen_ids]] != source[chosen_ids]]
+        if len(chosen_ids) == 0:
+            continue
+
+        quadrics[target[chosen_ids]] += quadrics[source[chosen_ids]]
+        tris = remap[tris]
+        tris = tris[(tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 2] != tris[:, 0])]
+
+    return tris.ravel(), quadrics
+
+
+def build_lods(vertices, indices, ratios=DEFAULT_RATIOS):
+    """
+    Index arrays for the given triangle ratios of the full mesh (descending),
+    each level simplified further from the previous one.
+    """
+    count = len(indices) // 3
+    lods = []
+    current, quadrics = indices, None
+    for ratio in sorted(ratios, reverse=True):
+        current, quadrics = simplify(vertices, current, int(count * ratio), quadrics)
+        lods.append(current.astype(indices.dtype))
+    return lods
+
+
+def parse_ratios(text):
+    # "0.5,0.25" -> (0.5, 0.25); leer -> Standardstufen
+    if not text or text is True:
+        return DEFAULT_RATIOS
+    return tuple(float(r) for r in text.split(','))
+
+
+if __name__ == '__main__':
+    import time
+    from meshcache import prepare_mesh
+
+    files = [a for a in sys.argv[1:] if not a.startswith('--')]
+    ratios = parse_ratios(next((a.split('=', 1)[1] for a in sys.argv if a.startswith('--lod=')), None))
+    for filename in files:
+        mesh = prepare_mesh(filename)
+        t = time.perf_counter()
+        lods = build_lods(mesh['vertices'], mesh['indices'], ratios)
+        elapsed = time.perf_counter() - t
+        counts = [len(mesh['indices']) // 3] + [len(lod) // 3 for lod in lods]
+        print(f"{filename}: {' / '.join(map(str, counts))} triangles ({elapsed:.2f} s)")
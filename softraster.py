@@ -0,0 +1,262 @@
+"""
+softraster.py
+
+Software rasterizer in plain NumPy for machines without any GL driver (CI,
+batch servers). It takes what Scene.draw hands to the shaders - vertices,
+normals, indices and the modelview-projection, modelview and normal
+matrices - and reproduces shader.* (wireframe, normals as colors),
+gouraud.* and phong.*:
+
+- vertex stage for all vertices at once (Gouraud lighting per vertex),
+- triangles are binned into square screen tiles by their bounding boxes,
+- per tile the candidate pixels of all its triangles are tested at once
+  with precomputed edge functions (barycentrics), the nearest fragment per
+  pixel wins (z-buffer) and only the winners are shaded,
+- tiles are independent and run on a thread pool (NumPy releases the GIL
+  inside its loops).
+
+Wireframe lines are sampled along each edge and resolved for the whole
+frame at once; they are few compared to filled fragments. Triangles with
+a vertex behind the eye (w <= 0) are dropped instead of clipped, near/far
+clipping happens per fragment.
+
+    rasterizer = Rasterizer(640, 480)
+    pixels = rasterizer.render(vertices, normals, indices, mvp, mv, normal_matrix, mode=2)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+WIREFRAME, GOURAUD, PHONG = 0, 1, 2
+DEFAULT_TILE_SIZE = 64
+# Kandidaten-Pixel je Durchgang in einer Kachel (begrenzt den Speicher)
+CHUNK_FRAGMENTS = 1 << 18
+
+# Beleuchtung wie in gouraud.vert / phong.frag
+LIGHT_DIR = np.array([0.5, 0.5, 1.0]) / np.linalg.norm([0.5, 0.5, 1.0])
+MATERIAL_DIFFUSE = np.array([0.4, 0.4, 0.8])
+MATERIAL_SPECULAR = np.array([1.0, 1.0, 1.0])
+AMBIENT = 0.1 * MATERIAL_DIFFUSE
+
+
+def _normalize(v):
+    length = np.linalg.norm(v, axis=-1, keepdims=True)
+    return v / np.where(length > 0, length, 1.0)
+
+
+def lighting(normals, eye_positions, shininess):
+    # (n, 3) Farben aus normierten Normalen und Augpositionen
+    diff = np.maximum(normals @ LIGHT_DIR, 0.0)
+    view_dir = _normalize(-eye_positions)
+    # reflect(-L, N) = -L + 2 (N.L) N
+    reflect_dir = -LIGHT_DIR + 2.0 * (normals @ LIGHT_DIR)[:, np.newaxis] * normals
+    spec = np.maximum(np.einsum('ij,ij->i', view_dir, reflect_dir), 0.0) ** shininess
+    return AMBIENT + diff[:, np.newaxis] * MATERIAL_DIFFUSE + spec[:, np.newaxis] * MATERIAL_SPECULAR
+
+
+def _resolve(pixels, depth):
+    # Index des naechsten Fragments je Pixel; depth liegt in [0, 1], also sortiert pixels * 2 + depth
+    order = np.argsort(pixels * 2.0 + depth, kind='stable')
+    sorted_pixels = pixels[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_pixels[1:] != sorted_pixels[:-1]
+    return order[first]
+
+
+class Rasterizer:
+    """
+    Renders into an (height, width, 4) uint8 RGBA image, top row first and
+    cleared to transparent black like the headless GL path.
+    """
+
+    def __init__(self, width, height, tile_size=DEFAULT_TILE_SIZE, workers=None):
+        self.width, self.height = width, height
+        self.tile_size = tile_size
+        self.tiles_x = -(-width // tile_size)
+        self.tiles_y = -(-height // tile_size)
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='raster') \
+            if self.workers > 1 else None
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def render(self, vertices, normals, indices, mvp_matrix, mv_matrix, normal_matrix,
+               mode=PHONG, shininess=64.0):
+        vertices = np.asarray(vertices, dtype=np.float64)
+        normals = np.asarray(normals, dtype=np.float64)
+        tris = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        mvp_matrix = np.asarray(mvp_matrix, dtype=np.float64)
+
+        # Vertex-Stufe: Clip- und Fensterkoordinaten (Pixelmitte bei i + 0.5, y nach oben)
+        clip = vertices @ mvp_matrix[:, :3].T + mvp_matrix[:, 3]
+        w = clip[:, 3]
+        safe_w = np.where(w > 1e-9, w, 1.0)
+        screen = np.empty((len(vertices), 3))
+        screen[:, 0] = (clip[:, 0] / safe_w + 1.0) * 0.5 * self.width
+        screen[:, 1] = (clip[:, 1] / safe_w + 1.0) * 0.5 * self.height
+        screen[:, 2] = (clip[:, 2] / safe_w + 1.0) * 0.5
+        tris = tris[np.all(w[tris] > 1e-9, axis=1)]
+
+        # Attribute, die ueber das Dreieck interpoliert werden
+        if mode == WIREFRAME:
+            attributes = normals
+        else:
+            mv_matrix = np.asarray(mv_matrix, dtype=np.float64)
+            eye = vertices @ mv_matrix[:3, :3].T + mv_matrix[:3, 3]
+            eye_normals = _normalize(normals @ np.asarray(normal_matrix, dtype=np.float64).T)
+            if mode == GOURAUD:
+                attributes = lighting(eye_normals, eye, shininess)
+            else:
+                attributes = np.concatenate([eye_normals, eye], axis=1)
+
+        color = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        frame = (screen, w, attributes, mode, shininess, color)
+        if mode == WIREFRAME:
+            self._draw_lines(tris, frame)
+        else:
+            setup = self._setup_triangles(tris, screen)
+            work = [(tile, ids, setup, frame) for tile, ids in self._bin(setup)]
+            if self.executor is None:
+                for args in work:
+                    self._raster_tile(*args)
+            else:
+                list(self.executor.map(lambda args: self._raster_tile(*args), work))
+        # Fensterkoordinaten zaehlen von unten
+        return color[::-1]
+
+    def _setup_triangles(self, tris, screen):
+        """
+        Per triangle: barycentric coefficients b_i = A_i x + B_i y + C_i
+        (edge functions divided by twice the signed area, so both windings
+        are drawn like with face culling off) and the pixel bounding box.
+        """
+        p = screen[tris]
+        x, y = p[:, :, 0], p[:, :, 1]
+        area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (x[:, 2] - x[:, 0]) * (y[:, 1] - y[:, 0])
+        # Pixel i ist bedeckt, wenn seine Mitte i + 0.5 im Dreieck liegt
+        x0 = np.maximum(np.ceil(x.min(axis=1) - 0.5), 0).astype(np.int64)
+        x1 = np.minimum(np.floor(x.max(axis=1) - 0.5), self.width - 1).astype(np.int64)
+        y0 = np.maximum(np.ceil(y.min(axis=1) - 0.5), 0).astype(np.int64)
+        y1 = np.minimum(np.floor(y.max(axis=1) - 0.5), self.height - 1).astype(np.int64)
+        keep = (area != 0) & (x0 <= x1) & (y0 <= y1)
+        tris, x, y, area = tris[keep], x[keep], y[keep], area[keep]
+
+        # Kante gegenueber Vertex i: von Vertex i+1 nach i+2
+        xa, ya = x[:, [1, 2, 0]], y[:, [1, 2, 0]]
+        xb, yb = x[:, [2, 0, 1]], y[:, [2, 0, 1]]
+        inv_area = 1.0 / area[:, np.newaxis]
+        a = -(yb - ya) * inv_area
+        b = (xb - xa) * inv_area
+        c = -(a * xa + b * ya)
+        return {'tris': tris, 'a': a, 'b': b, 'c': c,
+                'x0': x0[keep], 'x1': x1[keep], 'y0': y0[keep], 'y1': y1[keep]}
+
+    def _bin(self, setup):
+        # (Kachelindex, Dreiecke) fuer jede Kachel, die eine Bounding Box beruehrt
+        t = self.tile_size
+        tx0, tx1 = setup['x0'] // t, setup['x1'] // t
+        ty0, ty1 = setup['y0'] // t, setup['y1'] // t
+        nx, ny = tx1 - tx0 + 1, ty1 - ty0 + 1
+        counts = nx * ny
+        tri_ids = np.repeat(np.arange(len(counts)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        tiles = (ty0[tri_ids] + local // nx[tri_ids]) * self.tiles_x + tx0[tri_ids] + local % nx[tri_ids]
+        order = np.argsort(tiles, kind='stable')
+        tiles, tri_ids = tiles[order], tri_ids[order]
+        bounds = np.flatnonzero(np.diff(tiles)) + 1
+        return zip(tiles[np.concatenate([[0], bounds])] if len(tiles) else [], np.split(tri_ids, bounds))
+
+    def _raster_tile(self, tile, ids, setup, frame):
+        t = self.tile_size
+        left, bottom = (tile % self.tiles_x) * t, (tile // self.tiles_x) * t
+        right, top = min(left + t, self.width), min(bottom + t, self.height)
+        # Bounding Boxes auf die Kachel beschneiden
+        x0 = np.maximum(setup['x0'][ids], left)
+        y0 = np.maximum(setup['y0'][ids], bottom)
+        nx = np.minimum(setup['x1'][ids], right - 1) - x0 + 1
+        ny = np.minimum(setup['y1'][ids], top - 1) - y0 + 1
+        counts = nx * ny
+
+        tw = right - left
+        depth_buffer = np.full((top - bottom) * tw, np.inf)
+        tri_buffer = np.full(len(depth_buffer), -1, dtype=np.int64)
+        bary_buffer = np.zeros((len(depth_buffer), 3))
+        screen = frame[0]
+        ends = np.cumsum(counts)
+        start = 0
+        while start < len(ids):
+            # so viele Dreiecke, wie in einen Durchgang passen (mindestens eines)
+            stop = max(start + 1, int(np.searchsorted(ends, ends[start] - counts[start] + CHUNK_FRAGMENTS)))
+            chunk = slice(start, stop)
+            c = counts[chunk]
+            local_tri = np.repeat(np.arange(start, stop), c)
+            local = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+            px = x0[local_tri] + local % nx[local_tri]
+            py = y0[local_tri] + local // nx[local_tri]
+            tri = ids[local_tri]
+
+            # Kantenfunktionen = baryzentrische Koordinaten an den Pixelmitten
+            bary = (setup['a'][tri] * (px + 0.5)[:, np.newaxis] + setup['b'][tri] * (py + 0.5)[:, np.newaxis]
+                    + setup['c'][tri])
+            inside = np.all(bary >= 0, axis=1)
+            bary, tri, px, py = bary[inside], tri[inside], px[inside], py[inside]
+            depth = np.einsum('ij,ij->i', bary, screen[setup['tris'][tri], 2])
+            # Near/Far-Clipping je Fragment
+            valid = (depth >= 0) & (depth <= 1)
+            bary, tri, px, py, depth = bary[valid], tri[valid], px[valid], py[valid], depth[valid]
+
+            pixel = (py - bottom) * tw + (px - left)
+            best = _resolve(pixel, depth)
+            pixel, depth = pixel[best], depth[best]
+            closer = depth < depth_buffer[pixel]
+            pixel = pixel[closer]
+            depth_buffer[pixel] = depth[closer]
+            tri_buffer[pixel] = tri[best][closer]
+            bary_buffer[pixel] = bary[best][closer]
+            start = stop
+
+        covered = np.flatnonzero(tri_buffer >= 0)
+        if len(covered) == 0:
+            return
+        corners = setup['tris'][tri_buffer[covered]]
+        rgb = self._shade(corners, bary_buffer[covered], frame)
+        rows, cols = covered // tw + bottom, covered % tw + left
+        color = frame[5]
+        color[rows, cols, :3] = rgb
+        color[rows, cols, 3] = 255
+
+    def _draw_lines(self, tris, frame):
+        # Kanten jedes Dreiecks als Linien, Abtastung im Abstand <= 1 Pixel (GL_LINE)
+        screen = frame[0]
+        edges = np.concatenate([tris[:, [0, 1]], tris[:, [1, 2]], tris[:, [2, 0]]])
+        a, b = screen[edges[:, 0]], screen[edges[:, 1]]
+        steps = np.ceil(np.max(np.abs(b[:, :2] - a[:, :2]), axis=1)).astype(np.int64) + 1
+        edge = np.repeat(np.arange(len(edges)), steps)
+        t = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.maximum(steps - 1, 1)[edge]
+        points = a[edge] + (b - a)[edge] * t[:, np.newaxis]
+        px, py = np.floor(points[:, 0]).astype(np.int64), np.floor(points[:, 1]).astype(np.int64)
+        valid = ((px >= 0) & (px < self.width) & (py >= 0) & (py < self.height)
+                 & (points[:, 2] >= 0) & (points[:, 2] <= 1))
+        edge, t, px, py, depth = edge[valid], t[valid], px[valid], py[valid], points[valid, 2]
+        best = _resolve(py * self.width + px, depth)
+        edge, t, px, py = edge[best], t[best], px[best], py[best]
+        # Linien als entartete Dreiecke (a, b, b) schattieren
+        corners = edges[edge][:, [0, 1, 1]]
+        bary = np.stack([1.0 - t, t, np.zeros_like(t)], axis=1)
+        color = frame[5]
+        color[py, px, :3] = self._shade(corners, bary, frame)
+        color[py, px, 3] = 255
+
+    def _shade(self, corners, bary, frame):
+        # perspektivisch korrekt interpolieren (Gewichte / w) und wie die Fragment-Shader faerben
+        _, w, attributes, mode, shininess, _ = frame
+        weights = bary / w[corners]
+        weights /= weights.sum(axis=1, keepdims=True)
+        values = np.einsum('ij,ijk->ik', weights, attributes[corners])
+        if mode == PHONG:
+            values = lighting(_normalize(values[:, :3]), values[:, 3:], shininess)
+        return np.rint(np.clip(values, 0.0, 1.0) * 255).astype(np.uint8)
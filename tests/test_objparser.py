@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+import utils
+from utils import lade_obj, _parse_parallel, _parse_range
+
+SQUARE = """\
+v 0 0 0
+v 1 0 0
+v 1 1 0
+v 0 1 0
+"""
+
+
+def write(tmp_path, text, name='mesh.obj', newline='\n'):
+    path = tmp_path / name
+    path.write_bytes(text.replace('\n', newline).encode())
+    return str(path)
+
+
+def test_triangle(tmp_path):
+    vertices, indices, faces, normals = lade_obj(write(tmp_path, SQUARE + "f 1 2 3\n"))
+    assert vertices.dtype == np.float32 and vertices.shape == (4, 3)
+    assert indices.tolist() == [0, 1, 2]
+    assert faces.shape == (1, 3)
+    np.testing.assert_allclose(normals[:3], [[0, 0, 1]] * 3)
+
+
+def test_ngon_fan(tmp_path):
+    text = SQUARE + "v 0.5 1.5 0\nf 1 2 3 5 4\n"
+    _, indices, faces, _ = lade_obj(write(tmp_path, text))
+    assert faces.tolist() == [[0, 1, 2], [0, 2, 4], [0, 4, 3]]
+
+
+def test_negative_indices(tmp_path):
+    # relativ zu den bis dahin gelesenen v, nicht zum Dateiende
+    text = "v 0 0 0\nv 1 0 0\nv 1 1 0\nf -3 -2 -1\nv 0 1 0\nf -4 -2 -1\n"
+    _, indices, _, _ = lade_obj(write(tmp_path, text))
+    assert indices.tolist() == [0, 1, 2, 0, 2, 3]
+
+
+def test_negative_normal_indices(tmp_path):
+    text = SQUARE + "vn 0 0 1\nvn 0 0 -1\nf 1//-2 2//-2 3//-2\nf 1//-1 3//-1 4//-1\n"
+    vertices, indices, _, normals = lade_obj(write(tmp_path, text))
+    np.testing.assert_allclose(normals[indices[:3]], [[0, 0, 1]] * 3)
+    np.testing.assert_allclose(normals[indices[3:]], [[0, 0, -1]] * 3)
+
+
+def test_vn_dedup(tmp_path):
+    # 1 und 3 gehoeren zu beiden Flaechen, aber mit verschiedenen Normalen
+    text = SQUARE + "vn 0 0 1\nvn 0 0 -1\nf 1//1 2//1 3//1\nf 1//2 3//2 4//2\n"
+    vertices, indices, _, normals = lade_obj(write(tmp_path, text))
+    assert len(vertices) == len(normals) == 6
+    corners = vertices[indices]
+    np.testing.assert_array_equal(corners, [[0, 0, 0], [1, 0, 0], [1, 1, 0],
+                                            [0, 0, 0], [1, 1, 0], [0, 1, 0]])
+    np.testing.assert_allclose(normals[indices], [[0, 0, 1]] * 3 + [[0, 0, -1]] * 3)
+
+
+def test_vn_dedup_shares_equal_pairs(tmp_path):
+    # v/vt/vn; gleiche (v, vn)-Paare werden ein Vertex
+    text = SQUARE + "vt 0 0\nvn 0 0 1\nf 1/1/1 2/1/1 3/1/1\nf 1/1/1 3/1/1 4/1/1\n"
+    vertices, indices, _, _ = lade_obj(write(tmp_path, text))
+    assert len(vertices) == 4
+    assert indices.tolist() == [0, 1, 2, 0, 2, 3]
+
+
+def test_file_normals_are_normalized(tmp_path):
+    text = SQUARE + "vn 0 0 5\nvn 0 3 4\nvn 0 0 2\nvn 0 0 1\nf 1//1 2//2 3//3\nf 1//1 3//3 4//4\n"
+    _, _, _, normals = lade_obj(write(tmp_path, text))
+    np.testing.assert_allclose(np.linalg.norm(normals, axis=1), 1.0, rtol=1e-6)
+    np.testing.assert_allclose(normals[1], [0, 0.6, 0.8], rtol=1e-6)
+
+
+def test_mixed_vn_computes_normals(tmp_path):
+    # nur eine Flaeche mit //vn: die Normalen werden berechnet
+    text = SQUARE + "vn 1 0 0\nf 1//1 2//1 3//1\nf 1 3 4\n"
+    vertices, indices, _, normals = lade_obj(write(tmp_path, text))
+    assert len(normals) == len(vertices) == 4
+    np.testing.assert_allclose(normals, [[0, 0, 1]] * 4, atol=1e-6)
+
+
+def test_crlf(tmp_path):
+    text = ("# Kommentar\n" + SQUARE + "vn 0 0 1\nvn 0 0 -1\n"
+            "f 1//1 2//1 3//1\nf 1//2 3//2 4//2\nf 1 2 3 4\ng\n")
+    lf = write(tmp_path, text)
+    crlf = write(tmp_path, text, 'crlf.obj', '\r\n')
+    for a, b in zip(_parse_range(lf, 0, None, 64), _parse_range(crlf, 0, None, 64)):
+        np.testing.assert_array_equal(a, b)
+    for a, b in zip(lade_obj(lf), lade_obj(crlf)):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_missing_final_newline(tmp_path):
+    _, indices, _, _ = lade_obj(write(tmp_path, SQUARE + "f 1 2 3 4"))
+    assert indices.tolist() == [0, 1, 2, 0, 2, 3]
+
+
+def grid_obj(n):
+    # n x n Quads mit vn und negativen Indizes, damit Blockgrenzen mitten
+    # in relativen Verweisen liegen
+    lines = []
+    for y in range(n + 1):
+        for x in range(n + 1):
+            lines.append(f"v {x} {y} {(x * y) % 3 * 0.1:.1f}")
+            lines.append(f"vn 0 0 {1 + (x + y) % 2}")
+    for y in range(n):
+        for x in range(n):
+            a = y * (n + 1) + x + 1
+            b, c, d = a + 1, a + n + 2, a + n + 1
+            if (x + y) % 2:
+                lines.append(f"f {a}//{a} {b}//{b} {c}//{c} {d}//{d}")
+            else:
+                m = (n + 1) ** 2
+                lines.append(f"f {a - m - 1} {b - m - 1} {c - m - 1}")
+    return "\n".join(lines) + "\n"
+
+
+@pytest.mark.parametrize('chunk_size', [64, 1000])
+def test_chunk_size_does_not_change_result(tmp_path, chunk_size):
+    filename = write(tmp_path, grid_obj(12))
+    reference = _parse_range(filename, 0, None, utils.CHUNK_SIZE)
+    for a, b in zip(reference, _parse_range(filename, 0, None, chunk_size)):
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize('workers', [2, 4])
+def test_workers_agree(tmp_path, workers):
+    filename = write(tmp_path, grid_obj(12))
+    reference = _parse_range(filename, 0, None, utils.CHUNK_SIZE)
+    parallel = _parse_parallel(filename, 256, workers)
+    for a, b in zip(reference, parallel):
+        assert a.dtype == b.dtype
+        np.testing.assert_array_equal(a, b)
+
+
+def test_lade_obj_workers(tmp_path, monkeypatch):
+    filename = write(tmp_path, grid_obj(6))
+    reference = lade_obj(filename)
+    monkeypatch.setattr(utils, 'PARALLEL_MIN_SIZE', 0)
+    for a, b in zip(reference, lade_obj(filename, workers=2)):
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize('text', [
+    SQUARE + "f 1 2 5\n",
+    SQUARE + "f 1 2 -5\n",
+    SQUARE + "f 1 2\n",
+    SQUARE + "vn 0 0 1\nf 1//1 2//1 3//2\n",
+    SQUARE + "f 1/1/1/1 2 3\n",
+    "v 0 0\n",
+])
+def test_invalid(tmp_path, text):
+    with pytest.raises(ValueError):
+        lade_obj(write(tmp_path, text))
@@ -0,0 +1,61 @@
+import numpy as np
+
+from vertexformat import (MeshBuffers, VertexFormat, compact_indices, pack_normals,
+                          quantize_positions, unpack_normals)
+
+
+def random_directions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, 3)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_pack_normals_round_trip():
+    normals = random_directions(10000)
+    unpacked = unpack_normals(pack_normals(normals))
+    # halber Schritt von 1/511 je Komponente
+    assert np.abs(unpacked - normals).max() <= 0.5 / 511 + 1e-6
+    assert np.abs(np.linalg.norm(unpacked, axis=1) - 1).max() < 2e-3
+
+
+def test_pack_normals_normalizes():
+    # laengere Normalen (squirrel_ar) duerfen nicht bei +-511 abgeschnitten werden
+    normals = random_directions(1000, seed=1)
+    lengths = np.linspace(0.2, 6.0, len(normals), dtype=np.float32)[:, np.newaxis]
+    np.testing.assert_array_equal(pack_normals(normals * lengths), pack_normals(normals))
+    np.testing.assert_allclose(unpack_normals(pack_normals([[0, 0, 5], [-3, 0, 0]])),
+                               [[0, 0, 1], [-1, 0, 0]])
+
+
+def test_pack_normals_layout():
+    packed = pack_normals([[1, 0, 0], [0, -1, 0], [0, 0, 0]])
+    assert packed.dtype == np.int32
+    assert packed.tolist() == [511, (-511 & 0x3ff) << 10, 0]
+
+
+def test_quantize_positions_error():
+    rng = np.random.default_rng(2)
+    vertices = (rng.random((5000, 3)) * [4, 1, 0.01] - 2).astype(np.float32)
+    vertices[:, 2] = 0.5  # flache Achse
+    q, scale, offset = quantize_positions(vertices)
+    assert q.dtype == np.uint16
+    restored = q / 65535.0 * scale + offset
+    step = np.where(np.ptp(vertices, axis=0) > 0, np.ptp(vertices, axis=0), 1) / 65535
+    assert np.all(np.abs(restored - vertices) <= step / 2 + 1e-6)
+
+
+def test_compact_indices():
+    assert compact_indices([0, 1, 2], 1 << 16)[0].dtype == np.uint16
+    assert compact_indices([0, 1, 2], (1 << 16) + 1)[0].dtype == np.uint32
+
+
+def test_interleaved_packed_buffer():
+    vertices = np.arange(12, dtype=np.float32).reshape(4, 3)
+    normals = random_directions(4, seed=3)
+    buffers = MeshBuffers(vertices, normals, np.array([0, 1, 2, 0, 2, 3]),
+                          VertexFormat(interleaved=True, pack_normals=True))
+    (data, stride, attributes), = buffers.vertex_buffers
+    assert stride == 16 and [a.offset for a in attributes] == [0, 12]
+    np.testing.assert_array_equal(data['position'], vertices)
+    np.testing.assert_array_equal(data['normal'].ravel(), pack_normals(normals))
+    assert buffers.index_bytes() == 12
@@ -1,64 +1,408 @@
-import sys
+import os
+
 import numpy as np
 
-progname = sys.argv[0]
-args = sys.argv[1:]
+# Blockgroesse beim Einlesen: der Parser haelt nie mehr als einen Block
+# (plus dessen Zwischenarrays) im Speicher, egal wie gross die Datei ist.
+CHUNK_SIZE = 1 << 24
+
+# kleinere Dateien werden auch mit workers > 1 in einem Prozess gelesen,
+# da sich das Starten der Worker dort nicht lohnt
+PARALLEL_MIN_SIZE = 1 << 25
+
+_NL, _CR, _TAB, _SPACE, _SLASH = 10, 13, 9, 32, 47
+
+
+def _iter_chunks(file, chunk_size, length=None):
+    # liefert Bloecke, die immer an einer Zeilengrenze enden; mit length
+    # werden ab der aktuellen Position nur length Bytes gelesen
+    rest = b''
+    while True:
+        if length is not None:
+            block = file.read(min(chunk_size, length))
+            length -= len(block)
+        else:
+            block = file.read(chunk_size)
+        if not block:
+            if rest:
+                yield rest + b'\n'
+            return
+        if rest:
+            block = rest + block
+        cut = block.rfind(b'\n') + 1
+        rest = block[cut:]
+        if cut:
+            yield block[:cut]
+
+
+def _is_space(buf):
+    return (buf == _SPACE) | (buf == _TAB) | (buf == _NL) | (buf == _CR)
+
+
+def _tokens_per_line(sel, line_starts):
+    # Anzahl der Tokens je Zeile: Uebergaenge Whitespace -> Nicht-Whitespace
+    ws = _is_space(sel)
+    tok_start = ~ws
+    tok_start[1:] &= ws[:-1]
+    return np.add.reduceat(tok_start, line_starts).astype(np.int64)
+
+
+def _select_lines(work, line_lengths, line_kind, kind):
+    # alle Zeilen einer Sorte als zusammenhaengenden Byte-Block herausziehen
+    mask = np.repeat(line_kind == kind, line_lengths)
+    sel = work[mask]
+    lengths = line_lengths[line_kind == kind]
+    line_starts = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=line_starts[1:])
+    return sel, line_starts
+
+
+def _parse_numbers(sel, dtype):
+    return np.fromstring(sel.tobytes(), dtype=dtype, sep=' ')
+
+
+def _first_columns(values, counts, n, what):
+    if len(values) != counts.sum():
+        raise ValueError(f"malformed '{what}' record in OBJ file")
+    if np.any(counts < n):
+        raise ValueError(f"'{what}' record with less than {n} values")
+    offsets = np.cumsum(counts) - counts
+    return values[offsets[:, np.newaxis] + np.arange(n)]
+
+
+def _parse_faces(sel, v_before, vn_before):
+    # leere Felder ("1//3") mit 0 auffuellen, damit jedem '/' eine Zahl folgt;
+    # 0 ist als OBJ-Index ungueltig und steht danach fuer "nicht vorhanden"
+    slash = np.flatnonzero(sel == _SLASH)
+    after = sel[slash + 1]
+    empty = slash[(after == _SLASH) | _is_space(after)]
+    if len(empty):
+        sel = np.insert(sel, empty + 1, ord('0'))
+
+    # Anfaenge aller Zahlen; eine Zahl nach Whitespace beginnt eine neue Ecke,
+    # eine Zahl nach '/' ist das naechste Feld (vt, vn) derselben Ecke
+    ws = _is_space(sel)
+    sep = ws | (sel == _SLASH)
+    start = ~sep
+    start[1:] &= sep[:-1]
+    start_pos = np.flatnonzero(start)
+    new_corner = np.ones(len(start_pos), dtype=bool)
+    inner = start_pos > 0
+    new_corner[inner] = ws[start_pos[inner] - 1]
+    corner_pos = np.flatnonzero(new_corner)
+    corner = np.cumsum(new_corner) - 1
+    field = np.arange(len(start_pos)) - corner_pos[corner]
+    if len(field) and field.max() > 2:
+        raise ValueError("'f' record with more than three index fields")
+
+    sel[sel == _SLASH] = _SPACE
+    values = _parse_numbers(sel, np.int64)
+    if len(values) != len(start_pos):
+        raise ValueError("malformed 'f' record in OBJ file")
+    fields = np.zeros((len(corner_pos), 3), dtype=np.int64)
+    fields[corner, field] = values
+
+    # Ecken je Flaeche
+    is_nl = sel == _NL
+    line_of_byte = np.cumsum(is_nl) - is_nl
+    counts = np.bincount(line_of_byte[start_pos[corner_pos]], minlength=len(v_before))
+    if np.any(counts < 3):
+        raise ValueError("'f' record with less than 3 vertices")
+
+    # 1-basierte bzw. negative (relative) Indizes -> 0-basiert, fehlend = -1
+    v_idx = fields[:, 0]
+    v_idx = np.where(v_idx < 0, np.repeat(v_before, counts) + v_idx, v_idx - 1)
+    vn_idx = fields[:, 2]
+    vn_idx = np.where(vn_idx < 0, np.repeat(vn_before, counts) + vn_idx, vn_idx - 1)
+    if len(v_idx) and v_idx.min() < 0:
+        raise ValueError("face index out of range")
+
+    # Faecher-Triangulierung: (0, k, k+1) fuer k = 1 .. n-2
+    first = np.cumsum(counts) - counts
+    ntri = counts - 2
+    face = np.repeat(np.arange(len(counts)), ntri)
+    k = np.arange(ntri.sum()) - np.repeat(np.cumsum(ntri) - ntri, ntri) + 1
+    tri = np.stack([first[face], first[face] + k, first[face] + k + 1], axis=1).ravel()
+    return v_idx[tri].astype(np.uint32), vn_idx[tri].astype(np.int32)
+
+
+def _parse_chunk(chunk, v_offset=0, vn_offset=0):
+    buf = np.frombuffer(chunk, dtype=np.uint8)
+    ends = np.flatnonzero(buf == _NL)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    line_lengths = ends - starts + 1
+
+    # Zeilen anhand der ersten drei Zeichen nach Sorte einteilen
+    last = len(buf) - 1
+    c0 = buf[starts]
+    c1 = buf[np.minimum(starts + 1, last)]
+    c2 = buf[np.minimum(starts + 2, last)]
+    sep1 = (c1 == _SPACE) | (c1 == _TAB)
+    sep2 = (c2 == _SPACE) | (c2 == _TAB)
+    is_v = (c0 == ord('v')) & sep1
+    is_vn = (c0 == ord('v')) & (c1 == ord('n')) & sep2
+    is_f = (c0 == ord('f')) & sep1
+
+    line_kind = np.zeros(len(starts), dtype=np.int8)
+    line_kind[is_v] = 1
+    line_kind[is_vn] = 2
+    line_kind[is_f] = 3
+
+    # Schluesselwoerter ausblenden, damit nur noch Zahlen uebrig bleiben
+    work = buf.copy()
+    work[starts[is_v | is_vn | is_f]] = _SPACE
+    work[starts[is_vn] + 1] = _SPACE
+
+    result = []
+    for kind, what in ((1, 'v'), (2, 'vn')):
+        sel, line_starts = _select_lines(work, line_lengths, line_kind, kind)
+        if len(line_starts) == 0:
+            result.append(np.zeros((0, 3), dtype=np.float32))
+            continue
+        counts = _tokens_per_line(sel, line_starts)
+        values = _parse_numbers(sel, np.float64)
+        result.append(_first_columns(values, counts, 3, what).astype(np.float32))
+
+    sel, line_starts = _select_lines(work, line_lengths, line_kind, 3)
+    if len(line_starts) == 0:
+        result += [np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32)]
+        return result
 
-def lade_obj(filename):
+    # Anzahl der bis zu jeder f-Zeile definierten v/vn (fuer relative Indizes)
+    v_before = v_offset + np.cumsum(is_v)[is_f]
+    vn_before = vn_offset + np.cumsum(is_vn)[is_f]
+    result += _parse_faces(sel, v_before, vn_before)
+    return result
+
+
+def _dedup_vertices(vertices, normals, v_idx, vn_idx):
+    # jedes (v, vn)-Paar wird ein eigener Vertex; das Paar als ein 64-Bit-
+    # Schluessel (v in den oberen, vn in den unteren 32 Bit), damit np.unique
+    # sortieren und deduplizieren kann
+    keys = (v_idx.astype(np.uint64) << np.uint64(32)) | vn_idx.astype(np.uint64)
+    unique, inverse = np.unique(keys, return_inverse=True)
+    v = (unique >> np.uint64(32)).astype(np.intp)
+    vn = (unique & np.uint64(0xffffffff)).astype(np.intp)
+    return vertices[v], normals[vn], inverse.astype(np.uint32).ravel()
+
+
+def _concat(parts, shape, dtype):
+    return np.concatenate(parts) if parts else np.zeros(shape, dtype=dtype)
+
+
+def _parse_range(filename, start, length, chunk_size, n_v=0, n_vn=0):
+    # [start, start+length) einer Datei parsen; n_v/n_vn = Anzahl der v/vn
+    # davor (fuer relative Indizes)
     vertices = []
-    faces = []
-    indices = []
     normals = []
-    with open(filename, 'r') as file:
-        for zeile in file:
-            if zeile.startswith('v '):
-                teile = zeile.strip().split()
-                vertex = list(map(float, teile[1:4]))
-                vertices.append(vertex)
-            elif zeile.startswith('vn '):
-                teile = zeile.strip().split()
-                normal = list(map(float, teile[1:4]))
-                normals.append(normal)
-            elif zeile.startswith('f '):
-                teile = zeile.strip().split()[1:]
-                face = []
-                for part in teile:
-                    vals = part.split('/')
-                    v_index = int(vals[0]) - 1
-                    face.append(v_index)
-                faces.append(face)
-                
-    indices = np.array(faces).flatten()
-    vertices = np.array(vertices, dtype=np.float32)
-    indices = np.array(indices, dtype=np.uint32)
-
-    if (not normals) or (filename.endswith("bunny.obj")) or (filename.endswith("elephant.obj")):
-        normals = compute_normals(vertices, faces)
+    v_idx = []
+    vn_idx = []
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        for chunk in _iter_chunks(file, chunk_size, length):
+            v, vn, fv, fvn = _parse_chunk(chunk, n_v, n_vn)
+            n_v += len(v)
+            n_vn += len(vn)
+            vertices.append(v)
+            normals.append(vn)
+            v_idx.append(fv)
+            vn_idx.append(fvn)
+    return (_concat(vertices, (0, 3), np.float32),
+            _concat(normals, (0, 3), np.float32),
+            _concat(v_idx, 0, np.uint32),
+            _concat(vn_idx, 0, np.int32))
+
+
+def _split_lines(filename, parts):
+    # Datei in etwa gleich grosse, an Zeilenenden ausgerichtete Bereiche teilen
+    size = os.path.getsize(filename)
+    bounds = [0]
+    with open(filename, 'rb') as file:
+        for i in range(1, parts):
+            file.seek(max(size * i // parts, bounds[-1]))
+            file.readline()
+            bounds.append(min(file.tell(), size))
+    bounds.append(size)
+    return [(a, b - a) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _count_records(filename, start, length):
+    # Anzahl der v- und vn-Zeilen eines Bereichs (fuer die Index-Offsets)
+    n_v = n_vn = 0
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        for chunk in _iter_chunks(file, CHUNK_SIZE, length):
+            chunk = b'\n' + chunk
+            n_v += chunk.count(b'\nv ') + chunk.count(b'\nv\t')
+            n_vn += chunk.count(b'\nvn ') + chunk.count(b'\nvn\t')
+    return n_v, n_vn
+
+
+def _parse_range_shared(filename, start, length, chunk_size, n_v, n_vn):
+    # laeuft im Worker: Ergebnisse in Shared Memory ablegen und nur
+    # (Name, Form, Typ) zurueckgeben, statt die Arrays zu picklen
+    from multiprocessing import shared_memory
+    arrays = _parse_range(filename, start, length, chunk_size, n_v, n_vn)
+    blocks = []
+    try:
+        for array in arrays:
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(shm)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    except BaseException:
+        # der Elternprozess erfaehrt die Namen nie: angelegte Bloecke selbst freigeben
+        _release(blocks)
+        raise
+    result = []
+    for shm, array in zip(blocks, arrays):
+        result.append((shm.name, array.shape, array.dtype.str))
+        _untrack(shm)
+        shm.close()
+    return result
+
+
+def _untrack(shm):
+    # freigeben (unlink) muss der Elternprozess: der Resource-Tracker des
+    # Workers wuerde den Block sonst loeschen, sobald der Pool endet
+    # (ab Python 3.13 ginge SharedMemory(track=False)); nur POSIX hat einen
+    # Tracker, er fuehrt den Namen mit fuehrendem '/'
+    if os.name == 'posix':
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister('/' + shm.name.lstrip('/'), 'shared_memory')
+
+
+def _release(blocks):
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+def _parse_parallel(filename, chunk_size, workers):
+    # multiprocessing erst hier, der Import lohnt nur fuer grosse Dateien
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+    ranges = _split_lines(filename, workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # 1. Durchlauf: v/vn zaehlen, damit jeder Bereich seine Offsets kennt
+        counts = list(pool.map(_count_records, *zip(*[(filename, s, n) for s, n in ranges])))
+        offsets = np.zeros((len(ranges), 2), dtype=np.int64)
+        np.cumsum(counts[:-1], axis=0, out=offsets[1:])
+        # 2. Durchlauf: Bereiche parsen
+        futures = [pool.submit(_parse_range_shared, filename, s, n, chunk_size, int(ov), int(ovn))
+                   for (s, n), (ov, ovn) in zip(ranges, offsets)]
+        # auch nach einem Fehler alle Ergebnisse abholen: die Bloecke der
+        # uebrigen Worker muessen trotzdem freigegeben werden
+        metas, errors = [], []
+        for future in futures:
+            try:
+                metas.append(future.result())
+            except Exception as error:
+                errors.append(error)
+
+    blocks = []
+    try:
+        for meta in metas:
+            shms = []
+            blocks.append(shms)
+            for name, _, _ in meta:
+                shms.append(shared_memory.SharedMemory(name=name))
+        if errors:
+            raise errors[0]
+        # Indizes sind bereits global, die Teile nur noch aneinanderhaengen
+        return tuple(
+            np.concatenate([np.ndarray(meta[k][1], dtype=meta[k][2], buffer=shms[k].buf)
+                            for meta, shms in zip(metas, blocks)])
+            for k in range(4))
+    finally:
+        for shms in blocks:
+            _release(shms)
+
+
+def normalize_rows(vectors):
+    # jede Zeile auf Laenge 1, Nullvektoren bleiben null
+    vectors = np.asarray(vectors, dtype=np.float32)
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(lengths, 1e-12)
+
+
+def lade_obj(filename, chunk_size=CHUNK_SIZE, weighting='area', workers=1):
+    # workers: Anzahl Prozesse zum Parsen, None = alle Kerne
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers > 1 and os.path.getsize(filename) >= PARALLEL_MIN_SIZE:
+        vertices, normals, indices, vn_idx = _parse_parallel(filename, chunk_size, workers)
+    else:
+        vertices, normals, indices, vn_idx = _parse_range(filename, 0, None, chunk_size)
+
+    if len(indices) and indices.max() >= len(vertices):
+        raise ValueError("face index out of range")
+    has_vn = len(vn_idx) > 0 and vn_idx.min() >= 0
+    if has_vn and vn_idx.max() >= len(normals):
+        raise ValueError("normal index out of range")
+
+    forced = filename.endswith("bunny.obj") or filename.endswith("elephant.obj")
+    if forced or not has_vn:
+        # keine oder nicht alle Flaechen mit //vn: vn-Zeilen gehoeren dann nicht
+        # sicher zu den Vertices, auch wenn ihre Anzahl zufaellig passt
+        normals = compute_normals(vertices, indices, weighting)
+    elif np.any(vn_idx != indices):
+        # eigene Normalen-Indizes: ein gemeinsamer Vertex-Strom aus (v, vn)
+        vertices, normals, indices = _dedup_vertices(vertices, normalize_rows(normals), indices, vn_idx)
     else:
-        normals = np.array(normals, dtype=np.float32)
+        # vn aus der Datei sind nicht immer normiert (squirrel_ar: Laenge 3 bis 6)
+        normals = normalize_rows(normals)
 
+    faces = indices.reshape(-1, 3)
     return vertices, indices, faces, normals
 
-def compute_normals(vertices, faces):
+def compute_normals(vertices, faces, weighting='area'):
+    """
+    Vertex-Normalen als gewichtete Summe der Flaechen-Normalen.
+    weighting: 'area'    - Gewicht = Dreiecksflaeche (unnormiertes Kreuzprodukt)
+               'angle'   - Gewicht = Innenwinkel des Dreiecks am Vertex
+               'uniform' - jede angrenzende Flaeche zaehlt gleich
+    """
+    faces = np.asarray(faces).reshape(-1, 3)
     normals = np.zeros_like(vertices, dtype=np.float32)
+    if len(faces) == 0:
+        return normals
 
-    for face in faces:
-        i0, i1, i2 = face
-        v0 = vertices[i0]
-        v1 = vertices[i1]
-        v2 = vertices[i2]
+    # alle Dreiecke auf einmal: (F, 3, 3)
+    tri = vertices[faces].astype(np.float64)
 
-        # Kantenvektoren
-        e1 = v1 - v0
-        e2 = v2 - v0
+    # Kantenvektoren
+    e1 = tri[:, 1] - tri[:, 0]
+    e2 = tri[:, 2] - tri[:, 0]
 
-        # Flächen-Normale
-        face_normal = np.cross(e1, e2)
+    # Flächen-Normalen (Laenge = doppelte Flaeche)
+    face_normals = np.cross(e1, e2)
 
-        # Summe der Normale auf die beteiligten Vertices
-        normals[i0] += face_normal
-        normals[i1] += face_normal
-        normals[i2] += face_normal
+    if weighting == 'area':
+        weighted = np.repeat(face_normals[:, np.newaxis, :], 3, axis=1)
+    elif weighting in ('angle', 'uniform'):
+        lengths = np.linalg.norm(face_normals, axis=1)
+        lengths[lengths == 0] = 1.0
+        unit = face_normals / lengths[:, np.newaxis]
+        if weighting == 'uniform':
+            weighted = np.repeat(unit[:, np.newaxis, :], 3, axis=1)
+        else:
+            # Innenwinkel an allen drei Ecken
+            a = tri[:, [1, 2, 0]] - tri
+            b = tri[:, [2, 0, 1]] - tri
+            cos = np.einsum('fki,fki->fk', a, b)
+            sin = np.linalg.norm(np.cross(a, b), axis=2)
+            angles = np.arctan2(sin, cos)
+            weighted = unit[:, np.newaxis, :] * angles[:, :, np.newaxis]
+    else:
+        raise ValueError(f"unknown weighting '{weighting}'")
+
+    # Summe der Normale auf die beteiligten Vertices
+    idx = faces.ravel()
+    weighted = weighted.reshape(-1, 3)
+    for k in range(3):
+        normals[:, k] = np.bincount(idx, weights=weighted[:, k], minlength=len(vertices))
 
     # Alle Normale normieren
     norms = np.linalg.norm(normals, axis=1)
@@ -67,6 +411,18 @@ def compute_normals(vertices, faces):
 
     return normals
 
+def normalize_vertices(vertices, size=1.5):
+    # zentrieren & normalisieren (in place), groesste Ausdehnung = size
+    center = vertices.mean(axis=0)
+    vertices -= center
+    min_coords = vertices.min(axis=0)
+    max_coords = vertices.max(axis=0)
+    extent = max_coords - min_coords
+    max_extent = np.max(extent)
+    vertices /= max_extent
+    vertices *= size
+    return vertices
+
 def projectOnSphere(x, y, r, width, height):
     x, y = x - width/2.0, height/2.0 - y
     a = min(r*r, x**2 + y**2)
@@ -75,5 +431,10 @@ def projectOnSphere(x, y, r, width, height):
     return x/l, y/l, z/l
 
 
-vertices,indices,faces, normals = lade_obj("obj_files/cow.obj")
-print("hallo")
+def project_on_sphere_many(x, y, r, width, height):
+    # Batch-Version von projectOnSphere: Cursorpositionen (N,) -> (N, 3) Einheitsvektoren
+    x = np.asarray(x, dtype=np.float64) - width/2.0
+    y = height/2.0 - np.asarray(y, dtype=np.float64)
+    z = np.sqrt(r*r - np.minimum(r*r, x*x + y*y))
+    points = np.stack([x, y, z], axis=-1)
+    return points / np.linalg.norm(points, axis=-1, keepdims=True)
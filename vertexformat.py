@@ -0,0 +1,163 @@
+"""
+vertexformat.py
+
+Vertex and index buffer layouts for Scene.gen_buffers. Besides the plain
+layout (one float32 VBO per attribute, uint32 indices) positions and
+normals can be interleaved into a single VBO, normals packed into one
+GL_INT_2_10_10_10_REV word, and positions quantized to 16 bit with a
+scale/offset that the vertex shaders apply (uniforms position_scale and
+position_offset). Indices drop to GL_UNSIGNED_SHORT whenever the vertex
+count allows.
+
+    python vertexformat.py obj_files/bunny.obj obj_files/suzanne_tri.obj
+
+prints the memory footprint of every layout.
+"""
+
+import ctypes
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from OpenGL.GL import (GL_FLOAT, GL_INT_2_10_10_10_REV, GL_UNSIGNED_SHORT,
+                       GL_UNSIGNED_INT, GL_TRUE, GL_FALSE)
+
+from utils import normalize_rows
+
+
+VertexAttribute = namedtuple('VertexAttribute', 'location size gl_type normalized offset')
+
+
+class VertexFormat:
+    """
+    Layout options, see module docstring. Packed normals need OpenGL 3.3.
+    Neither compact format is bit-exact: packed normals shift shading by up
+    to 3/255, 16 bit positions move vertices by up to half a grid step
+    (extent / 131070), which flips a few hundred edge pixels per 640x480
+    frame, mostly in wireframe.
+    """
+
+    def __init__(self, interleaved=False, pack_normals=False, quantize_positions=False):
+        self.interleaved = interleaved
+        self.pack_normals = pack_normals
+        self.quantize_positions = quantize_positions
+
+    def __repr__(self):
+        parts = ['interleaved' if self.interleaved else 'separate']
+        if self.pack_normals:
+            parts.append('packed normals')
+        if self.quantize_positions:
+            parts.append('16 bit positions')
+        return ', '.join(parts)
+
+
+def pack_normals(normals):
+    # x, y, z als vorzeichenbehaftete, normierte 10-Bit-Werte, w = 0; vorher auf
+    # Laenge 1 bringen, laengere Normalen wuerden bei +-511 abgeschnitten
+    q = np.clip(np.rint(normalize_rows(normals) * 511), -512, 511).astype(np.int32)
+    packed = (q[:, 0] & 0x3ff) | ((q[:, 1] & 0x3ff) << 10) | ((q[:, 2] & 0x3ff) << 20)
+    return packed.astype(np.int32)
+
+
+def unpack_normals(packed):
+    # Umkehrung von pack_normals (GL-4.2-Regel: max(c / 511, -1))
+    packed = np.asarray(packed, dtype=np.int32)
+    fields = np.stack([(packed << 22) >> 22, (packed << 12) >> 22, (packed << 2) >> 22], axis=1)
+    return np.maximum(fields / 511.0, -1.0).astype(np.float32)
+
+
+def quantize_positions(vertices):
+    # auf [0, 65535] je Achse abbilden; Shader: p = q / 65535 * scale + offset
+    vertices = np.asarray(vertices, dtype=np.float32)
+    offset = vertices.min(axis=0)
+    scale = vertices.max(axis=0) - offset
+    scale[scale == 0] = 1.0
+    q = np.rint((vertices - offset) / scale * 65535).astype(np.uint16)
+    return q, scale.astype(np.float32), offset.astype(np.float32)
+
+
+def compact_indices(indices, vertex_count):
+    # 16-Bit-Indizes, solange alle Vertices damit adressierbar sind
+    if vertex_count <= 1 << 16:
+        return np.asarray(indices, dtype=np.uint16), GL_UNSIGNED_SHORT
+    return np.asarray(indices, dtype=np.uint32), GL_UNSIGNED_INT
+
+
+class MeshBuffers:
+    """
+    CPU side of a mesh in a given VertexFormat: vertex_buffers is a list of
+    (data, stride, [VertexAttribute]), one entry per VBO.
+    """
+
+    def __init__(self, vertices, normals, indices, fmt=None):
+        fmt = fmt or VertexFormat()
+        self.format = fmt
+        self.vertex_count = len(vertices)
+        self.uniforms = {'position_scale': np.ones(3, dtype=np.float32),
+                         'position_offset': np.zeros(3, dtype=np.float32)}
+
+        if fmt.quantize_positions:
+            positions, scale, offset = quantize_positions(vertices)
+            self.uniforms = {'position_scale': scale, 'position_offset': offset}
+            # auf 4 Komponenten auffuellen, damit jeder Vertex 4-Byte-ausgerichtet ist
+            positions = np.concatenate([positions, np.zeros((len(positions), 1), np.uint16)], axis=1)
+            position_attr = (3, GL_UNSIGNED_SHORT, GL_TRUE)
+        else:
+            positions = vertices
+            position_attr = (3, GL_FLOAT, GL_FALSE)
+
+        if fmt.pack_normals:
+            normals = pack_normals(normals)[:, np.newaxis]
+            normal_attr = (4, GL_INT_2_10_10_10_REV, GL_TRUE)
+        else:
+            normal_attr = (3, GL_FLOAT, GL_FALSE)
+
+        if fmt.interleaved:
+            dtype = np.dtype([('position', positions.dtype, positions.shape[1]),
+                              ('normal', normals.dtype, normals.shape[1])])
+            data = np.empty(len(positions), dtype=dtype)
+            data['position'] = positions
+            data['normal'] = normals
+            self.vertex_buffers = [(data, dtype.itemsize, [
+                VertexAttribute(0, *position_attr, dtype.fields['position'][1]),
+                VertexAttribute(1, *normal_attr, dtype.fields['normal'][1])])]
+        else:
+            self.vertex_buffers = [
+                (positions, positions.strides[0] if fmt.quantize_positions else 0,
+                 [VertexAttribute(0, *position_attr, 0)]),
+                (normals, 0, [VertexAttribute(1, *normal_attr, 0)])]
+
+        self.indices, self.index_type = compact_indices(indices, self.vertex_count)
+
+    def vertex_bytes(self):
+        return sum(data.nbytes for data, _, _ in self.vertex_buffers)
+
+    def index_bytes(self):
+        return self.indices.nbytes
+
+    def describe(self):
+        # Speicherbedarf im Vergleich zu float32-Attributen + uint32-Indizes
+        baseline = self.vertex_count * 24 + len(self.indices) * 4
+        total = self.vertex_bytes() + self.index_bytes()
+        return (f"{self.vertex_count} vertices, {len(self.indices) // 3} triangles ({self.format}): "
+                f"vertices {self.vertex_bytes() / 1024:.1f} KiB + indices {self.index_bytes() / 1024:.1f} KiB"
+                f" = {total / 1024:.1f} KiB ({total / baseline:.0%} of float32/uint32)")
+
+
+def attribute_offset(attribute):
+    return ctypes.c_void_p(attribute.offset)
+
+
+if __name__ == '__main__':
+    from meshcache import prepare_mesh
+
+    formats = [VertexFormat(),
+               VertexFormat(interleaved=True),
+               VertexFormat(interleaved=True, pack_normals=True),
+               VertexFormat(interleaved=True, pack_normals=True, quantize_positions=True)]
+    for filename in sys.argv[1:]:
+        mesh = prepare_mesh(filename)
+        print(filename)
+        for fmt in formats:
+            print("  " + MeshBuffers(mesh['vertices'], mesh['normals'], mesh['indices'], fmt).describe())